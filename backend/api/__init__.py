@@ -4,6 +4,8 @@ from flask import Blueprint
 from .routes.upload import upload_bp
 from .routes.schemas import schemas_bp
 from .routes.reports import reports_bp
+from .routes.events import events_bp
+from .routes.profiling import profiling_bp
 
 def register_blueprints(app):
     """
@@ -13,4 +15,6 @@ def register_blueprints(app):
     """
     app.register_blueprint(upload_bp, url_prefix='/api')
     app.register_blueprint(schemas_bp, url_prefix='/api')
-    app.register_blueprint(reports_bp, url_prefix='/api')
\ No newline at end of file
+    app.register_blueprint(reports_bp, url_prefix='/api')
+    app.register_blueprint(events_bp, url_prefix='/api')
+    app.register_blueprint(profiling_bp, url_prefix='/api')
\ No newline at end of file
@@ -0,0 +1,50 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from api.services.container import get_services
+
+# Initialize blueprint
+events_bp = Blueprint('events', __name__)
+
+@events_bp.route('/events', methods=['GET'])
+def stream_events():
+    """
+    Stream processing progress and report changes as server-sent events.
+    
+    Events are ``document.stage`` (a document reached the saved, parsed,
+    classified or stored stage, or was quarantined), ``report.delta`` (a
+    document was added to or moved between schemas) and ``resync`` (the
+    client missed events and should refetch the report). Reconnecting
+    clients resume after the ``Last-Event-ID`` header, or the
+    ``last_event_id`` query parameter; ``types`` limits the stream to a
+    comma-separated list of event names.
+    
+    Each open stream occupies a server thread until the client disconnects
+    (noticed at the latest by the next keep-alive write), so at most
+    ``EVENT_MAX_STREAMS`` are served at once; further clients get 503 and
+    should retry later.
+    
+    :return: Streaming text/event-stream response, or 503 when every
+             stream slot is taken
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    types = request.args.get('types')
+    event_types = set(types.split(',')) | {'resync'} if types else None
+    
+    event_service = get_services().event_service
+    if not event_service.open_stream():
+        response = jsonify({"error": "Too many open event streams, retry later"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    response = Response(
+        stream_with_context(event_service.stream(last_event_id, event_types)),
+        mimetype='text/event-stream',
+        headers={
+            # no-transform keeps compressing proxies from buffering the stream
+            'Cache-Control': 'no-cache, no-transform',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # Called when the server closes the response, whether or not it was streamed
+    response.call_on_close(event_service.close_stream)
+    return response
@@ -0,0 +1,74 @@
+from flask import Blueprint, abort, current_app, jsonify, request, send_file
+from api.services.container import get_services
+
+# Initialize blueprint
+profiling_bp = Blueprint('profiling', __name__)
+
+@profiling_bp.before_request
+def require_profiling():
+    """
+    Hide the profiling endpoints unless profiling is enabled, and require
+    the profiling token when one is configured.
+    """
+    if not current_app.config.get('PROFILING_ENABLED'):
+        abort(404)
+    token = current_app.config.get('PROFILING_TOKEN')
+    if token and request.headers.get('X-Profile-Token') != token:
+        abort(403)
+
+@profiling_bp.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    """
+    List the stored profiles and the running sampling window.
+
+    :return: JSON response with profile metadata, newest first
+    """
+    profiles = get_services().profiler.list_profiles()
+    return jsonify({
+        'profiles': [
+            {key: value for key, value in profile.items() if key != 'path'}
+            for profile in profiles
+        ],
+        'window': get_services().profiler.window_status()
+    })
+
+@profiling_bp.route('/admin/profiles/window', methods=['POST'])
+def start_profiling_window():
+    """
+    Sample the stacks of every thread for a few seconds.
+
+    The JSON body may set ``seconds`` (default 10) and ``interval_ms``. The
+    collapsed stacks are stored as a profile once the window ends.
+
+    :return: JSON response with the window status, 409 if one is running
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        seconds = float(body.get('seconds', 10))
+        interval_ms = body.get('interval_ms')
+        interval = float(interval_ms) / 1000 if interval_ms else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    if seconds <= 0 or (interval is not None and interval <= 0):
+        return jsonify({'error': 'seconds and interval_ms must be positive'}), 400
+
+    window = get_services().profiler.start_window(seconds, interval)
+    if window is None:
+        return jsonify({
+            'error': 'A sampling window is already running',
+            'window': get_services().profiler.window_status()
+        }), 409
+    return jsonify({'window': window}), 202
+
+@profiling_bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """
+    Download a stored profile, a pstats file or collapsed stacks.
+
+    :param profile_id: Identifier of the profile
+    :return: Profile file
+    """
+    path = get_services().profiler.get_profile_path(profile_id)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, as_attachment=True)
@@ -1,18 +1,49 @@
-from flask import Blueprint, jsonify
-from api.services.document_service import DocumentService
-from api.services.report_service import ReportService
-from api.services.schema_service import SchemaService
+import datetime
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from api.services.analytics_service import AnalyticsService
+from api.services.container import get_services
+from api.utils.cache_utils import VersionedResponseCache, conditional_json_response
+from api.utils.export_utils import iter_csv, iter_ndjson
 
-# Initialize blueprint and services
+# Initialize blueprint
 reports_bp = Blueprint('reports', __name__)
+response_cache = VersionedResponseCache()
 
+def _date_arg(name):
+    """
+    Parse an ISO 8601 query parameter as a naive local datetime, the form
+    processing times are stored in.
+    
+    :param name: Query parameter name
+    :return: Datetime, or None if the parameter is missing
+    :raises ValueError: If the parameter is not an ISO 8601 date
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
 
-schema_service = SchemaService()
-document_service = DocumentService(
-    classification_service=None,
-    schema_service=schema_service
-)
-report_service = ReportService(document_service)
+def _report_response(schema_id=None):
+    """
+    Serve a report from the response cache, revalidating against the
+    document and schema store versions.
+    
+    :param schema_id: Optional schema ID to filter documents
+    :return: Flask response, or None if the report does not exist
+    """
+    services = get_services()
+    document_service = services.document_service
+    schema_service = services.schema_service
+    return conditional_json_response(
+        response_cache,
+        key=('report', schema_id),
+        version=(document_service.get_version(), schema_service.version),
+        last_modified=max(document_service.updated_at, schema_service.updated_at),
+        build=lambda: services.report_service.get_report(schema_id)
+    )
 
 @reports_bp.route('/reports', methods=['GET'])
 def get_reports():
@@ -21,7 +52,7 @@ def get_reports():
     
     :return: JSON response with report data
     """
-    return jsonify(report_service.get_report())
+    return _report_response()
 
 @reports_bp.route('/reports/<schema_id>', methods=['GET'])
 def get_schema_report(schema_id):
@@ -31,9 +62,109 @@ def get_schema_report(schema_id):
     :param schema_id: Schema identifier
     :return: JSON response with schema-specific report data
     """
-    report = report_service.get_report(schema_id)
+    # Checked before revalidation, so a stale ETag for a schema that no
+    # longer exists is answered with 404 rather than 304
+    if not get_services().report_service.has_schema_report(schema_id):
+        return jsonify({"error": f"No documents found for schema {schema_id}"}), 404
     
-    if report is None:
+    response = _report_response(schema_id)
+    
+    if response is None:
         return jsonify({"error": f"No documents found for schema {schema_id}"}), 404
     
-    return jsonify(report)
\ No newline at end of file
+    return response
+
+@reports_bp.route('/reports/analytics', methods=['GET'])
+def get_analytics():
+    """
+    Get time-bucketed document statistics for a window.
+    
+    Served from rollup tables, so only the buckets inside the requested
+    window are read. Query parameters: ``granularity`` (``hour``, ``day``
+    or ``week``, default ``day``), ``from`` and ``to`` (ISO 8601, default
+    the last 30 days) and ``schema_id``.
+    
+    :return: JSON response with one data point per bucket and schema
+    """
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in AnalyticsService.GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of {list(AnalyticsService.GRANULARITIES)}"}), 400
+    
+    try:
+        end = _date_arg('to') or datetime.datetime.now()
+        start = _date_arg('from') or end - datetime.timedelta(days=30)
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO 8601 dates"}), 400
+    
+    schema_id = request.args.get('schema_id')
+    services = get_services()
+    document_service = services.document_service
+    
+    def build():
+        return {
+            "granularity": granularity,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "schema_id": schema_id,
+            "points": services.analytics_service.query(granularity, start, end, schema_id)
+        }
+    
+    # The resolved window is part of the version: without an explicit
+    # ``to`` it ends now, so the same URL covers a different window on every
+    # request and must not be answered with 304
+    return conditional_json_response(
+        response_cache,
+        key=('analytics', granularity, start, end, schema_id),
+        version=(document_service.get_version(), start.isoformat(), end.isoformat()),
+        last_modified=document_service.updated_at if request.args.get('to') else end.timestamp(),
+        build=build
+    )
+
+@reports_bp.route('/reports/export', methods=['GET'])
+def export_documents():
+    """
+    Stream processed documents as NDJSON or CSV.
+    
+    Documents are encoded and sent as they are scanned, so memory use and
+    time to first byte do not grow with the size of the archive.
+    
+    Query parameters: ``format`` (``ndjson`` or ``csv``), ``schema_id``,
+    ``from`` and ``to`` (ISO 8601 dates), ``min_confidence`` and
+    ``include_content`` (NDJSON only).
+    
+    :return: Streaming response with the exported documents
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be 'ndjson' or 'csv'"}), 400
+    
+    try:
+        start = _date_arg('from')
+        end = _date_arg('to')
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO 8601 dates"}), 400
+    
+    min_confidence = request.args.get('min_confidence', type=float)
+    
+    document_service = get_services().document_service
+    documents = document_service.iter_documents(
+        schema_id=request.args.get('schema_id'),
+        start=start,
+        end=end,
+        min_confidence=min_confidence
+    )
+    
+    if export_format == 'csv':
+        body = iter_csv(documents)
+        mimetype = 'text/csv'
+    else:
+        include_content = request.args.get('include_content') == 'true'
+        if include_content:
+            # Parsed text is stored per document, read it as the export streams
+            documents = document_service.iter_with_content(documents)
+        body = iter_ndjson(documents, include_content)
+        mimetype = 'application/x-ndjson'
+    
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=documents.{export_format}'
+    return response
@@ -1,9 +1,10 @@
 from flask import Blueprint, jsonify, request
-from api.services.schema_service import SchemaService
+from api.services.container import get_services
+from api.utils.cache_utils import VersionedResponseCache, conditional_json_response
 
-# Initialize blueprint and service
+# Initialize blueprint
 schemas_bp = Blueprint('schemas', __name__)
-schema_service = SchemaService()
+response_cache = VersionedResponseCache()
 
 @schemas_bp.route('/schemas', methods=['GET'])
 def get_schemas():
@@ -13,8 +14,14 @@ def get_schemas():
     Returns:
         JSON response with list of schemas
     """
-    schemas = schema_service.get_schemas()
-    return jsonify(schemas)
+    schema_service = get_services().schema_service
+    return conditional_json_response(
+        response_cache,
+        key=('schemas',),
+        version=schema_service.version,
+        last_modified=schema_service.updated_at,
+        build=schema_service.get_schemas
+    )
 
 @schemas_bp.route('/schemas/<schema_id>', methods=['GET'])
 def get_schema(schema_id):
@@ -27,9 +34,16 @@ def get_schema(schema_id):
     Returns:
         JSON response with schema or error
     """
-    schema = schema_service.get_schema(schema_id)
-    if schema:
-        return jsonify(schema)
+    schema_service = get_services().schema_service
+    response = conditional_json_response(
+        response_cache,
+        key=('schema', schema_id),
+        version=schema_service.version,
+        last_modified=schema_service.updated_at,
+        build=lambda: schema_service.get_schema(schema_id)
+    )
+    if response:
+        return response
     return jsonify({"error": f"Schema {schema_id} not found"}), 404
 
 @schemas_bp.route('/schemas', methods=['POST'])
@@ -40,6 +54,7 @@ def add_schema():
     Returns:
         JSON response indicating success or error
     """
+    schema_service = get_services().schema_service
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
@@ -66,6 +81,7 @@ def update_schema(schema_id):
     Returns:
         JSON response indicating success or error
     """
+    schema_service = get_services().schema_service
     schema = request.json
     if not schema:
         return jsonify({"error": "No schema provided"}), 400
@@ -86,6 +102,7 @@ def delete_schema(schema_id):
     Returns:
         JSON response indicating success or error
     """
+    schema_service = get_services().schema_service
     success, error = schema_service.delete_schema(schema_id)
     if success:
         return jsonify({"message": f"Schema {schema_id} deleted successfully"})
@@ -102,6 +119,7 @@ def validate_document(schema_id):
     Returns:
         JSON response with validation result
     """
+    schema_service = get_services().schema_service
     document = request.json
     if not document:
         return jsonify({"error": "No document provided"}), 400
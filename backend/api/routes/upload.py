@@ -1,29 +1,27 @@
-from flask import Blueprint, jsonify, request
-from api.utils.file_utils import allowed_file, save_uploaded_file
-from api.services.classification_service import ClassificationService
-from api.services.document_service import DocumentService
-from api.services.schema_service import SchemaService
+from flask import Blueprint, current_app, jsonify, request
+from api.utils.file_utils import allowed_file
+from api.services.container import get_services
+from api.services.document_service import UncommittedDocumentError
+from api.services.quarantine_service import QuarantinedDocumentError
+from api.utils.pdf_extractors import extraction_stats
 
-from config import Config
-
-# Initialize blueprint and services
+# Initialize blueprint
 upload_bp = Blueprint('upload', __name__)
 
-# Create services
-schema_service = SchemaService()
-classification_service = ClassificationService(
-    schema_service=schema_service
-)
-document_service = DocumentService(
-    classification_service=classification_service,
-    schema_service=schema_service
-)
-
 @upload_bp.route('/upload', methods=['POST'])
 def upload_file():
     """
     Handle file upload and processing.
     
+    With ``mode=fast`` (query string or form field) the document is stored as
+    pending and classified in the background, so the response returns as soon
+    as the file is saved.
+    
+    Every response carrying a ``classification_id`` names a document that
+    exists and is served. A 202 with ``committed: false`` means its commit
+    failed or timed out: the document is kept and written with the store's
+    next commit or checkpoint, and must not be uploaded again.
+    
     :return: JSON response with upload and processing results
     """
     # Check if the post request has the file part
@@ -37,13 +35,35 @@ def upload_file():
         return jsonify({'error': 'No file selected'}), 400
     
     # Check if file is allowed
-    if file and allowed_file(file.filename, Config.ALLOWED_EXTENSIONS):
+    if file and allowed_file(file.filename, current_app.config['ALLOWED_EXTENSIONS']):
+        services = get_services()
+        document_service = services.document_service
+        storage_service = services.storage_service
         try:
-            # Save the file
-            filepath = save_uploaded_file(file, Config.UPLOAD_FOLDER)
+            # Save the file, held so archival of identical content cannot
+            # remove it while this upload is processed
+            filepath = storage_service.save_upload(file)
+            
+            # Fast path: defer classification to the background worker
+            fast_mode = (request.args.get('mode') or request.form.get('mode')) == 'fast'
             
             # Process the document
-            document = document_service.process_document(file.filename, filepath)
+            try:
+                document = document_service.process_document(
+                    file.filename,
+                    filepath,
+                    defer_classification=fast_mode
+                )
+            finally:
+                storage_service.release(filepath)
+            
+            # Pending in fast mode, or because the LLM is unavailable
+            if _enqueue_if_pending(document):
+                return jsonify({
+                    'success': True,
+                    'message': 'File uploaded, classification queued',
+                    'document': document
+                }), 202
             
             return jsonify({
                 'success': True,
@@ -51,9 +71,103 @@ def upload_file():
                 'document': document
             }), 201
         
+        except UncommittedDocumentError as e:
+            _enqueue_if_pending(e.document)
+            return jsonify({
+                'success': True,
+                'message': f'File processed, but not durably stored yet: {str(e)}',
+                'classification_id': e.document['classification_id'],
+                'committed': False,
+                'document': e.document
+            }), 202
+        
+        except QuarantinedDocumentError as e:
+            return jsonify({
+                'error': str(e),
+                'quarantine': e.record
+            }), 422
+        
         except Exception as e:
             return jsonify({
                 'error': f'File upload and processing failed: {str(e)}'
             }), 500
         
-    return jsonify({'error': 'File type not allowed'}), 400
\ No newline at end of file
+    return jsonify({'error': 'File type not allowed'}), 400
+
+def _enqueue_if_pending(document):
+    """
+    Queue a document stored as pending for background classification.
+    
+    :param document: Processed document
+    :return: True if the document was pending
+    """
+    services = get_services()
+    if document['schema_id'] != services.document_service.PENDING_SCHEMA_ID:
+        return False
+    services.reclassification_service.enqueue_document(document['classification_id'])
+    return True
+
+@upload_bp.route('/reclassify', methods=['POST'])
+def reclassify_documents():
+    """
+    Queue stored documents for background reclassification.
+    
+    Expects a JSON body with ``schema_id`` (reclassify every document stored
+    under that schema) or ``classification_id`` (a single document).
+    
+    :return: JSON response with the number of queued documents
+    """
+    reclassification_service = get_services().reclassification_service
+    data = request.json or {}
+    schema_id = data.get('schema_id')
+    classification_id = data.get('classification_id')
+    
+    if classification_id:
+        queued = 1 if reclassification_service.enqueue_document(classification_id) else 0
+    elif schema_id:
+        queued = reclassification_service.enqueue_schema(schema_id)
+    else:
+        return jsonify({'error': 'schema_id or classification_id is required'}), 400
+    
+    return jsonify({
+        'queued': queued,
+        'pending': reclassification_service.queued_count()
+    }), 202
+
+
+@upload_bp.route('/storage/maintenance', methods=['POST'])
+def run_storage_maintenance():
+    """
+    Run upload retention and garbage collection immediately.
+    
+    :return: JSON response summarizing the maintenance run
+    """
+    services = get_services()
+    return jsonify(services.storage_service.run_maintenance(services.document_service))
+
+
+@upload_bp.route('/extraction/stats', methods=['GET'])
+def get_extraction_stats():
+    """
+    Get PDF text extraction throughput per backend.
+    
+    :return: JSON response with the configured backend order and per-backend
+             counters, pages per second and characters per second
+    """
+    return jsonify({
+        'preference': get_services().document_service.extractor_policy.preference,
+        'backends': extraction_stats.summary()
+    })
+
+
+@upload_bp.route('/quarantine', methods=['GET'])
+def get_quarantine():
+    """
+    List PDFs quarantined for exceeding the parsing limits.
+    
+    :return: JSON response with the most recent quarantine records
+    """
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({
+        'files': get_services().quarantine_service.get_records(limit)
+    })
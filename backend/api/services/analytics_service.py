@@ -0,0 +1,221 @@
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class AnalyticsService:
+    """
+    Time-bucketed document statistics backed by rollup tables.
+
+    Every processed document is added to one row per granularity
+    (hour/day/week) and schema, so range queries read a handful of rows
+    per bucket instead of scanning the document store.
+    """
+    GRANULARITIES = ('hour', 'day', 'week')
+
+    def __init__(self, db_path=None):
+        """
+        Initialize the analytics service.
+
+        :param db_path: Path of the SQLite rollup database
+        """
+        self.db_path = db_path or os.path.join(
+            os.path.dirname(__file__),
+            '../../_documents/analytics.sqlite3'
+        )
+        self._lock = threading.Lock()
+
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        self._create_tables()
+
+    @contextmanager
+    def _connect(self):
+        """
+        Open a connection, committing on success and always closing it.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _create_tables(self):
+        """
+        Create the rollup tables if they do not exist yet.
+        """
+        with self._connect() as conn:
+            # WAL lets report queries read while uploads write
+            conn.execute("PRAGMA journal_mode=WAL")
+            # The primary key doubles as the (granularity, bucket_start) index
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollups (
+                    granularity TEXT NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    schema_id TEXT NOT NULL,
+                    document_count INTEGER NOT NULL DEFAULT 0,
+                    confidence_sum REAL NOT NULL DEFAULT 0,
+                    latency_count INTEGER NOT NULL DEFAULT 0,
+                    latency_sum_ms REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (granularity, bucket_start, schema_id)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analytics_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+
+    @classmethod
+    def bucket_start(cls, timestamp: datetime.datetime, granularity: str) -> str:
+        """
+        Truncate a timestamp to the start of its bucket.
+
+        :param timestamp: Timestamp to truncate
+        :param granularity: One of GRANULARITIES
+        :return: ISO 8601 bucket start
+        """
+        if granularity == 'hour':
+            start = timestamp.replace(minute=0, second=0, microsecond=0)
+        elif granularity == 'day':
+            start = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+        elif granularity == 'week':
+            day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+            start = day - datetime.timedelta(days=day.weekday())
+        else:
+            raise ValueError(f"Unknown granularity '{granularity}'")
+        return start.isoformat()
+
+    def _apply(self, conn, document: Dict[str, Any], sign: int):
+        """
+        Add (sign=1) or remove (sign=-1) a document from every rollup.
+
+        :param conn: Open SQLite connection
+        :param document: Document with processed_at, schema_id and confidence
+        :param sign: 1 to add, -1 to remove
+        """
+        try:
+            processed_at = datetime.datetime.fromisoformat(document['processed_at'])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        latency = document.get('classification_ms')
+        has_latency = 1 if latency is not None else 0
+
+        for granularity in self.GRANULARITIES:
+            conn.execute("""
+                INSERT INTO rollups (granularity, bucket_start, schema_id, document_count,
+                                     confidence_sum, latency_count, latency_sum_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (granularity, bucket_start, schema_id) DO UPDATE SET
+                    document_count = document_count + excluded.document_count,
+                    confidence_sum = confidence_sum + excluded.confidence_sum,
+                    latency_count = latency_count + excluded.latency_count,
+                    latency_sum_ms = latency_sum_ms + excluded.latency_sum_ms
+            """, (
+                granularity,
+                self.bucket_start(processed_at, granularity),
+                document.get('schema_id') or '',
+                sign,
+                sign * (document.get('confidence') or 0),
+                sign * has_latency,
+                sign * (latency or 0)
+            ))
+
+    def record_document(self, document: Dict[str, Any]):
+        """
+        Add a newly processed document to the rollups.
+
+        :param document: Processed document
+        """
+        with self._lock, self._connect() as conn:
+            self._apply(conn, document, 1)
+
+    def move_document(self, previous: Dict[str, Any], current: Dict[str, Any]):
+        """
+        Replace a document's previous classification in the rollups with
+        its current one, in a single transaction.
+
+        :param previous: Document as it was counted before
+        :param current: Document after reclassification
+        """
+        with self._lock, self._connect() as conn:
+            self._apply(conn, previous, -1)
+            self._apply(conn, current, 1)
+
+    def backfill(self, documents: Iterable[Dict[str, Any]]):
+        """
+        Build the rollups from existing documents, once per database.
+
+        :param documents: Every stored document
+        """
+        with self._lock, self._connect() as conn:
+            # Take the write lock up front so concurrent workers backfill once
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute(
+                "SELECT 1 FROM analytics_meta WHERE key = 'backfilled'"
+            ).fetchone():
+                return
+
+            count = 0
+            for document in documents:
+                self._apply(conn, document, 1)
+                count += 1
+            conn.execute(
+                "INSERT INTO analytics_meta (key, value) VALUES ('backfilled', ?)",
+                (datetime.datetime.now().isoformat(),)
+            )
+        self.logger.info(f"Backfilled analytics rollups from {count} documents")
+
+    def query(self,
+              granularity: str,
+              start: datetime.datetime,
+              end: datetime.datetime,
+              schema_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get per-bucket, per-schema statistics for a time window.
+
+        :param granularity: One of GRANULARITIES
+        :param start: Start of the window (inclusive)
+        :param end: End of the window (exclusive)
+        :param schema_id: Optional schema ID to restrict the series to
+        :return: List of data points ordered by bucket
+        """
+        if granularity not in self.GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}'")
+
+        sql = """
+            SELECT bucket_start, schema_id, document_count, confidence_sum,
+                   latency_count, latency_sum_ms
+            FROM rollups
+            WHERE granularity = ? AND bucket_start >= ? AND bucket_start < ?
+              AND document_count > 0
+        """
+        params = [granularity, self.bucket_start(start, granularity), end.isoformat()]
+        if schema_id:
+            sql += " AND schema_id = ?"
+            params.append(schema_id)
+        sql += " ORDER BY bucket_start, schema_id"
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        return [
+            {
+                "bucket_start": bucket_start,
+                "schema_id": row_schema_id,
+                "count": document_count,
+                "avg_confidence": round(confidence_sum / document_count, 3),
+                "avg_latency_ms": round(latency_sum_ms / latency_count, 1) if latency_count else None
+            }
+            for bucket_start, row_schema_id, document_count, confidence_sum,
+                latency_count, latency_sum_ms in rows
+        ]
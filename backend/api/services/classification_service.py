@@ -1,13 +1,25 @@
 import logging
+import httpx
 import requests
 import json
 import re
 import os
 
+from api.utils.circuit_breaker import CircuitBreaker
+
+class ClassificationUnavailableError(Exception):
+    """
+    Raised when the LLM cannot be reached, so classification should be
+    deferred rather than falling back to a generic type
+    """
+
 class ClassificationService:
     """
     Service responsible for classifying documents using an LLM API
     """
+    # Number of leading document characters included in the prompt
+    PROMPT_TEXT_LIMIT = 2000
+
     def __init__(self, schema_service=None):
         """
         Initialize the classification service
@@ -24,6 +36,20 @@ class ClassificationService:
         # Schema service
         self.schema_service = schema_service
         
+        # Fail fast while the LLM is down: short connect timeout, separate
+        # read timeout for generation, and a circuit breaker around the call
+        self.connect_timeout = float(os.environ.get('LLM_CONNECT_TIMEOUT', '3'))
+        self.read_timeout = float(os.environ.get('LLM_READ_TIMEOUT', '120'))
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=int(os.environ.get('LLM_BREAKER_FAILURE_THRESHOLD', '5')),
+            reset_timeout=float(os.environ.get('LLM_BREAKER_RESET_SECONDS', '30'))
+        )
+        
+        # Connections the async client keeps open to the gateway; bounds the
+        # classifications in flight on the event loop
+        self.max_concurrent_requests = int(os.environ.get('LLM_MAX_CONCURRENT_REQUESTS', '100'))
+        self._async_client = None
+        
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
@@ -49,98 +75,235 @@ class ClassificationService:
         
         return []
 
-    def classify_document(self, parsed_content: dict) -> dict:
+    def build_response_schema(self, document_types: list) -> dict:
         """
-        Classify a document using LLM text generation API
+        Build the JSON schema the LLM answer is constrained to
         
-        :param parsed_content: Parsed PDF content
-        :return: Classification result
+        :param document_types: Allowed document type titles
+        :return: JSON schema for the classification answer
         """
-        # Get available document types
-        document_types = self.get_document_types()
+        schema_id_property = {"type": "string"}
+        if document_types:
+            schema_id_property["enum"] = document_types
         
-        try:
-            # Prepare the text for classification
-            full_text = " ".join([page['text'] for page in parsed_content.get('content', [])])
-            
-            # Prepare classification prompt
-            classification_prompt = f"""
-Analyze the following document text and determine its type. 
+        return {
+            "type": "object",
+            "properties": {
+                "schema_id": schema_id_property,
+                "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+                "reasoning": {"type": "string"}
+            },
+            "required": ["schema_id", "confidence", "reasoning"]
+        }
+
+    def build_system_prompt(self, document_types: list) -> str:
+        """
+        Build the instructions shared by every classification request
+        
+        Contains nothing document-specific and lists the types in sorted
+        order, so it is byte-identical across requests until the schemas
+        change and the LLM can reuse its evaluated prefix.
+        
+        :param document_types: Allowed document type titles
+        :return: System prompt
+        """
+        return f"""You classify documents by type.
 Possible document types are: {', '.join(document_types)}.
 
-Provide a JSON response in the following format with no additional text:
-{{
-    "schema_id": "chosen document type",
-    "reasoning": "explanation"
-}}
+Respond with JSON only: "schema_id" is the chosen document type,
+"confidence" is how certain you are of it, from 0 to 1, and
+"reasoning" is one short sentence explaining the choice.
 
-The document text will start and end with "==========" but could be empty:
-==========
-{full_text[:2000]}
+The document text will start and end with "==========" but could be empty."""
+
+    def _build_request(self, parsed_content: dict, document_types: list) -> dict:
+        """
+        Build the gateway request classifying a document
+        
+        :param parsed_content: Parsed PDF content
+        :param document_types: Allowed document type titles, sorted
+        :return: JSON body for the gateway's generate endpoint
+        """
+        # Prepare the text for classification
+        full_text = " ".join([page['text'] for page in parsed_content.get('content', [])])
+        
+        # Stable instructions as the system prompt, the document as the
+        # variable suffix
+        system_prompt = self.build_system_prompt(document_types)
+        classification_prompt = f"""==========
+{full_text[:self.PROMPT_TEXT_LIMIT]}
 ==========
 """
-            
-            self.logger.info(f"Classification Prompt: {classification_prompt}")
-
+        
+        self.logger.info(f"Classification Prompt: {classification_prompt}")
+        
+        return {
+            "system": system_prompt,
+            "prompt": classification_prompt,
+            "max_new_tokens": 150,
+            "temperature": 0.0,
+            # Constrain decoding so the gateway returns a parsed object
+            "format": self.build_response_schema(document_types),
+            # Let the gateway route to its fast model first and
+            # escalate if the answer is not one of our types
+            "prompt_type": "classification",
+            "allowed_choices": document_types,
+            # Attributes token usage to this service in the gateway
+            "caller": "backend.classification"
+        }
 
-            # Call LLM text generation endpoint
-            response = requests.post(
-                f"{self.llm_api_url}/api/generate", 
-                json={
-                    "prompt": classification_prompt,
-                    "max_new_tokens": 500,
-                    "temperature": 0.7
-                },
-                timeout=120  # Add a timeout to prevent hanging
+    def _check_circuit(self):
+        """
+        Fail fast while the LLM is known to be down
+        """
+        if not self.circuit_breaker.allow_request():
+            raise ClassificationUnavailableError(
+                f"LLM circuit open, retry in {self.circuit_breaker.retry_after():.0f}s"
             )
 
-            self.logger.info(f"Response Text: {response.text}")
+    def _handle_response(self, status_code: int, response_text: str, document_types: list) -> dict:
+        """
+        Turn a gateway response into a classification result
+        
+        :param status_code: HTTP status of the response
+        :param response_text: Response body
+        :param document_types: Allowed document type titles
+        :return: Classification result
+        """
+        self.logger.info(f"Response Text: {response_text}")
 
-            # Check if request was successful
-            if response.status_code == 200:
+        # Only 5xx responses and gateway errors marked retryable (Ollama down,
+        # timeouts, every node failing) are an outage; the document stays
+        # pending and the breaker counts the failure
+        try:
+            response_data = json.loads(response_text) if status_code == 200 else {}
+        except ValueError:
+            response_data = {"error": "invalid response body", "retryable": True}
+        if status_code >= 500 or (status_code == 200 and response_data.get('retryable')):
+            self.circuit_breaker.record_failure()
+            raise ClassificationUnavailableError(
+                f"LLM gateway error: {response_data.get('error', status_code)}"
+            )
 
-                # Extract the generated text
-                generated_text = response.json().get('text', '')
-                
-                # Try to extract JSON from the generated text
-                try:
-                    # Use regex to extract JSON
-                    json_match = re.search(r'\{.*\}', generated_text, re.DOTALL)
-                    if json_match:
-                        classification = json.loads(json_match.group(0))
-                        
-                        # Validate and fallback if needed
-                        schema_id = classification.get('schema_id', '')
-                        if schema_id not in document_types:
-                            schema_id = 'Generic Document'
-                        
-                        # Ensure confidence is within 0-1 range
-                        confidence = max(0, min(1, classification.get('confidence', 0.5)))
-                        
-                        return {
-                            "schema_id": schema_id,
-                            "reasoning": classification.get('reasoning', 'Classification based on document content')
-                        }
-                    
-                    # Fallback if JSON parsing fails
-                    self.logger.warning(f"Failed to parse classification JSON: {generated_text}")
-                except (json.JSONDecodeError, ValueError) as e:
-                    self.logger.error(f"JSON parsing error: {str(e)}")
-            
-            # Fallback to generic classification
+        # The gateway answered, so it is up even if the request was rejected
+        self.circuit_breaker.record_success()
+
+        # Permanent errors (4xx, model not found) would fail again on retry;
+        # store them as a failed classification instead
+        if status_code != 200 or 'error' in response_data:
+            error = response_data.get('error', f"HTTP {status_code}")
+            self.logger.error(f"Classification failed permanently: {error}")
             return {
                 "schema_id": "Generic Document",
-                "confidence": 0.5,
-                "reasoning": "Unable to classify document"
+                "confidence": 0.0,
+                "reasoning": f"Classification failed: {error}",
+                "classification_error": error
             }
+
+        # Extract the generated text
+        generated_text = response_data.get('text', '')
+        self.logger.info(
+            f"Answered by {response_data.get('model')} "
+            f"(tier: {response_data.get('tier')}, escalated: {response_data.get('escalated')}, "
+            f"timings: {response_data.get('timings')}, usage: {response_data.get('usage')})"
+        )
+        
+        # Prefer the object the gateway already parsed and validated
+        classification = response_data.get('data')
         
+        try:
+            if classification is None:
+                # Gateway could not validate the output; try to extract JSON ourselves
+                json_match = re.search(r'\{.*\}', generated_text, re.DOTALL)
+                if json_match:
+                    classification = json.loads(json_match.group(0))
+            
+            if isinstance(classification, dict):
+                # Validate and fallback if needed
+                schema_id = classification.get('schema_id', '')
+                if schema_id not in document_types:
+                    schema_id = 'Generic Document'
+                
+                # Ensure confidence is within 0-1 range
+                confidence = classification.get('confidence', 0.5)
+                if not isinstance(confidence, (int, float)):
+                    confidence = 0.5
+                
+                return {
+                    "schema_id": schema_id,
+                    "confidence": max(0.0, min(1.0, float(confidence))),
+                    "reasoning": classification.get('reasoning', 'Classification based on document content')
+                }
+            
+            # Fallback if JSON parsing fails
+            self.logger.warning(f"Failed to parse classification JSON: {generated_text}")
+        except (json.JSONDecodeError, ValueError) as e:
+            self.logger.error(f"JSON parsing error: {str(e)}")
+    
+        # Fallback to generic classification
+        return {
+            "schema_id": "Generic Document",
+            "confidence": 0.5,
+            "reasoning": "Unable to classify document"
+        }
+
+    def classify_document(self, parsed_content: dict) -> dict:
+        """
+        Classify a document using LLM text generation API
+        
+        :param parsed_content: Parsed PDF content
+        :return: Classification result
+        """
+        # Get available document types, sorted for a stable prompt prefix
+        document_types = sorted(self.get_document_types())
+        self._check_circuit()
+        
+        try:
+            # Call LLM text generation endpoint
+            response = requests.post(
+                f"{self.llm_api_url}/api/generate", 
+                json=self._build_request(parsed_content, document_types),
+                # Short connect timeout so an unreachable gateway fails fast
+                timeout=(self.connect_timeout, self.read_timeout)
+            )
         except requests.RequestException as e:
-            # Handle network or request errors
+            # Network errors count against the circuit; the caller defers the document
             self.logger.error(f"Classification request error: {str(e)}")
-            return {
-                "schema_id": "Generic Document",
-                "reasoning": f"Classification request error: {str(e)}"
-            }
+            self.circuit_breaker.record_failure()
+            raise ClassificationUnavailableError(f"Classification request error: {str(e)}") from e
+        
+        return self._handle_response(response.status_code, response.text, document_types)
+
+    async def classify_document_async(self, parsed_content: dict) -> dict:
+        """
+        Classify a document without holding a thread while the LLM works
+        
+        Must be awaited on the event loop of the AsyncRuntime, which owns
+        the shared HTTP client. Same results and errors as classify_document.
+        
+        :param parsed_content: Parsed PDF content
+        :return: Classification result
+        """
+        document_types = sorted(self.get_document_types())
+        self._check_circuit()
+        
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_concurrent_requests)
+            )
+        
+        try:
+            response = await self._async_client.post(
+                f"{self.llm_api_url}/api/generate",
+                json=self._build_request(parsed_content, document_types)
+            )
+        except httpx.HTTPError as e:
+            self.logger.error(f"Classification request error: {str(e)}")
+            self.circuit_breaker.record_failure()
+            raise ClassificationUnavailableError(f"Classification request error: {str(e)}") from e
+        
+        return self._handle_response(response.status_code, response.text, document_types)
 
     def get_supported_document_types(self) -> list:
         """
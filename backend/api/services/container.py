@@ -0,0 +1,225 @@
+import logging
+import os
+import threading
+import time
+
+from flask import current_app
+
+from api.services.analytics_service import AnalyticsService
+from api.services.classification_service import ClassificationService
+from api.services.quarantine_service import QuarantineService
+from api.services.document_service import DocumentService
+from api.services.event_service import EventService
+from api.services.reclassification_service import ReclassificationService
+from api.services.report_service import ReportService
+from api.services.schema_service import SchemaService
+from api.services.similarity_service import SimilarityService
+from api.services.storage_service import StorageService
+from api.utils.async_runtime import AsyncRuntime
+from api.utils.document_store import DocumentStore
+from api.utils.pdf_extractors import ExtractorPolicy
+from api.utils.pdf_sandbox import SandboxedPdfParser
+from api.utils.profiling import RequestProfiler
+
+
+class ServiceContainer:
+    """
+    Services shared by every blueprint of an application.
+
+    Nothing is constructed at import time: each service is built on first
+    access, so importing the app (or forking a worker) does not read the
+    document store, and all routes share a single instance of each service.
+    """
+    def __init__(self, config):
+        """
+        Initialize the container
+
+        :param config: Flask application config
+        """
+        self.config = config
+        self._services = {}
+        # Reentrant because factories resolve the services they depend on
+        self._lock = threading.RLock()
+
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    def _get(self, name, factory):
+        """
+        Get a service, building it on first access
+
+        :param name: Service name
+        :param factory: Callable that builds the service
+        :return: Service instance
+        """
+        service = self._services.get(name)
+        if service is None:
+            with self._lock:
+                service = self._services.get(name)
+                if service is None:
+                    service = factory()
+                    self._services[name] = service
+        return service
+
+    @property
+    def schema_service(self):
+        return self._get('schema_service', SchemaService)
+
+    @property
+    def storage_service(self):
+        return self._get('storage_service', lambda: StorageService(
+            upload_folder=self.config['UPLOAD_FOLDER'],
+            archive_folder=self.config['UPLOAD_ARCHIVE_FOLDER'],
+            retention_days=self.config['UPLOAD_RETENTION_DAYS'],
+            gc_grace_seconds=self.config['UPLOAD_GC_GRACE_SECONDS'],
+            archive_after_extraction=self.config['UPLOAD_ARCHIVE_AFTER_EXTRACTION']
+        ))
+
+    @property
+    def classification_service(self):
+        return self._get('classification_service', lambda: ClassificationService(
+            schema_service=self.schema_service
+        ))
+
+    @property
+    def analytics_service(self):
+        return self._get('analytics_service', AnalyticsService)
+
+    @property
+    def similarity_service(self):
+        if not self.config['NEAR_DUPLICATE_DETECTION']:
+            return None
+        return self._get('similarity_service', lambda: SimilarityService(
+            threshold=self.config['NEAR_DUPLICATE_THRESHOLD']
+        ))
+
+    @property
+    def event_service(self):
+        return self._get('event_service', lambda: EventService(
+            buffer_size=self.config['EVENT_BUFFER_SIZE'],
+            max_streams=self.config['EVENT_MAX_STREAMS']
+        ))
+
+    @property
+    def quarantine_service(self):
+        return self._get('quarantine_service', lambda: QuarantineService(
+            quarantine_folder=self.config['QUARANTINE_FOLDER']
+        ))
+
+    @property
+    def pdf_parser(self):
+        if not self.config['PARSE_IN_WORKERS']:
+            return None
+        return self._get('pdf_parser', lambda: SandboxedPdfParser(
+            workers=self.config['PARSE_WORKERS'],
+            tasks_per_worker=self.config['PARSE_TASKS_PER_WORKER'],
+            timeout=self.config['PARSE_TIMEOUT_SECONDS'],
+            memory_limit_mb=self.config['PARSE_MEMORY_LIMIT_MB'],
+            max_pages=self.config['PARSE_MAX_PAGES'],
+            max_decompressed_mb=self.config['PARSE_MAX_DECOMPRESSED_MB'],
+            extractor_preference=self.config['PDF_EXTRACTORS']
+        ))
+
+    @property
+    def async_runtime(self):
+        if not self.config['ASYNC_CLASSIFICATION']:
+            return None
+        return self._get('async_runtime', lambda: AsyncRuntime(
+            executor_workers=self.config['ASYNC_EXECUTOR_WORKERS']
+        ))
+
+    @property
+    def profiler(self):
+        if not self.config['PROFILING_ENABLED']:
+            return None
+        return self._get('profiler', lambda: RequestProfiler(
+            output_dir=self.config['PROFILE_FOLDER'],
+            max_profiles=self.config['PROFILE_MAX_FILES'],
+            sample_interval=self.config['PROFILE_SAMPLE_INTERVAL_MS'] / 1000,
+            max_window_seconds=self.config['PROFILE_MAX_WINDOW_SECONDS']
+        ))
+
+    @property
+    def document_service(self):
+        return self._get('document_service', self._build_document_service)
+
+    @property
+    def reclassification_service(self):
+        return self._get('reclassification_service', self._build_reclassification_service)
+
+    @property
+    def report_service(self):
+        return self._get('report_service', lambda: ReportService(self.document_service))
+
+    def _build_document_service(self):
+        """
+        Build the document service and start upload maintenance for it
+
+        :return: DocumentService instance
+        """
+        storage_path = os.path.join(self.config['DOCUMENTS_FOLDER'], 'processed_documents.json')
+        document_service = DocumentService(
+            storage_path=storage_path,
+            document_store=DocumentStore(
+                storage_path,
+                commit_latency=self.config['DOCUMENT_COMMIT_LATENCY_MS'] / 1000,
+                checkpoint_bytes=int(self.config['DOCUMENT_CHECKPOINT_MB'] * 1024 * 1024),
+                commit_timeout=self.config['DOCUMENT_COMMIT_TIMEOUT_SECONDS']
+            ),
+            classification_service=self.classification_service,
+            schema_service=self.schema_service,
+            storage_service=self.storage_service,
+            analytics_service=self.analytics_service,
+            similarity_service=self.similarity_service,
+            extractor_policy=ExtractorPolicy(self.config['PDF_EXTRACTORS']),
+            pdf_parser=self.pdf_parser,
+            quarantine_service=self.quarantine_service,
+            event_service=self.event_service
+        )
+
+        # Apply retention and reconcile uploads with the document store periodically
+        self.storage_service.start_maintenance(
+            document_service,
+            self.config['UPLOAD_MAINTENANCE_INTERVAL']
+        )
+        return document_service
+
+    def _build_reclassification_service(self):
+        """
+        Build the reclassification worker and resume pending documents
+
+        :return: ReclassificationService instance
+        """
+        reclassification_service = ReclassificationService(
+            self.document_service,
+            runtime=self.async_runtime
+        )
+
+        # Resume classification of documents left pending by a previous run
+        reclassification_service.enqueue_pending()
+        return reclassification_service
+
+    def warm_up(self):
+        """
+        Build the services and load the document store ahead of the
+        requests that need them
+        """
+        started = time.perf_counter()
+        try:
+            self.document_service.warm_up()
+            self.schema_service.get_schemas()
+            self.reclassification_service
+        except Exception as e:
+            self.logger.error(f"Service warm-up failed: {str(e)}")
+            return
+        self.logger.info(f"Services warmed up in {time.perf_counter() - started:.2f}s")
+
+
+def get_services():
+    """
+    Get the service container of the current application
+
+    :return: ServiceContainer instance
+    """
+    return current_app.extensions['services']
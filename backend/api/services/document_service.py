@@ -1,17 +1,75 @@
+import asyncio
 import random
 import datetime
 import uuid
-import PyPDF2
 import os
 import logging
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.services.classification_service import ClassificationUnavailableError
+from api.services.quarantine_service import QuarantinedDocumentError
+from api.utils.document_index import INDEXED_FIELDS, DocumentIndex
+from api.utils.document_store import DocumentStore, DocumentStoreError
+from api.utils.pdf_extractors import ExtractorPolicy
+from api.utils.pdf_sandbox import ParseLimitExceeded
+from api.utils.pdf_utils import LazyPdfDocument
+
+class UncommittedDocumentError(Exception):
+    """
+    Raised for a processed document whose commit failed or timed out. The
+    document is kept and served, and the store writes it with its next
+    commit or checkpoint, so it must not be uploaded again.
+    """
+    def __init__(self, document, error):
+        super().__init__(f"Document {document['classification_id']} is not durably stored yet: {error}")
+        self.document = document
 
 class DocumentService:
-    def __init__(self, classification_service=None, schema_service=None, storage_path=None):
+    # Characters of document text needed before classification can start
+    # when the classification service does not declare its own limit
+    DEFAULT_CLASSIFICATION_CHARS = 2000
+
+    # Schema assigned to documents whose classification has been deferred
+    PENDING_SCHEMA_ID = 'pending'
+    
+    # Schema the classification service falls back to when it cannot decide
+    GENERIC_SCHEMA_ID = 'Generic Document'
+    
+    # Classifications below this confidence are not inherited by near-duplicates
+    NEAR_DUPLICATE_MIN_CONFIDENCE = 0.5
+
+    def __init__(self, classification_service=None, schema_service=None, storage_path=None,
+                 storage_service=None, analytics_service=None, content_folder=None,
+                 similarity_service=None, extractor_policy=None, pdf_parser=None,
+                 quarantine_service=None, event_service=None, document_store=None):
         # Classification and schema services
         self.classification_service = classification_service
         self.schema_service = schema_service
         
+        # Lifecycle management of uploaded originals
+        self.storage_service = storage_service
+        
+        # Time-bucketed rollups kept up to date as documents are processed
+        self.analytics_service = analytics_service
+        
+        # Near-duplicate index used to reuse classifications of templated documents
+        self.similarity_service = similarity_service
+        
+        # Chooses the text extraction backends to try for each PDF
+        self.extractor_policy = extractor_policy or ExtractorPolicy()
+        
+        # Optional SandboxedPdfParser; without it PDFs are parsed in-process
+        self.pdf_parser = pdf_parser
+        
+        # Files that exceeded the parsing limits, skipped when uploaded again
+        self.quarantine_service = quarantine_service
+        
+        # Optional broker of processing progress and report change events
+        self.event_service = event_service
+        
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
@@ -22,35 +80,315 @@ class DocumentService:
             '../../_documents/processed_documents.json'
         )
         
-        # Ensure storage file exists
-        if not os.path.exists(self.storage_path):
-            with open(self.storage_path, 'w') as f:
-                json.dump([], f)
+        # Parsed text is kept in one file per document next to the store, so
+        # the store itself only holds metadata and stays cheap to load
+        self.content_folder = content_folder or os.path.join(
+            os.path.dirname(self.storage_path),
+            'content'
+        )
+        os.makedirs(self.content_folder, exist_ok=True)
         
-        # Internal storage of processed documents
-        self._processed_documents = []
-        self._load_processed_documents()
+        # Checkpoint plus write-ahead log, committed in batches by a single
+        # writer thread; creates the storage file if it does not exist
+        self._store = document_store or DocumentStore(self.storage_path)
+        self._store.snapshot = self._snapshot_documents
+        # Cold loads parse only these fields; the rest stays in the mapped checkpoint
+        self._store.index_fields = INDEXED_FIELDS
+        
+        # Internal storage of processed documents, guarded by a lock because
+        # background extraction updates records after process_document returns.
+        # Loaded on first access rather than here, see warm_up()
+        self._lock = threading.RLock()
+        self._index = DocumentIndex()
+        self._analytics_seeded = False
+        
+        # Store version: bumped on every change to the documents so callers
+        # can cache anything derived from them
+        self.version = 0
+        self.updated_at = time.time()
+        self._loaded = False
+        # Fingerprint of the store files as last loaded, so versions of
+        # different processes only match when they started from the same files
+        self._load_token = None
+
+        # Background workers that finish page extraction off the request path
+        self._extraction_executor = ThreadPoolExecutor(
+            max_workers=2,
+            thread_name_prefix='pdf-extraction'
+        )
+
+    def _mark_changed(self):
+        """
+        Bump the store version after the documents changed.
+        """
+        self.version += 1
+        self.updated_at = time.time()
 
     def _load_processed_documents(self):
         """
         Load processed documents from storage file.
+        
+        The files are only read again when they changed since the last load
+        or commit, e.g. because another service instance wrote to them.
+        """
+        with self._lock:
+            if self._loaded and not self._store.changed_externally():
+                return
+            
+            documents = self._store.load()
+            moved = self._move_content_out_of_store(documents)
+            
+            # Keep only the compact index; the parsed list is dropped here
+            self._index = DocumentIndex(documents)
+            del documents
+            
+            self._loaded = True
+            self._load_token = self._store.fingerprint()
+            self.version = 0
+            self._mark_changed()
+            if moved:
+                self._store.request_checkpoint()
+            
+            # Seed the rollups from documents processed before analytics existed
+            if self.analytics_service and not self._analytics_seeded:
+                self._analytics_seeded = True
+                self.analytics_service.backfill(self._index.to_dicts())
+
+    def _move_content_out_of_store(self, documents):
+        """
+        Move parsed content embedded in stored records, as written by older
+        versions, into per-document content files.
+        
+        :param documents: Document dictionaries as loaded from the store
+        :return: Number of documents whose content was moved
+        """
+        moved = 0
+        for document in documents:
+            if 'parsed_content' in document:
+                self._write_content(document['classification_id'], document.pop('parsed_content'))
+                moved += 1
+        
+        if moved:
+            self.logger.info(f"Moved parsed content of {moved} documents out of the store")
+        return moved
+
+    def warm_up(self):
+        """
+        Load the document store ahead of the first request that needs it.
+        """
+        self._load_processed_documents()
+
+    def _content_path(self, classification_id):
+        """
+        Get the path of a document's content file.
+        
+        :param classification_id: Identifier of the stored document
+        :return: Path of the JSON file holding the parsed content
+        """
+        return os.path.join(self.content_folder, f"{classification_id}.json")
+
+    def _write_content(self, classification_id, parsed_content):
+        """
+        Atomically write a document's parsed content.
+        
+        :param classification_id: Identifier of the stored document
+        :param parsed_content: Parsed PDF content
+        """
+        path = self._content_path(classification_id)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(parsed_content, f)
+        os.replace(temp_path, path)
+
+    def get_parsed_content(self, classification_id):
+        """
+        Read the parsed content of a stored document.
+        
+        :param classification_id: Identifier of the stored document
+        :return: Parsed PDF content, or None if it is not available
         """
         try:
-            with open(self.storage_path, 'r') as f:
-                self._processed_documents = json.load(f)
+            with open(self._content_path(classification_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
         except Exception as e:
-            self.logger.error(f"Error loading processed documents: {str(e)}")
-            self._processed_documents = []
+            self.logger.error(f"Error loading content of {classification_id}: {str(e)}")
+            return None
+
+    def iter_with_content(self, documents):
+        """
+        Attach parsed content to documents as they are iterated.
+        
+        :param documents: Iterable of stored documents
+        :return: Generator of documents including their parsed content
+        """
+        for document in documents:
+            yield dict(
+                document,
+                parsed_content=self.get_parsed_content(document['classification_id'])
+            )
+
+    def _snapshot_documents(self):
+        """
+        Copy every stored document for a checkpoint of the store.
+        
+        :return: List of document dictionaries
+        """
+        with self._lock:
+            return list(self._index.to_dicts())
+
+    def _wait_for_commit(self, sequence):
+        """
+        Wait until logged changes are durable; called without holding the
+        lock, so concurrent writers can join the same commit. Raises
+        DocumentStoreError if they could not be stored in time.
+        
+        :param sequence: Sequence number returned by the store
+        """
+        self._store.wait(sequence)
+
+    def get_version(self):
+        """
+        Get the current store version, picking up changes written by
+        other service instances.
+        
+        The version is the fingerprint of the files last loaded followed by
+        the number of changes made since, so it identifies the documents in
+        any process and across restarts.
+        
+        :return: Version string
+        """
+        self._load_processed_documents()
+        with self._lock:
+            return f"{self._load_token}.{self.version}"
 
-    def _save_processed_documents(self):
+    def count_documents(self, schema_id=None):
         """
-        Save processed documents to storage file.
+        Get the number of stored documents.
+
+        :param schema_id: Optional schema ID to count documents of
+        :return: Document count
         """
+        self._load_processed_documents()
+        with self._lock:
+            return self._index.count(schema_id)
+
+    def _update_document(self, classification_id, updates, wait=True):
+        """
+        Apply field updates to a stored document and persist the change.
+        
+        :param classification_id: Identifier of the document to update
+        :param updates: Dictionary of fields to overwrite
+        :param wait: Whether to wait for the change to be durable; callers
+                     holding the lock wait after releasing it instead
+        :return: Updated document, or None if it no longer exists
+        """
+        self._load_processed_documents()
+        with self._lock:
+            if classification_id not in self._index:
+                return None
+            
+            # Logged first: a change that cannot be encoded leaves the index as is
+            sequence = self._store.update([classification_id], updates)
+            document = self._index.update(classification_id, updates)
+            self._mark_changed()
+        
+        if wait:
+            self._wait_for_commit(sequence)
+        return document
+
+    def relocate_file(self, old_filepath, new_filepath, extra_updates=None):
+        """
+        Point every document stored with one file path to another.
+        
+        Content-addressed uploads can be shared by several documents, so
+        archival and retention update all of them at once.
+        
+        :param old_filepath: Current file path on the documents
+        :param new_filepath: New file path, or None if the file was removed
+        :param extra_updates: Optional additional fields to set
+        :return: Number of documents updated
+        """
+        self._load_processed_documents()
+        with self._lock:
+            matching = [
+                record.classification_id for record in self._index
+                if record.filepath == old_filepath
+            ]
+            updates = dict(extra_updates or {}, filepath=new_filepath)
+            updated = len(matching)
+            if not updated:
+                return 0
+            
+            sequence = self._store.update(matching, updates)
+            for classification_id in matching:
+                self._index.update(classification_id, updates)
+            self._mark_changed()
+        
+        self._wait_for_commit(sequence)
+        return updated
+
+    def mark_file_missing(self, classification_id):
+        """
+        Flag a document whose file no longer exists on disk.
+        
+        :param classification_id: Identifier of the stored document
+        :return: Updated document, or None if it no longer exists
+        """
+        return self._update_document(classification_id, {"file_missing": True})
+
+    def _submit_file_task(self, filepath, task, *args):
+        """
+        Run background work on an original, holding the file so archival
+        triggered by another document with the same content keeps it until
+        the work is done.
+        
+        :param filepath: Path of the original the task reads
+        :param task: Callable to run on the extraction executor
+        :param args: Arguments of the task
+        """
+        if self.storage_service:
+            self.storage_service.hold(filepath)
+        
+        def run():
+            try:
+                task(*args)
+            finally:
+                if self.storage_service:
+                    self.storage_service.release(filepath)
+        
+        self._extraction_executor.submit(run)
+
+    def _archive_original(self, filepath):
+        """
+        Move an original into the archive tier once its text is stored.
+        
+        :param filepath: Path of the original upload
+        """
+        if not (self.storage_service and self.storage_service.archive_after_extraction):
+            return
+        if self.storage_service.is_archived(filepath):
+            return
+        
         try:
-            with open(self.storage_path, 'w') as f:
-                json.dump(self._processed_documents, f, indent=2)
+            archived_path = self.storage_service.archive_file(filepath)
         except Exception as e:
-            self.logger.error(f"Error saving processed documents: {str(e)}")
+            self.logger.error(f"Archiving {filepath} failed: {str(e)}")
+            return
+        
+        self.relocate_file(filepath, archived_path, {
+            "archived_at": datetime.datetime.now().isoformat()
+        })
+
+    def open_document(self, filepath):
+        """
+        Open a PDF for lazy, page-by-page extraction.
+        
+        :param filepath: Full path to the PDF file
+        :return: LazyPdfDocument that extracts pages on first access
+        """
+        return LazyPdfDocument(filepath, self.extractor_policy.select(filepath))
 
     def parse_pdf_to_json(self, filepath):
         """
@@ -60,33 +398,10 @@ class DocumentService:
         :return: Dictionary containing parsed PDF content
         """
         try:
-            with open(filepath, 'rb') as file:
-                # Use PyPDF2 to read the PDF
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Prepare a structured representation
-                parsed_content = {
-                    "metadata": {
-                        "filename": filepath.split('/')[-1],
-                        "parsed_at": datetime.datetime.now().isoformat(),
-                        "total_pages": len(pdf_reader.pages)
-                    },
-                    "content": []
-                }
-                
-                # Extract text from each page
-                for page_num, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
-                    
-                    page_data = {
-                        "page_number": page_num + 1,
-                        "text": page_text,
-                        "length": len(page_text)
-                    }
-                    
-                    parsed_content["content"].append(page_data)
-            
-            return parsed_content
+            if self.pdf_parser:
+                return self.pdf_parser.parse(filepath)
+            with self.open_document(filepath) as document:
+                return document.to_parsed_content()
         
         except Exception as e:
             # Log the error and return a basic error object
@@ -123,24 +438,198 @@ class DocumentService:
             {"id": "generic", "title": "Generic Document"}
         ]
 
-    def process_document(self, original_filename, filepath):
+    def _signature(self, parsed_content):
         """
-        Process an uploaded document and generate metadata.
+        Compute the near-duplicate signature of parsed content.
         
-        :param original_filename: Original name of the uploaded file
-        :param filepath: Full path to the saved file
-        :return: Dictionary with document metadata and parsed content
+        :param parsed_content: Parsed PDF content
+        :return: MinHash signature, or None if unavailable
+        """
+        if not self.similarity_service:
+            return None
+        try:
+            return self.similarity_service.signature(parsed_content, self._classification_chars())
+        except Exception as e:
+            self.logger.error(f"Near-duplicate signature error: {str(e)}")
+            return None
+
+    def _near_duplicate_classification(self, signature, classification_id):
+        """
+        Reuse the classification of an already classified near-duplicate.
+        
+        :param signature: MinHash signature of the document
+        :param classification_id: Identifier of the document, excluded from matching
+        :return: Classification result recording the match, or None
+        """
+        try:
+            match = self.similarity_service.find_match(signature, exclude_id=classification_id)
+        except Exception as e:
+            self.logger.error(f"Near-duplicate lookup error: {str(e)}")
+            return None
+        if not match:
+            return None
+        
+        # The match may predate a schema change, or have been indexed before
+        # fallbacks and low-confidence answers were kept out of the index
+        if match['schema_id'] not in self._available_schema_ids():
+            self.logger.info(f"Not reusing {match['classification_id']}: schema {match['schema_id']} no longer exists")
+            return None
+        with self._lock:
+            matched = self._index.get(match['classification_id'])
+        confidence = matched.get('confidence') if matched else None
+        if confidence is None or confidence < self.NEAR_DUPLICATE_MIN_CONFIDENCE:
+            return None
+        
+        self.logger.info(
+            f"Reusing classification of {match['classification_id']} "
+            f"(similarity {match['similarity']})"
+        )
+        return {
+            "schema_id": match['schema_id'],
+            "confidence": confidence,
+            "reasoning": f"Near-duplicate of {match['classification_id']}",
+            "method": "near_duplicate",
+            "matched_document_id": match['classification_id'],
+            "similarity": match['similarity']
+        }
+
+    def _available_schema_ids(self):
+        """
+        Get the values a stored schema_id may take: schema titles, as the
+        classification service answers with, and schema ids.
+        
+        :return: Set of schema titles and ids
         """
-        # Parse the PDF content
-        parsed_content = self.parse_pdf_to_json(filepath)
+        schemas = self.get_available_schemas()
+        return {schema['title'] for schema in schemas} | {schema['id'] for schema in schemas}
+
+    def _is_reusable(self, classification):
+        """
+        Check whether near-duplicates may inherit a classification.
+        
+        Fallbacks (the generic schema, failed classifications), unknown
+        schemas and low-confidence answers are not, so later near-duplicates
+        still get a classification of their own.
+        
+        :param classification: Classification result
+        :return: True if the document may be added to the near-duplicate index
+        """
+        schema_id = classification.get('schema_id')
+        if schema_id == self.GENERIC_SCHEMA_ID or classification.get('classification_error'):
+            return False
+        if schema_id not in self._available_schema_ids():
+            return False
+        confidence = classification.get('confidence')
+        return confidence is not None and confidence >= self.NEAR_DUPLICATE_MIN_CONFIDENCE
+
+    def _classify(self, parsed_content, classification_id=None, reuse_near_duplicates=True, rate_limiter=None):
+        """
+        Classify parsed content and resolve the resulting schema.
+        
+        A document whose text nearly matches an already classified one
+        inherits its classification without an LLM call; otherwise the
+        classification service is asked. The document is then added to the
+        near-duplicate index under its resulting schema.
+        
+        ClassificationUnavailableError is propagated so callers can defer
+        the document instead of storing a fallback schema.
+        
+        :param parsed_content: Parsed PDF content
+        :param classification_id: Identifier of the document being classified
+        :param reuse_near_duplicates: Whether a near-duplicate's classification may be reused
+        :param rate_limiter: Optional RateLimiter waited on right before the LLM call
+        :return: Tuple of (schema_id, classification result or None, latency in ms or None)
+        """
+        started = time.perf_counter()
+        signature, classification = self._reuse_near_duplicate(
+            parsed_content, classification_id, reuse_near_duplicates
+        )
         
         # Classify the document if classification service is available
-        classification = None
-        if self.classification_service:
+        if classification is None and self.classification_service:
+            if rate_limiter:
+                rate_limiter.wait()
             try:
                 classification = self.classification_service.classify_document(parsed_content)
+            except ClassificationUnavailableError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Document classification error: {str(e)}")
+            if classification:
+                classification = dict(classification, method="llm")
+        
+        return self._resolve_schema(signature, classification, classification_id, started)
+
+    async def _classify_async(self, parsed_content, classification_id=None, reuse_near_duplicates=True,
+                              rate_limiter=None):
+        """
+        Classify parsed content like _classify, without blocking the event loop.
+        
+        Signature computation, the near-duplicate index and schema lookups
+        run in the loop's executor; only the LLM call is awaited on the loop.
+        Classification services without an async client are run in the
+        executor as well.
+        
+        :param parsed_content: Parsed PDF content
+        :param classification_id: Identifier of the document being classified
+        :param reuse_near_duplicates: Whether a near-duplicate's classification may be reused
+        :param rate_limiter: Optional RateLimiter waited on right before the LLM call
+        :return: Tuple of (schema_id, classification result or None, latency in ms or None)
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        signature, classification = await loop.run_in_executor(
+            None, self._reuse_near_duplicate, parsed_content, classification_id, reuse_near_duplicates
+        )
+        
+        if classification is None and self.classification_service:
+            if rate_limiter:
+                await rate_limiter.wait_async()
+            try:
+                if hasattr(self.classification_service, 'classify_document_async'):
+                    classification = await self.classification_service.classify_document_async(parsed_content)
+                else:
+                    classification = await loop.run_in_executor(
+                        None, self.classification_service.classify_document, parsed_content
+                    )
+            except ClassificationUnavailableError:
+                raise
             except Exception as e:
                 self.logger.error(f"Document classification error: {str(e)}")
+            if classification:
+                classification = dict(classification, method="llm")
+        
+        return await loop.run_in_executor(
+            None, self._resolve_schema, signature, classification, classification_id, started
+        )
+
+    def _reuse_near_duplicate(self, parsed_content, classification_id, reuse_near_duplicates):
+        """
+        Compute the signature of a document and look up a near-duplicate.
+        
+        :param parsed_content: Parsed PDF content
+        :param classification_id: Identifier of the document being classified
+        :param reuse_near_duplicates: Whether a near-duplicate's classification may be reused
+        :return: Tuple of (signature or None, reused classification or None)
+        """
+        signature = self._signature(parsed_content)
+        if signature and reuse_near_duplicates:
+            return signature, self._near_duplicate_classification(signature, classification_id)
+        return signature, None
+
+    def _resolve_schema(self, signature, classification, classification_id, started):
+        """
+        Resolve the schema of a classification and index the document.
+        
+        :param signature: MinHash signature of the document, or None
+        :param classification: Classification result, or None
+        :param classification_id: Identifier of the document being classified
+        :param started: perf_counter value when classification started
+        :return: Tuple of (schema_id, classification result or None, latency in ms or None)
+        """
+        latency_ms = None
+        if classification or self.classification_service:
+            latency_ms = round((time.perf_counter() - started) * 1000, 1)
         
         # Get available schemas
         available_schemas = self.get_available_schemas()
@@ -151,30 +640,465 @@ class DocumentService:
             # Fallback to first available schema or generic
             schema = available_schemas[0]
             schema_id = schema['id']
+        elif signature and classification_id and self._is_reusable(classification):
+            # Later near-duplicates of this document inherit its schema
+            try:
+                self.similarity_service.add(classification_id, schema_id, signature)
+            except Exception as e:
+                self.logger.error(f"Near-duplicate indexing error: {str(e)}")
+        
+        return schema_id, classification, latency_ms
+
+    def process_document(self, original_filename, filepath, defer_classification=False):
+        """
+        Process an uploaded document and generate metadata.
+        
+        :param original_filename: Original name of the uploaded file
+        :param filepath: Full path to the saved file
+        :param defer_classification: Store the document as pending and leave
+                                     classification to the background worker
+        :raises QuarantinedDocumentError: The file exceeds the parsing limits
+                                          or was quarantined before
+        :raises UncommittedDocumentError: The document was processed and is
+                                          served, but its commit failed or
+                                          timed out; it carries the document
+        :return: Dictionary with document metadata and parsed content; only
+                 the metadata is kept in the store
+        """
+        classification_id = f"doc-{uuid.uuid4()}"
+        self._publish_stage(classification_id, 'saved', filename=original_filename)
+        
+        try:
+            digest = self._check_quarantine(filepath)
+        except QuarantinedDocumentError as e:
+            self._publish_stage(classification_id, 'quarantined', reason=e.record['reason'])
+            raise
+        
+        # Extract only the pages classification needs; the remaining pages
+        # are extracted in the background
+        lazy_document = None
+        try:
+            if self.pdf_parser:
+                parsed_content = self.pdf_parser.parse(filepath, max_chars=self._classification_chars())
+            else:
+                lazy_document = self.open_document(filepath)
+                parsed_content = lazy_document.preview_content(self._classification_chars())
+        except ParseLimitExceeded as e:
+            if not self.quarantine_service:
+                raise
+            self._publish_stage(classification_id, 'quarantined', reason=str(e))
+            raise QuarantinedDocumentError(
+                self._quarantine(filepath, str(e), original_filename, digest)
+            )
+        except Exception as e:
+            self.logger.error(f"PDF parsing failed: {str(e)}")
+            parsed_content = {
+                "error": "PDF parsing failed",
+                "message": str(e)
+            }
+            if lazy_document:
+                lazy_document.close()
+                lazy_document = None
+        
+        self._publish_stage(
+            classification_id,
+            'parsed',
+            total_pages=parsed_content.get("metadata", {}).get("total_pages"),
+            partial=parsed_content.get("metadata", {}).get("partial"),
+            error=parsed_content.get("message")
+        )
+        
+        if defer_classification:
+            # Acknowledge immediately; the reclassification worker fills in
+            # the schema once the LLM has answered
+            schema_id = self.PENDING_SCHEMA_ID
+            classification = None
+            classification_ms = None
         else:
-            # Find schema details
-            schema = next((s for s in available_schemas if s['id'] == schema_id), 
-                          available_schemas[0])
+            try:
+                schema_id, classification, classification_ms = self._classify(
+                    parsed_content,
+                    classification_id
+                )
+                self._publish_classified(classification_id, schema_id, classification)
+            except ClassificationUnavailableError as e:
+                # LLM outage: store as pending for the reclassification worker
+                # rather than as a misleading fallback schema
+                self.logger.warning(f"Classification deferred: {str(e)}")
+                schema_id = self.PENDING_SCHEMA_ID
+                classification = None
+                classification_ms = None
         
-        # Generate document metadata
+        # Generate document metadata; content archived by an earlier upload
+        # is referenced in the archive, where its original is going
         document = {
-            "classification_id": f"doc-{uuid.uuid4()}",
+            "classification_id": classification_id,
             "filename": original_filename,
             "schema_id": schema_id,
             "processed_at": datetime.datetime.now().isoformat(),
-            "filepath": filepath,
-            "parsed_content": parsed_content,
+            "filepath": self.storage_service.resolve(filepath) if self.storage_service else filepath,
             "classification": classification,
+            "classification_ms": classification_ms,
             "confidence": classification.get('confidence', 0.5) if classification else 0.5
         }
         
-        # Store the document locally
-        self._processed_documents.append(document)
+        self._write_content(document["classification_id"], parsed_content)
         
-        # Save to persistent storage
-        self._save_processed_documents()
+        self._load_processed_documents()
+        with self._lock:
+            # Log it for the next group commit, then store it locally
+            sequence = self._store.add(document)
+            self._index.add(document)
+            self._mark_changed()
         
-        return document
+        # Concurrent uploads waiting here share one fsync. A failed or late
+        # commit does not drop the document: it stays indexed and the store
+        # writes it with its next commit or checkpoint, so the caller is told
+        # it exists rather than invited to upload it again
+        commit_error = None
+        try:
+            self._wait_for_commit(sequence)
+        except DocumentStoreError as e:
+            self.logger.error(f"Document {classification_id} kept in memory, commit pending: {str(e)}")
+            commit_error = e
+        
+        # Counted once the commit outcome is known, with a version bump under
+        # the same lock, so a report built for that version counts the document
+        if self.analytics_service:
+            with self._lock:
+                self.analytics_service.record_document(document)
+                self._mark_changed()
+        
+        # Identical content archived while this record was being added: its
+        # relocation may have missed the record
+        if self.storage_service and document["filepath"] == filepath:
+            archived_path = self.storage_service.resolve(filepath)
+            if archived_path != filepath:
+                self.relocate_file(filepath, archived_path)
+                document["filepath"] = archived_path
+        
+        self._publish_stored(document)
+        
+        # Finish extracting the remaining pages off the critical path
+        partial = parsed_content.get("metadata", {}).get("partial")
+        if lazy_document and partial:
+            self._submit_file_task(
+                filepath,
+                self._complete_extraction,
+                document["classification_id"],
+                lazy_document
+            )
+        elif partial:
+            self._submit_file_task(
+                filepath,
+                self._complete_sandboxed_extraction,
+                document["classification_id"],
+                filepath,
+                parsed_content
+            )
+        elif lazy_document:
+            lazy_document.close()
+            self._submit_file_task(filepath, self._archive_original, filepath)
+        elif "metadata" in parsed_content:
+            self._submit_file_task(filepath, self._archive_original, filepath)
+        
+        # Return a snapshot; background workers update the stored record
+        snapshot = dict(document, parsed_content=parsed_content)
+        if commit_error is not None:
+            raise UncommittedDocumentError(snapshot, commit_error)
+        return snapshot
+
+    def reclassify_document(self, classification_id, rate_limiter=None):
+        """
+        Run classification for a stored document and update its record.
+        
+        The schema, classification and confidence are replaced in a single
+        locked update, so reports never observe a half-updated document.
+        Raises ClassificationUnavailableError, leaving the record untouched,
+        when the LLM cannot be reached. Only pending documents may inherit a
+        near-duplicate's classification; explicit reclassification always
+        asks the classification service.
+        
+        :param classification_id: Identifier of the stored document
+        :param rate_limiter: Optional RateLimiter for the LLM call; a reused
+                             near-duplicate classification does not use a slot
+        :return: Updated document, or None if it no longer exists
+        """
+        current = self._get_for_classification(classification_id)
+        if current is None:
+            return None
+        parsed_content = self.get_parsed_content(classification_id) or {}
+        
+        schema_id, classification, classification_ms = self._classify(
+            parsed_content,
+            classification_id,
+            reuse_near_duplicates=current['schema_id'] == self.PENDING_SCHEMA_ID,
+            rate_limiter=rate_limiter
+        )
+        return self._apply_classification(classification_id, schema_id, classification, classification_ms)
+
+    async def reclassify_document_async(self, classification_id, rate_limiter=None):
+        """
+        Reclassify a stored document like reclassify_document, as a coroutine.
+        
+        Meant to run on the AsyncRuntime's event loop so many documents can
+        wait on the LLM at once; blocking steps run in the loop's executor.
+        
+        :param classification_id: Identifier of the stored document
+        :param rate_limiter: Optional RateLimiter for the LLM call
+        :return: Updated document, or None if it no longer exists
+        """
+        loop = asyncio.get_running_loop()
+        current = await loop.run_in_executor(None, self._get_for_classification, classification_id)
+        if current is None:
+            return None
+        parsed_content = await loop.run_in_executor(None, self.get_parsed_content, classification_id) or {}
+        
+        schema_id, classification, classification_ms = await self._classify_async(
+            parsed_content,
+            classification_id,
+            reuse_near_duplicates=current['schema_id'] == self.PENDING_SCHEMA_ID,
+            rate_limiter=rate_limiter
+        )
+        return await loop.run_in_executor(
+            None, self._apply_classification, classification_id, schema_id, classification, classification_ms
+        )
+
+    def _get_for_classification(self, classification_id):
+        """
+        Get the stored record of a document about to be classified.
+        
+        :param classification_id: Identifier of the stored document
+        :return: Document metadata, or None if it does not exist
+        """
+        self._load_processed_documents()
+        with self._lock:
+            return self._index.get(classification_id)
+
+    def _apply_classification(self, classification_id, schema_id, classification, classification_ms):
+        """
+        Store the result of a reclassification and publish it.
+        
+        :param classification_id: Identifier of the stored document
+        :param schema_id: Resolved schema
+        :param classification: Classification result, or None
+        :param classification_ms: Classification latency in ms, or None
+        :return: Updated document, or None if it no longer exists
+        """
+        with self._lock:
+            previous = self._index.get(classification_id)
+            if previous is None:
+                return None
+            updated = self._update_document(classification_id, {
+                "schema_id": schema_id,
+                "classification": classification,
+                "classification_ms": classification_ms,
+                "confidence": classification.get('confidence', 0.5) if classification else 0.5,
+                "classified_at": datetime.datetime.now().isoformat()
+            }, wait=False)
+            sequence = self._store.last_sequence
+            
+            # Move the document between schema rollups under the same lock
+            if updated and self.analytics_service:
+                self.analytics_service.move_document(previous, updated)
+        
+        self._wait_for_commit(sequence)
+        if updated:
+            self._publish_classified(classification_id, schema_id, classification)
+            self._publish_stored(updated, previous_schema_id=previous['schema_id'])
+        return updated
+
+    @staticmethod
+    def _document_summary(document):
+        """
+        Get the fields of a document that reports list.
+        
+        :param document: Document metadata
+        :return: Dictionary with the report fields of the document
+        """
+        return {
+            key: document.get(key)
+            for key in ("classification_id", "filename", "schema_id", "processed_at", "confidence")
+        }
+
+    def _publish_stage(self, classification_id, stage, **details):
+        """
+        Publish that a document reached a processing stage.
+        
+        :param classification_id: Identifier of the document
+        :param stage: Stage name: saved, parsed, classified, stored or quarantined
+        :param details: Additional event fields; None values are left out
+        """
+        if not self.event_service:
+            return
+        data = {"classification_id": classification_id, "stage": stage}
+        data.update((key, value) for key, value in details.items() if value is not None)
+        self.event_service.publish('document.stage', data)
+
+    def _publish_classified(self, classification_id, schema_id, classification):
+        """
+        Publish the classification result of a document.
+        
+        :param classification_id: Identifier of the document
+        :param schema_id: Resolved schema
+        :param classification: Classification result or None
+        """
+        classification = classification or {}
+        self._publish_stage(
+            classification_id,
+            'classified',
+            schema_id=schema_id,
+            method=classification.get('method'),
+            confidence=classification.get('confidence')
+        )
+
+    def _publish_stored(self, document, previous_schema_id=None):
+        """
+        Publish that a document was stored, and the resulting report delta.
+        
+        :param document: Stored document metadata
+        :param previous_schema_id: Schema the document had before an update,
+                                   or None for a new document
+        """
+        if not self.event_service:
+            return
+        summary = self._document_summary(document)
+        self._publish_stage(document["classification_id"], 'stored', document=summary)
+        self.event_service.publish('report.delta', {
+            "op": "updated" if previous_schema_id is not None else "added",
+            "document": summary,
+            "previous_schema_id": previous_schema_id,
+            "total_documents": self.count_documents()
+        })
+
+    def _classification_chars(self):
+        """
+        Get the number of text characters classification reads.
+        
+        :return: Character count needed before classifying
+        """
+        return getattr(
+            self.classification_service,
+            'PROMPT_TEXT_LIMIT',
+            self.DEFAULT_CLASSIFICATION_CHARS
+        )
+
+    def _complete_extraction(self, classification_id, lazy_document):
+        """
+        Extract the remaining pages of a document and store the full content.
+        
+        :param classification_id: Identifier of the stored document
+        :param lazy_document: Open LazyPdfDocument with cached leading pages
+        """
+        try:
+            parsed_content = lazy_document.to_parsed_content()
+        except Exception as e:
+            self.logger.error(f"Background PDF extraction failed: {str(e)}")
+            return
+        finally:
+            lazy_document.close()
+        
+        try:
+            self._write_content(classification_id, parsed_content)
+        except Exception as e:
+            self.logger.error(f"Storing content of {classification_id} failed: {str(e)}")
+            return
+        self._publish_stage(classification_id, 'parsed', total_pages=lazy_document.total_pages, partial=False)
+        self._archive_original(lazy_document.filepath)
+
+    def _complete_sandboxed_extraction(self, classification_id, filepath, preview_content):
+        """
+        Extract the pages after a preview in a parser worker and store the
+        full content. A file that exceeds the parsing limits is quarantined
+        and the document keeps its preview content.
+        
+        :param classification_id: Identifier of the stored document
+        :param filepath: Full path to the PDF file
+        :param preview_content: Parsed content of the leading pages
+        """
+        try:
+            remaining = self.pdf_parser.parse(filepath, start_page=len(preview_content["content"]))
+        except ParseLimitExceeded as e:
+            if self.quarantine_service:
+                self._quarantine(filepath, str(e))
+            else:
+                self.logger.error(f"Background PDF extraction of {filepath} stopped: {str(e)}")
+            return
+        except Exception as e:
+            self.logger.error(f"Background PDF extraction failed: {str(e)}")
+            return
+        
+        parsed_content = {
+            "metadata": dict(remaining["metadata"], partial=False),
+            "content": preview_content["content"] + remaining["content"]
+        }
+        try:
+            self._write_content(classification_id, parsed_content)
+        except Exception as e:
+            self.logger.error(f"Storing content of {classification_id} failed: {str(e)}")
+            return
+        self._publish_stage(
+            classification_id,
+            'parsed',
+            total_pages=parsed_content["metadata"]["total_pages"],
+            partial=False
+        )
+        self._archive_original(filepath)
+
+    def _check_quarantine(self, filepath):
+        """
+        Reject a file whose content was quarantined before.
+        
+        The new copy is removed; the quarantined one is kept.
+        
+        :param filepath: Full path to the uploaded file
+        :return: Hex SHA-256 digest of the file, or None without quarantine
+        """
+        if not self.quarantine_service:
+            return None
+        # Uploads are stored under their digest, so they are not hashed again
+        digest = self.storage_service.content_digest(filepath) if self.storage_service else None
+        digest = digest or self.quarantine_service.file_digest(filepath)
+        record = self.quarantine_service.get_record(digest)
+        if record:
+            self.logger.info(f"Skipping quarantined file {filepath}: {record['reason']}")
+            if os.path.abspath(filepath) != os.path.abspath(record['filepath']):
+                self._remove_upload(filepath)
+            raise QuarantinedDocumentError(record)
+        return digest
+
+    def _remove_upload(self, filepath):
+        """
+        Remove an uploaded file, through the storage service when there is
+        one, so uploads of the same content still in flight keep it.
+        
+        :param filepath: Full path to the uploaded file
+        """
+        if self.storage_service:
+            self.storage_service.remove_upload(filepath)
+        else:
+            os.remove(filepath)
+
+    def _quarantine(self, filepath, reason, filename=None, digest=None):
+        """
+        Quarantine a file and repoint the documents stored with it.
+        
+        :param filepath: Full path to the offending file
+        :param reason: Limit the file exceeded
+        :param filename: Original name of the upload
+        :param digest: Hex SHA-256 digest of the file, computed if omitted
+        :return: Quarantine record
+        """
+        record = self.quarantine_service.quarantine(
+            filepath, reason, filename, digest, keep_original=bool(self.storage_service)
+        )
+        if self.storage_service:
+            self._remove_upload(filepath)
+        self.relocate_file(filepath, record['filepath'], {
+            "quarantined_at": record['quarantined_at'],
+            "quarantine_reason": reason
+        })
+        return record
 
     def get_documents(self, schema_id=None):
         """
@@ -184,15 +1108,53 @@ class DocumentService:
         :return: List of processed documents
         """
 
-        # Always reload from disk to get fresh data
+        # Reload from disk if another instance changed the store
         self._load_processed_documents()
 
-        if schema_id:
-            return [
-                doc for doc in self._processed_documents 
-                if doc.get('schema_id') == schema_id
-            ]
-        return self._processed_documents
+        with self._lock:
+            records = self._index.query(schema_id=schema_id or None)
+        return [record.to_dict() for record in records]
+
+    def iter_documents(self, schema_id=None, start=None, end=None, min_confidence=None):
+        """
+        Iterate over processed documents matching the given filters.
+        
+        Matches are looked up in the metadata index and only turned into
+        dictionaries as they are consumed, so callers can stream results
+        without building a filtered copy of the store.
+        
+        :param schema_id: Optional schema ID to filter documents
+        :param start: Optional datetime; only documents processed at or after it
+        :param end: Optional datetime; only documents processed before it
+        :param min_confidence: Optional minimum classification confidence
+        :return: Generator of processed documents
+        """
+        self._load_processed_documents()
+        
+        # processed_at is stored as naive local ISO 8601, which sorts
+        # lexicographically; bounds are compared in the same form
+        with self._lock:
+            records = self._index.query(
+                schema_id=schema_id or None,
+                start=self._local_isoformat(start) if start else None,
+                end=self._local_isoformat(end) if end else None,
+                min_confidence=min_confidence
+            )
+        
+        for record in records:
+            yield record.to_dict()
+
+    @staticmethod
+    def _local_isoformat(value):
+        """
+        Format a datetime the way processed_at is stored.
+        
+        :param value: Naive local or timezone-aware datetime
+        :return: ISO 8601 string in naive local time
+        """
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value.isoformat()
 
     def get_schemas(self):
         """
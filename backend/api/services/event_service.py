@@ -0,0 +1,180 @@
+import json
+import logging
+import threading
+import uuid
+from collections import deque
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+
+class EventService:
+    """
+    In-process broker for server-sent events.
+
+    Published events are kept in a fixed-size ring buffer with consecutive
+    ids, so a client that reconnects with the id of the last event it saw
+    receives exactly the events it missed. A client that fell further
+    behind than the buffer (or connects after a restart) is told to resync
+    by fetching the full state once.
+
+    Every open stream holds a server thread for as long as the client stays
+    connected (the Flask server runs one thread per connection), so the
+    number of concurrent streams is capped at max_streams.
+    """
+    # Event sent instead of missed events that are no longer buffered
+    RESYNC_EVENT = 'resync'
+
+    def __init__(self, buffer_size=1000, max_streams=20):
+        """
+        Initialize the event service.
+
+        :param buffer_size: Number of recent events kept for reconnecting clients
+        :param max_streams: Maximum number of streams open at once (0 for no limit)
+        """
+        self._events = deque(maxlen=buffer_size)
+        self.max_streams = max_streams
+        self._open_streams = 0
+        self._streams_lock = threading.Lock()
+        self._next_sequence = 1
+        self._condition = threading.Condition()
+
+        # Event ids are "<stream>-<sequence>"; the stream changes on every
+        # start, so ids from before a restart are recognized as stale
+        self.stream_id = uuid.uuid4().hex[:8]
+
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> str:
+        """
+        Publish an event to every subscriber.
+
+        :param event_type: Event name, e.g. 'document.stage'
+        :param data: JSON-serializable event payload
+        :return: Id of the event
+        """
+        with self._condition:
+            sequence = self._next_sequence
+            self._next_sequence += 1
+            self._events.append((sequence, event_type, data))
+            self._condition.notify_all()
+        return f"{self.stream_id}-{sequence}"
+
+    @property
+    def latest_sequence(self) -> int:
+        """
+        Sequence number of the most recent event, 0 before the first one.
+        """
+        return self._next_sequence - 1
+
+    def parse_event_id(self, event_id: Optional[str]) -> Optional[int]:
+        """
+        Get the sequence number of an event id issued by this stream.
+
+        :param event_id: Last-Event-ID sent by a client
+        :return: Sequence number, or None if the id is missing, malformed
+                 or from an earlier start
+        """
+        stream_id, _, sequence = (event_id or '').rpartition('-')
+        if stream_id != self.stream_id or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def events_after(self, sequence: int, timeout: Optional[float] = None) -> Optional[List[tuple]]:
+        """
+        Get the events published after a sequence number, waiting for one
+        if there are none yet.
+
+        :param sequence: Sequence number of the last event the caller saw
+        :param timeout: Seconds to wait for a new event
+        :return: List of (sequence, event type, data) tuples, possibly empty
+                 after the timeout, or None if some of the missed events
+                 are no longer buffered
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.latest_sequence > sequence, timeout)
+            if sequence > self.latest_sequence:
+                return None
+            if not self._events:
+                return []
+            oldest = self._events[0][0]
+            if sequence < oldest - 1:
+                return None
+            return list(islice(self._events, max(sequence - oldest + 1, 0), None))
+
+    def format_event(self, sequence: int, event_type: str, data: Dict[str, Any]) -> str:
+        """
+        Encode an event in the text/event-stream format.
+
+        :param sequence: Sequence number of the event
+        :param event_type: Event name
+        :param data: JSON-serializable event payload
+        :return: Encoded event
+        """
+        return (
+            f"id: {self.stream_id}-{sequence}\n"
+            f"event: {event_type}\n"
+            f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+        )
+
+    def open_stream(self) -> bool:
+        """
+        Reserve one of the stream slots; release it with close_stream.
+
+        :return: True if a stream may be opened, False if all slots are taken
+        """
+        with self._streams_lock:
+            if self.max_streams and self._open_streams >= self.max_streams:
+                return False
+            self._open_streams += 1
+            return True
+
+    def close_stream(self):
+        """
+        Release a stream slot reserved by open_stream.
+        """
+        with self._streams_lock:
+            self._open_streams -= 1
+
+    @property
+    def open_streams(self) -> int:
+        """
+        Number of streams currently open.
+        """
+        return self._open_streams
+
+    def stream(self, last_event_id: Optional[str] = None, event_types=None, keepalive_seconds=15):
+        """
+        Generate the text/event-stream of a subscriber.
+
+        :param last_event_id: Id of the last event the client received, if
+                              it is reconnecting
+        :param event_types: Optional set of event names to send
+        :param keepalive_seconds: Interval of comments sent while idle, so
+                                  proxies do not close the connection
+        :return: Generator of encoded events
+        """
+        # Ask clients to reconnect quickly after a dropped connection
+        yield "retry: 3000\n\n"
+
+        sequence = self.latest_sequence
+        if last_event_id:
+            previous = self.parse_event_id(last_event_id)
+            if previous is None:
+                yield self.format_event(sequence, self.RESYNC_EVENT, {"reason": "unknown event id"})
+            else:
+                sequence = previous
+
+        while True:
+            events = self.events_after(sequence, timeout=keepalive_seconds)
+            if events is None:
+                sequence = self.latest_sequence
+                yield self.format_event(sequence, self.RESYNC_EVENT, {"reason": "missed events"})
+                continue
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for sequence, event_type, data in events:
+                if event_types is None or event_type in event_types:
+                    yield self.format_event(sequence, event_type, data)
@@ -0,0 +1,164 @@
+import datetime
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from api.utils.file_utils import content_address_path
+
+
+class QuarantinedDocumentError(Exception):
+    """
+    Raised for a PDF that exceeded the parsing limits, now or on an
+    earlier upload of the same content
+    """
+    def __init__(self, record):
+        super().__init__(f"Document quarantined: {record['reason']}")
+        self.record = record
+
+
+class QuarantineService:
+    """
+    Keeps PDFs that exceeded the parsing limits out of the pipeline.
+
+    Offending files are moved to a content-addressed quarantine folder and
+    recorded by SHA-256 with the reason, so uploading the same content again
+    is rejected without parsing it a second time.
+    """
+    def __init__(self, quarantine_folder, db_path=None):
+        """
+        Initialize the quarantine service.
+
+        :param quarantine_folder: Root of the quarantine folder
+        :param db_path: Path of the SQLite quarantine records
+        """
+        self.quarantine_folder = quarantine_folder
+        self.db_path = db_path or os.path.join(
+            os.path.dirname(__file__),
+            '../../_documents/quarantine.sqlite3'
+        )
+        self._lock = threading.Lock()
+
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        self._create_tables()
+
+    @contextmanager
+    def _connect(self):
+        """
+        Open a connection, committing on success and always closing it.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _create_tables(self):
+        """
+        Create the quarantine table if it does not exist yet.
+        """
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS quarantine (
+                    sha256 TEXT PRIMARY KEY,
+                    filename TEXT,
+                    filepath TEXT,
+                    reason TEXT NOT NULL,
+                    quarantined_at TEXT NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def file_digest(filepath) -> str:
+        """
+        Hash the content of a file.
+
+        :param filepath: Path of the file
+        :return: Hex SHA-256 digest
+        """
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_record(self, digest) -> Optional[Dict]:
+        """
+        Get the quarantine record of a file content.
+
+        :param digest: Hex SHA-256 digest of the content
+        :return: Record dictionary, or None if the content is not quarantined
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM quarantine WHERE sha256 = ?", (digest,)).fetchone()
+        return dict(row) if row else None
+
+    def get_records(self, limit=100) -> List[Dict]:
+        """
+        Get the most recently quarantined files.
+
+        :param limit: Maximum number of records
+        :return: List of record dictionaries, newest first
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM quarantine ORDER BY quarantined_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def quarantine(self, filepath, reason, filename=None, digest=None, keep_original=False) -> Dict:
+        """
+        Move a file to the quarantine folder and record why.
+
+        :param filepath: Path of the offending file
+        :param reason: Limit the file exceeded
+        :param filename: Original name of the upload
+        :param digest: Hex SHA-256 digest of the file, computed if omitted
+        :param keep_original: Copy the file instead, leaving the original
+                              for its owner to remove
+        :return: Quarantine record
+        """
+        digest = digest or self.file_digest(filepath)
+        extension = os.path.splitext(filepath)[1].lower()
+        quarantined_path = content_address_path(self.quarantine_folder, digest, extension)
+
+        with self._lock:
+            if os.path.exists(quarantined_path):
+                if not keep_original:
+                    os.remove(filepath)
+            elif keep_original:
+                os.makedirs(os.path.dirname(quarantined_path), exist_ok=True)
+                temp_path = f"{quarantined_path}.tmp"
+                shutil.copyfile(filepath, temp_path)
+                os.replace(temp_path, quarantined_path)
+            else:
+                os.makedirs(os.path.dirname(quarantined_path), exist_ok=True)
+                shutil.move(filepath, quarantined_path)
+
+            record = {
+                "sha256": digest,
+                "filename": filename,
+                "filepath": quarantined_path,
+                "reason": reason,
+                "quarantined_at": datetime.datetime.now().isoformat()
+            }
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO quarantine (sha256, filename, filepath, reason, quarantined_at) "
+                    "VALUES (:sha256, :filename, :filepath, :reason, :quarantined_at)",
+                    record
+                )
+
+        self.logger.warning(f"Quarantined {filename or filepath}: {reason}")
+        return record
@@ -0,0 +1,227 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from api.services.classification_service import ClassificationUnavailableError
+from api.utils.rate_limiter import RateLimiter
+
+
+class ReclassificationService:
+    """
+    Background worker that classifies stored documents outside the request path
+    """
+    def __init__(self, document_service, max_requests_per_minute=None, runtime=None, max_concurrency=None):
+        """
+        Initialize the reclassification worker
+
+        :param document_service: Service that owns the stored documents
+        :param max_requests_per_minute: Upper bound on LLM classification calls,
+                                        0 for no limit; near-duplicate reuse
+                                        does not count
+        :param runtime: Optional AsyncRuntime; when given, classifications run
+                        as coroutines on its event loop instead of one at a
+                        time on the worker thread
+        :param max_concurrency: Upper bound on classifications in flight on the runtime
+        """
+        self.document_service = document_service
+        self.runtime = runtime
+
+        # Classifications waiting on the LLM at once when running on the runtime
+        self.max_concurrency = max_concurrency or int(
+            os.environ.get('RECLASSIFY_MAX_CONCURRENCY', '32')
+        )
+        self._in_flight = threading.BoundedSemaphore(self.max_concurrency)
+
+        # Rate limit against the LLM, configurable through the environment;
+        # waited on right before each LLM call. The default lets the
+        # concurrency bound above be used with calls of a few seconds
+        if max_requests_per_minute is None:
+            max_requests_per_minute = float(os.environ.get('RECLASSIFY_MAX_REQUESTS_PER_MINUTE', '600'))
+        self.max_requests_per_minute = max_requests_per_minute
+        self.rate_limiter = RateLimiter(self.max_requests_per_minute)
+
+        # Queue of document ids, with a set to avoid queueing a document twice
+        self._queue = queue.Queue()
+        self._queued_ids = set()
+        self._queued_lock = threading.Lock()
+
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    def enqueue_document(self, classification_id):
+        """
+        Queue a single document for classification
+
+        :param classification_id: Identifier of the stored document
+        :return: True if the document was queued, False if already queued
+        """
+        with self._queued_lock:
+            if classification_id in self._queued_ids:
+                return False
+            self._queued_ids.add(classification_id)
+
+        self._queue.put(classification_id)
+        self._ensure_started()
+        return True
+
+    def enqueue_schema(self, schema_id):
+        """
+        Queue every document currently stored under a schema, e.g. after
+        the schema was renamed or a new schema was added
+
+        :param schema_id: Schema identifier as stored on the documents
+        :return: Number of documents newly queued
+        """
+        documents = self.document_service.get_documents(schema_id)
+        return sum(
+            1 for doc in documents
+            if self.enqueue_document(doc['classification_id'])
+        )
+
+    def enqueue_pending(self):
+        """
+        Queue every document still waiting for its first classification,
+        e.g. documents left pending by a restart
+
+        :return: Number of documents newly queued
+        """
+        return self.enqueue_schema(self.document_service.PENDING_SCHEMA_ID)
+
+    def queued_count(self):
+        """
+        Get the number of documents waiting for classification
+
+        :return: Queue length
+        """
+        with self._queued_lock:
+            return len(self._queued_ids)
+
+    def _ensure_started(self):
+        """
+        Start the worker thread on first use
+        """
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='reclassification-worker',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _wait_for_llm(self):
+        """
+        Block while the classification circuit breaker rejects calls, so
+        deferred documents are retried once it closes
+        """
+        classification_service = self.document_service.classification_service
+        circuit_breaker = getattr(classification_service, 'circuit_breaker', None)
+        if circuit_breaker is None:
+            return
+
+        delay = circuit_breaker.retry_after()
+        while delay > 0:
+            time.sleep(delay)
+            delay = circuit_breaker.retry_after()
+
+    def _run(self):
+        """
+        Worker loop: classify queued documents one at a time, or hand them to
+        the async runtime as the concurrency bound allows
+        """
+        while True:
+            classification_id = self._queue.get()
+            if self.runtime is not None:
+                self._submit(classification_id)
+                continue
+
+            retry = False
+            try:
+                self._wait_for_llm()
+                document = self.document_service.reclassify_document(
+                    classification_id, rate_limiter=self.rate_limiter
+                )
+                self._log_result(classification_id, document)
+            except ClassificationUnavailableError as e:
+                self.logger.warning(f"Reclassification of {classification_id} deferred: {str(e)}")
+                retry = True
+            except Exception as e:
+                self.logger.error(f"Reclassification of {classification_id} failed: {str(e)}")
+            finally:
+                self._finish(classification_id, retry)
+
+    def _submit(self, classification_id):
+        """
+        Start the classification of a document on the async runtime
+
+        :param classification_id: Identifier of the stored document
+        """
+        # Claimed first, so every failure below releases a held slot
+        self._in_flight.acquire()
+        try:
+            self._wait_for_llm()
+            future = self.runtime.submit(
+                self.document_service.reclassify_document_async(
+                    classification_id, rate_limiter=self.rate_limiter
+                )
+            )
+        except Exception as e:
+            self.logger.error(f"Reclassification of {classification_id} failed: {str(e)}")
+            self._in_flight.release()
+            self._finish(classification_id, False)
+            return
+        future.add_done_callback(lambda done: self._on_done(classification_id, done))
+
+    def _on_done(self, classification_id, future):
+        """
+        Record the outcome of a classification run on the async runtime
+
+        :param classification_id: Identifier of the stored document
+        :param future: Completed future of the classification
+        """
+        self._in_flight.release()
+        retry = False
+        try:
+            self._log_result(classification_id, future.result())
+        except ClassificationUnavailableError as e:
+            self.logger.warning(f"Reclassification of {classification_id} deferred: {str(e)}")
+            retry = True
+        except Exception as e:
+            self.logger.error(f"Reclassification of {classification_id} failed: {str(e)}")
+        finally:
+            self._finish(classification_id, retry)
+
+    def _log_result(self, classification_id, document):
+        """
+        Log the result of a reclassification
+
+        :param classification_id: Identifier of the stored document
+        :param document: Updated document, or None if it no longer exists
+        """
+        if document is None:
+            self.logger.warning(f"Document {classification_id} no longer exists")
+        else:
+            self.logger.info(
+                f"Reclassified {classification_id} as {document['schema_id']}"
+            )
+
+    def _finish(self, classification_id, retry):
+        """
+        Release a queued document, requeueing it if it was deferred
+
+        :param classification_id: Identifier of the stored document
+        :param retry: Whether the LLM was unavailable
+        """
+        with self._queued_lock:
+            self._queued_ids.discard(classification_id)
+        self._queue.task_done()
+
+        # Requeue at the back; _wait_for_llm holds it until the LLM is back
+        if retry:
+            self.enqueue_document(classification_id)
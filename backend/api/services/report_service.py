@@ -10,6 +10,21 @@ class ReportService:
         """
         self.document_service = document_service
 
+    def has_schema_report(self, schema_id: str) -> bool:
+        """
+        Check whether a report exists for a schema: the schema is known or
+        documents are classified under it.
+        
+        :param schema_id: Schema ID or title
+        :return: True if the schema has a report
+        """
+        if self.document_service.count_documents(schema_id):
+            return True
+        return any(
+            schema_id in (schema.get('id'), schema.get('title'))
+            for schema in self.document_service.get_schemas()
+        )
+
     def get_report(self, schema_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Get report data for all documents or filtered by schema.
@@ -35,7 +50,7 @@ class ReportService:
             
             # If no documents found, but schema exists, return minimal report
             if not documents:
-                if matching_schema:
+                if self.has_schema_report(schema_id):
                     return {
                         "generated_at": datetime.datetime.now().isoformat(),
                         "schema_id": schema_id,
@@ -1,4 +1,6 @@
+import hashlib
 import logging
+import time
 import uuid
 from typing import Dict, List, Any, Optional, Tuple
 
@@ -21,13 +23,33 @@ class SchemaService:
             "Sleep Study Report"
         ]
         
-        # In-memory storage for schemas
-        self._schemas = {
-            str(uuid.uuid4()).replace('-', '')[:8]: {
-                "id": str(uuid.uuid4()).replace('-', '')[:8],
-                "title": doc_type
-            } for doc_type in self._predefined_types
-        }
+        # In-memory storage for schemas; predefined types get ids derived
+        # from their titles, so every process starts with the same schemas
+        self._schemas = {}
+        for doc_type in self._predefined_types:
+            schema_id = uuid.uuid5(uuid.NAMESPACE_URL, doc_type).hex[:8]
+            self._schemas[schema_id] = {"id": schema_id, "title": doc_type}
+        
+        # Fingerprint of the schemas, changed on every mutation, for response caching
+        self.version = self._fingerprint()
+        self.updated_at = time.time()
+    
+    def _fingerprint(self) -> str:
+        """
+        Compute a version that is equal in every process holding the same schemas
+
+        Returns:
+            Short hex digest of the schema ids and titles
+        """
+        content = repr(sorted((schema['id'], schema['title']) for schema in self._schemas.values()))
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]
+    
+    def _mark_changed(self):
+        """
+        Update the schema version after a mutation
+        """
+        self.version = self._fingerprint()
+        self.updated_at = time.time()
     
     def get_schemas(self) -> List[Dict[str, Any]]:
         """
@@ -75,6 +97,7 @@ class SchemaService:
         
         # Add to schemas
         self._schemas[schema_id] = new_schema
+        self._mark_changed()
         
         return True, schema_id
     
@@ -98,6 +121,7 @@ class SchemaService:
         
         # Update the schema title
         self._schemas[schema_id]['title'] = new_title
+        self._mark_changed()
         
         return True, None
     
@@ -120,5 +144,6 @@ class SchemaService:
         
         # Remove the schema
         del self._schemas[schema_id]
+        self._mark_changed()
         
         return True, None
\ No newline at end of file
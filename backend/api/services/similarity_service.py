@@ -0,0 +1,230 @@
+import hashlib
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import zlib
+from array import array
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class SimilarityService:
+    """
+    Near-duplicate index over extracted document text.
+
+    Each document's text is reduced to a MinHash signature of its word
+    shingles. Signatures are split into bands and stored in
+    locality-sensitive hash buckets, so documents sharing most of their
+    text (the same form filled in with different data) are found with a
+    handful of bucket lookups instead of comparing against every document.
+    """
+    # Smallest prime above 2**32, the range of the shingle hashes
+    _PRIME = 4294967311
+    _WORD_RE = re.compile(r'\w+')
+    _DIGIT_RE = re.compile(r'\d')
+
+    def __init__(self, db_path=None, threshold=0.8, num_perm=64, bands=16,
+                 shingle_size=3, min_shingles=20, max_candidates=50):
+        """
+        Initialize the similarity service.
+
+        :param db_path: Path of the SQLite index
+        :param threshold: Minimum estimated Jaccard similarity to reuse a classification
+        :param num_perm: Number of MinHash permutations per signature
+        :param bands: Number of LSH bands; num_perm must be a multiple of it
+        :param shingle_size: Words per shingle
+        :param min_shingles: Documents with fewer shingles are never matched
+        :param max_candidates: Upper bound on signatures compared per lookup
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+
+        self.db_path = db_path or os.path.join(
+            os.path.dirname(__file__),
+            '../../_documents/similarity.sqlite3'
+        )
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        self.max_candidates = max_candidates
+
+        # Fixed seed: signatures must stay comparable across restarts
+        rng = random.Random(1)
+        self._permutations = [
+            (rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME))
+            for _ in range(num_perm)
+        ]
+        self._lock = threading.Lock()
+
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        self._create_tables()
+
+    @contextmanager
+    def _connect(self):
+        """
+        Open a connection, committing on success and always closing it.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _create_tables(self):
+        """
+        Create the signature and bucket tables if they do not exist yet.
+        """
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS signatures (
+                    classification_id TEXT PRIMARY KEY,
+                    schema_id TEXT NOT NULL,
+                    signature BLOB NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    band INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    classification_id TEXT NOT NULL,
+                    PRIMARY KEY (band, bucket, classification_id)
+                ) WITHOUT ROWID
+            """)
+
+    def _shingles(self, text: str) -> set:
+        """
+        Hash the overlapping word n-grams of a text.
+
+        Digits are masked so the same form with different dates, ids or
+        amounts produces the same shingles.
+
+        :param text: Extracted document text
+        :return: Set of 32-bit shingle hashes
+        """
+        words = self._WORD_RE.findall(self._DIGIT_RE.sub('0', text.lower()))
+        return {
+            zlib.crc32(' '.join(words[i:i + self.shingle_size]).encode('utf-8'))
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, parsed_content: Dict, max_chars: Optional[int] = None) -> Optional[List[int]]:
+        """
+        Compute the MinHash signature of parsed document content.
+
+        :param parsed_content: Parsed PDF content
+        :param max_chars: Optional number of leading characters to use, so
+                          previews and fully extracted documents compare alike
+        :return: List of num_perm minimum hashes, or None if the text is too
+                 short to be matched reliably
+        """
+        text = " ".join(page.get('text', '') for page in parsed_content.get('content', []))
+        if max_chars:
+            text = text[:max_chars]
+        shingles = self._shingles(text)
+        if len(shingles) < self.min_shingles:
+            return None
+
+        # Masked back to 32 bits so signatures pack into unsigned int arrays
+        prime = self._PRIME
+        return [
+            min(((a * shingle + b) % prime) & 0xFFFFFFFF for shingle in shingles)
+            for a, b in self._permutations
+        ]
+
+    def _band_buckets(self, signature: List[int]):
+        """
+        Hash each band of a signature to a bucket key.
+
+        :param signature: MinHash signature
+        :return: List of (band, bucket) pairs
+        """
+        buckets = []
+        for band in range(self.bands):
+            rows = array('I', signature[band * self.rows:(band + 1) * self.rows]).tobytes()
+            digest = hashlib.blake2b(rows, digest_size=8).digest()
+            buckets.append((band, int.from_bytes(digest, 'big', signed=True)))
+        return buckets
+
+    @staticmethod
+    def _similarity(first: List[int], second: List[int]) -> float:
+        """
+        Estimate the Jaccard similarity of two signatures.
+        """
+        return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+    def find_match(self, signature: List[int], exclude_id=None) -> Optional[Dict]:
+        """
+        Find the most similar indexed document above the threshold.
+
+        :param signature: MinHash signature of the new document
+        :param exclude_id: Optional document id to ignore, e.g. the document itself
+        :return: Dictionary with classification_id, schema_id and similarity,
+                 or None if no document is similar enough
+        """
+        buckets = self._band_buckets(signature)
+        where = " OR ".join(["(band = ? AND bucket = ?)"] * len(buckets))
+        params = [value for pair in buckets for value in pair]
+
+        with self._connect() as conn:
+            # Templated documents share bands with many others; the documents
+            # sharing the most bands are the likeliest to be most similar, so
+            # they are the ones scored
+            candidate_ids = [
+                row[0] for row in conn.execute(
+                    f"SELECT classification_id FROM lsh_buckets "
+                    f"WHERE ({where}) AND classification_id IS NOT ? "
+                    f"GROUP BY classification_id ORDER BY COUNT(*) DESC LIMIT ?",
+                    params + [exclude_id, self.max_candidates]
+                )
+            ]
+            if not candidate_ids:
+                return None
+
+            placeholders = ",".join("?" * len(candidate_ids))
+            rows = conn.execute(
+                f"SELECT classification_id, schema_id, signature FROM signatures "
+                f"WHERE classification_id IN ({placeholders})",
+                candidate_ids
+            ).fetchall()
+
+        best = None
+        for classification_id, schema_id, blob in rows:
+            similarity = self._similarity(signature, array('I', blob).tolist())
+            if similarity >= self.threshold and (best is None or similarity > best['similarity']):
+                best = {
+                    "classification_id": classification_id,
+                    "schema_id": schema_id,
+                    "similarity": round(similarity, 3)
+                }
+        return best
+
+    def add(self, classification_id, schema_id, signature: List[int]):
+        """
+        Index a classified document, replacing any earlier entry for it.
+
+        :param classification_id: Identifier of the document
+        :param schema_id: Schema the document was classified as
+        :param signature: MinHash signature of its text
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO signatures (classification_id, schema_id, signature) "
+                "VALUES (?, ?, ?)",
+                (classification_id, schema_id, array('I', signature).tobytes())
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets (band, bucket, classification_id) VALUES (?, ?, ?)",
+                [(band, bucket, classification_id) for band, bucket in self._band_buckets(signature)]
+            )
+
@@ -0,0 +1,350 @@
+import datetime
+import gzip
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+
+from api.utils.file_utils import content_address_path, place_content_addressed, stream_to_temp_file
+
+
+class StorageService:
+    """
+    Service managing the lifecycle of uploaded originals: archival,
+    retention and reconciliation with the document store
+    """
+    # Suffix of compressed originals in the archive tier
+    ARCHIVE_SUFFIX = '.gz'
+
+    def __init__(self, upload_folder, archive_folder, retention_days=0,
+                 gc_grace_seconds=3600, archive_after_extraction=True):
+        """
+        Initialize the storage service
+
+        :param upload_folder: Root of the content-addressed upload store
+        :param archive_folder: Root of the compressed archive tier
+        :param retention_days: Days to keep archived originals (0 keeps them forever)
+        :param gc_grace_seconds: Minimum age of an unreferenced file before it is removed
+        :param archive_after_extraction: Compress originals once their text is extracted
+        """
+        self.upload_folder = upload_folder
+        self.archive_folder = archive_folder
+        self.retention_days = retention_days
+        self.gc_grace_seconds = gc_grace_seconds
+        self.archive_after_extraction = archive_after_extraction
+
+        self._maintenance_thread = None
+
+        # Content-addressed uploads are shared by every document with the
+        # same content. Holds count the uploads and background extractions
+        # still reading an original; archiving removes a held original only
+        # once its last hold is released
+        self._holds = Counter()
+        self._pending_removal = set()
+        self._files_lock = threading.Lock()
+
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    def save_upload(self, file):
+        """
+        Save an uploaded file under its content address and hold it.
+
+        Reusing an existing original and taking the hold happen under one
+        lock, so a concurrent archival of the same content cannot remove the
+        file between the two. When the content is only left in the archive,
+        the upload is stored again so it can be parsed. The caller releases
+        the hold once it is done with the file.
+
+        :param file: FileStorage object to save
+        :return: Path of the saved file
+        """
+        temp_path, digest = stream_to_temp_file(file, self.upload_folder)
+        extension = os.path.splitext(file.filename or '')[1].lower()
+        filepath = content_address_path(self.upload_folder, digest, extension)
+
+        with self._files_lock:
+            place_content_addressed(temp_path, filepath)
+            self._pending_removal.discard(filepath)
+            self._holds[filepath] += 1
+        return filepath
+
+    def content_digest(self, filepath):
+        """
+        Get the digest an upload was stored under by save_upload.
+
+        :param filepath: Path of the original
+        :return: Hex SHA-256 digest of its content, or None if the path is
+                 not a content address in the upload folder
+        """
+        digest, extension = os.path.splitext(os.path.basename(filepath))
+        if len(digest) != 64 or not all(c in '0123456789abcdef' for c in digest):
+            return None
+        if os.path.abspath(filepath) != os.path.abspath(content_address_path(self.upload_folder, digest, extension)):
+            return None
+        return digest
+
+    def hold(self, filepath):
+        """
+        Keep an original from being removed while it is being read.
+
+        :param filepath: Path of the original
+        """
+        with self._files_lock:
+            self._holds[filepath] += 1
+
+    def release(self, filepath):
+        """
+        Release a hold, removing the original if it was archived meanwhile.
+
+        :param filepath: Path of the original
+        """
+        with self._files_lock:
+            self._holds[filepath] -= 1
+            if self._holds[filepath] > 0:
+                return
+            del self._holds[filepath]
+            if filepath not in self._pending_removal:
+                return
+            self._pending_removal.discard(filepath)
+            self._remove_original(filepath)
+
+    def remove_upload(self, filepath):
+        """
+        Remove an original from uploads, once no upload or extraction in
+        flight holds it anymore.
+
+        :param filepath: Path of the original
+        """
+        with self._files_lock:
+            if self._holds[filepath] > 0:
+                self._pending_removal.add(filepath)
+            else:
+                self._holds.pop(filepath, None)
+                self._remove_original(filepath)
+
+    def _remove_original(self, filepath):
+        """
+        Remove an archived or rejected original; the caller holds the files lock.
+
+        :param filepath: Path of the original
+        """
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.error(f"Removing original {filepath} failed: {str(e)}")
+
+    def archived_path(self, filepath):
+        """
+        Get the archive tier path of an original.
+
+        :param filepath: Path of the original inside the upload folder
+        :return: Path of its compressed copy
+        """
+        relative_path = os.path.relpath(filepath, self.upload_folder)
+        return os.path.join(self.archive_folder, relative_path) + self.ARCHIVE_SUFFIX
+
+    def resolve(self, filepath):
+        """
+        Get the path a new document should reference for an original:
+        its archived copy if the content has been archived already.
+
+        :param filepath: Path of the original
+        :return: Archived path if it exists, otherwise the original path
+        """
+        if not filepath or self.is_archived(filepath):
+            return filepath
+        archived_path = self.archived_path(filepath)
+        return archived_path if os.path.exists(archived_path) else filepath
+
+    def archive_file(self, filepath):
+        """
+        Compress an original into the archive tier and remove it from uploads.
+
+        The archive keeps the content-addressed name, so identical uploads
+        share a single archived copy. An original still held by an upload or
+        extraction in flight is removed when its last hold is released.
+
+        :param filepath: Path of the original inside the upload folder
+        :return: Path of the archived file
+        """
+        archived_path = self.archived_path(filepath)
+
+        if not os.path.exists(archived_path):
+            os.makedirs(os.path.dirname(archived_path), exist_ok=True)
+            temp_path = f"{archived_path}.{threading.get_ident()}.tmp"
+            with open(filepath, 'rb') as source, gzip.open(temp_path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.replace(temp_path, archived_path)
+
+        self.remove_upload(filepath)
+        return archived_path
+
+    def is_archived(self, filepath):
+        """
+        Check whether a path points into the archive tier.
+
+        :param filepath: Stored file path
+        :return: True for archived files
+        """
+        return bool(filepath) and filepath.endswith(self.ARCHIVE_SUFFIX) and \
+            os.path.abspath(filepath).startswith(os.path.abspath(self.archive_folder))
+
+    def apply_retention(self, document_service):
+        """
+        Delete archived originals older than the retention period and clear
+        the file reference on the documents that pointed to them.
+
+        A shared file is as old as the newest document referencing it, so
+        uploading the same content again keeps it. Unreferenced files are
+        judged by their modification time.
+
+        :param document_service: Service owning the document records
+        :return: Number of files deleted
+        """
+        if not self.retention_days:
+            return 0
+
+        cutoff = time.time() - self.retention_days * 86400
+        cutoff_iso = datetime.datetime.fromtimestamp(cutoff).isoformat()
+        newest_reference = {}
+        for doc in document_service.get_documents():
+            if doc.get('filepath'):
+                path = os.path.abspath(doc['filepath'])
+                newest_reference[path] = max(newest_reference.get(path, ''), doc.get('processed_at') or '')
+
+        deleted = 0
+        for filepath in self._iter_files(self.archive_folder):
+            try:
+                newest = newest_reference.get(os.path.abspath(filepath))
+                if newest is not None:
+                    if newest >= cutoff_iso:
+                        continue
+                elif os.path.getmtime(filepath) >= cutoff:
+                    continue
+                with self._files_lock:
+                    # An upload of the same content in flight may point its record here
+                    if self._holds[self._original_path(filepath)] > 0:
+                        continue
+                    os.remove(filepath)
+            except OSError as e:
+                self.logger.error(f"Retention failed for {filepath}: {str(e)}")
+                continue
+
+            deleted += 1
+            document_service.relocate_file(filepath, None, {
+                "file_purged_at": datetime.datetime.now().isoformat()
+            })
+        return deleted
+
+    def collect_garbage(self, document_service):
+        """
+        Reconcile files on disk with the document store: remove files no
+        document references and flag documents whose file has disappeared.
+
+        :param document_service: Service owning the document records
+        :return: Dictionary with the number of orphans removed and missing files
+        """
+        documents = document_service.get_documents()
+        referenced = {
+            os.path.abspath(doc['filepath'])
+            for doc in documents if doc.get('filepath')
+        }
+        cutoff = time.time() - self.gc_grace_seconds
+
+        orphans_removed = 0
+        for root_folder in (self.upload_folder, self.archive_folder):
+            for filepath in self._iter_files(root_folder):
+                if os.path.abspath(filepath) in referenced:
+                    continue
+                try:
+                    # Leave recent files alone; they may belong to an upload in flight
+                    if os.path.getmtime(filepath) >= cutoff:
+                        continue
+                    with self._files_lock:
+                        if self._holds[filepath] > 0 or self._holds[self._original_path(filepath)] > 0:
+                            continue
+                        os.remove(filepath)
+                    orphans_removed += 1
+                except OSError as e:
+                    self.logger.error(f"Garbage collection failed for {filepath}: {str(e)}")
+
+        missing = [
+            doc['classification_id'] for doc in documents
+            if doc.get('filepath') and not doc.get('file_missing')
+            and not os.path.exists(doc['filepath'])
+        ]
+        for classification_id in missing:
+            document_service.mark_file_missing(classification_id)
+
+        self.logger.info(
+            f"Storage GC removed {orphans_removed} orphaned files, "
+            f"found {len(missing)} documents with missing files"
+        )
+        return {
+            "orphans_removed": orphans_removed,
+            "missing_files": len(missing)
+        }
+
+    def run_maintenance(self, document_service):
+        """
+        Run retention and garbage collection once.
+
+        :param document_service: Service owning the document records
+        :return: Dictionary summarizing the maintenance run
+        """
+        report = self.collect_garbage(document_service)
+        report["expired_removed"] = self.apply_retention(document_service)
+        return report
+
+    def start_maintenance(self, document_service, interval_seconds):
+        """
+        Run maintenance periodically in a daemon thread.
+
+        :param document_service: Service owning the document records
+        :param interval_seconds: Seconds between maintenance runs
+        """
+        if self._maintenance_thread is not None or interval_seconds <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.run_maintenance(document_service)
+                except Exception as e:
+                    self.logger.error(f"Storage maintenance failed: {str(e)}")
+
+        self._maintenance_thread = threading.Thread(
+            target=run,
+            name='storage-maintenance',
+            daemon=True
+        )
+        self._maintenance_thread.start()
+
+    def _original_path(self, archived_path):
+        """
+        Get the upload folder path of an archived file.
+
+        :param archived_path: Path inside the archive tier
+        :return: Path the original had inside the upload folder
+        """
+        relative_path = os.path.relpath(archived_path, self.archive_folder)
+        if relative_path.endswith(self.ARCHIVE_SUFFIX):
+            relative_path = relative_path[:-len(self.ARCHIVE_SUFFIX)]
+        return os.path.join(self.upload_folder, relative_path)
+
+    def _iter_files(self, root_folder):
+        """
+        Yield every stored file below a root folder.
+
+        :param root_folder: Directory to walk
+        """
+        for directory, _, filenames in os.walk(root_folder):
+            for filename in filenames:
+                yield os.path.join(directory, filename)
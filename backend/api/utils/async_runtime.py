@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Coroutine, Optional
+
+
+class AsyncRuntime:
+    """
+    Event loop running in a background thread for non-blocking I/O
+
+    Coroutines waiting on the network share the loop's thread, so hundreds
+    of outstanding LLM calls cost a few threads instead of one each.
+    Blocking steps of those coroutines go to the loop's default executor
+    via loop.run_in_executor(None, ...), which is bounded by
+    executor_workers. Synchronous code hands coroutines over with submit.
+    """
+
+    def __init__(self, executor_workers: int = 4):
+        """
+        Initialize the runtime; the loop thread starts on first use
+
+        Args:
+            executor_workers: Threads for blocking work run from coroutines
+        """
+        self.executor_workers = executor_workers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        """
+        Start the loop thread if it is not running yet
+
+        Returns:
+            The running event loop
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(ThreadPoolExecutor(
+                    max_workers=self.executor_workers,
+                    thread_name_prefix='async-runtime-executor'
+                ))
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._loop = loop
+                self._thread = threading.Thread(target=run, name='async-runtime', daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self._loop
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """
+        Schedule a coroutine on the loop from any thread
+
+        Args:
+            coroutine: Coroutine to run
+
+        Returns:
+            concurrent.futures.Future resolving to the coroutine's result
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_started())
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the loop and wait for its result
+
+        Must not be called from the loop thread itself.
+
+        Args:
+            coroutine: Coroutine to run
+            timeout: Seconds to wait for the result
+
+        Returns:
+            Result of the coroutine
+        """
+        return self.submit(coroutine).result(timeout)
@@ -0,0 +1,129 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from flask import Response, request
+
+class VersionedResponseCache:
+    """
+    Cache of serialized JSON responses, keyed by request and store version
+
+    An entry is valid only for the exact version it was built for, so a
+    version bump on the underlying stores invalidates it without any
+    explicit purge.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Maximum number of cached responses (LRU eviction)
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[bytes]:
+        """
+        Get a cached body if it was built for the given version
+
+        Args:
+            key: Request key
+            version: Current store version
+
+        Returns:
+            Serialized body, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, version: Hashable, body: bytes):
+        """
+        Store a serialized body for a version
+
+        Args:
+            key: Request key
+            version: Store version the body was built from
+            body: Serialized response body
+        """
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def build_etag(version: Hashable) -> str:
+    """
+    Build an ETag value for a store version
+
+    The ETag depends on the versions alone, so every worker serving the
+    same stores issues the same ETag; the stores' versions must therefore
+    identify their contents across processes and restarts.
+
+    Args:
+        version: Store version, a scalar or tuple of scalars
+
+    Returns:
+        Unquoted ETag value
+    """
+    parts = version if isinstance(version, tuple) else (version,)
+    return '-'.join(str(part) for part in parts)
+
+
+def conditional_json_response(cache: VersionedResponseCache,
+                              key: Hashable,
+                              version: Hashable,
+                              last_modified: float,
+                              build: Callable[[], Any]) -> Optional[Response]:
+    """
+    Serve a JSON payload with ETag/Last-Modified validation and caching
+
+    Returns 304 Not Modified when the client's validators match, the cached
+    body when the version is unchanged, and otherwise builds, serializes
+    and caches a fresh payload.
+
+    Args:
+        cache: Response cache to use
+        key: Request key (e.g. endpoint and arguments)
+        version: Current version of every store the payload depends on
+        last_modified: Unix timestamp of the last change to those stores
+        build: Callable producing the payload; may return None
+
+    Returns:
+        Flask response, or None if build returned None
+    """
+    etag = build_etag(version)
+    # HTTP dates have second precision
+    last_modified = int(last_modified)
+
+    if request.if_none_match:
+        not_modified = etag in request.if_none_match
+    elif request.if_modified_since:
+        not_modified = last_modified <= request.if_modified_since.timestamp()
+    else:
+        not_modified = False
+
+    if not_modified:
+        response = Response(status=304)
+    else:
+        body = cache.get(key, version)
+        if body is None:
+            payload = build()
+            if payload is None:
+                return None
+            body = json.dumps(payload).encode('utf-8')
+            cache.put(key, version, body)
+        response = Response(body, mimetype='application/json')
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Allow clients to store the response but make them revalidate each time
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,93 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker guarding calls to an unreliable dependency
+
+    Closed: calls go through and consecutive failures are counted.
+    Open: after failure_threshold consecutive failures, calls are rejected
+    immediately for reset_timeout seconds.
+    Half-open: once the timeout has elapsed a single probe call is allowed;
+    its success closes the circuit, its failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to wait before probing an open circuit
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """
+        Current state: closed, open or half_open
+        """
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may proceed, claiming the probe slot when an
+        open circuit is due for a retry
+
+        Returns:
+            True if the caller may make the call
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            # Let one probe through once the timeout has elapsed; a probe
+            # that never reported back is replaced after another timeout
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        """
+        Seconds until the circuit will accept a call
+
+        Returns:
+            0 when calls are accepted now, otherwise the remaining wait
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return 0.0
+            # Half-open: a probe is in flight and is replaced once it has
+            # been out for reset_timeout without reporting back
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        """
+        Record a successful call, closing the circuit
+        """
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        """
+        Record a failed call, opening the circuit when the threshold is
+        reached or when a half-open probe fails
+        """
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
@@ -0,0 +1,374 @@
+import bisect
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Fields kept in dedicated slots, in the order documents are serialized;
+# any other field is kept in the record's extra dictionary
+RECORD_FIELDS = (
+    'classification_id',
+    'filename',
+    'schema_id',
+    'processed_at',
+    'filepath',
+    'classification',
+    'classification_ms',
+    'confidence'
+)
+_RECORD_FIELD_SET = frozenset(RECORD_FIELDS)
+
+# Fields whose values repeat across documents; interning stores each
+# distinct value once
+INTERNED_FIELDS = frozenset(('filename', 'schema_id', 'filepath'))
+
+# Fields the index looks up, and so must be held even for records whose
+# other fields stay in the store's checkpoint
+INDEXED_FIELDS = ('classification_id', 'schema_id', 'processed_at', 'confidence', 'filepath')
+
+# Value of the slots of a stored record that were not loaded
+_UNLOADED = object()
+
+
+def _intern_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Intern the string values of a small dictionary such as a classification,
+    whose schema and reasoning repeat across templated documents
+    """
+    return {
+        key: sys.intern(value) if isinstance(value, str) else value
+        for key, value in values.items()
+    }
+
+
+class DocumentRecord:
+    """
+    Compact metadata of one stored document
+
+    Uses __slots__ instead of a per-record dict and keeps rarely set fields
+    in an optional extra dict, so a record costs a fraction of the dict it
+    replaces. Parsed text is never held here.
+
+    A record loaded through the store's checkpoint index holds only the
+    indexed fields and later changes; its other fields are read from the
+    mapped checkpoint whenever the document is rebuilt.
+    """
+    __slots__ = RECORD_FIELDS + ('position', 'extra', 'stored')
+
+    def __init__(self, position: int, document: Dict[str, Any], stored=None):
+        """
+        Initialize a record from a document dictionary
+
+        Args:
+            position: Insertion position of the document in the index
+            document: Document metadata, or only the loaded fields of a
+                stored document
+            stored: Optional (reader, offset, length) of the rest of the
+                document in the checkpoint
+        """
+        for field in RECORD_FIELDS:
+            setattr(self, field, _UNLOADED if stored else None)
+        self.position = position
+        self.extra = None
+        self.stored = stored
+        self.update(document)
+
+    def update(self, values: Dict[str, Any]):
+        """
+        Overwrite fields of the record
+
+        Args:
+            values: Field values to set
+        """
+        for key, value in values.items():
+            if key in _RECORD_FIELD_SET:
+                if key in INTERNED_FIELDS and isinstance(value, str):
+                    value = sys.intern(value)
+                elif key == 'classification' and isinstance(value, dict):
+                    value = _intern_values(value)
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Rebuild the document dictionary
+
+        Returns:
+            New dictionary with every field of the record
+        """
+        if self.stored is None:
+            document = {field: getattr(self, field) for field in RECORD_FIELDS}
+        else:
+            # Loaded and changed fields override the checkpointed document
+            reader, offset, length = self.stored
+            document = reader.read(offset, length)
+            for field in RECORD_FIELDS:
+                value = getattr(self, field)
+                if value is _UNLOADED:
+                    document.setdefault(field, None)
+                else:
+                    document[field] = value
+        if self.extra:
+            document.update(self.extra)
+        return document
+
+    @property
+    def date_key(self) -> str:
+        return self.processed_at or ''
+
+    @property
+    def confidence_key(self) -> float:
+        return float(self.confidence or 0)
+
+
+class _SortedColumn:
+    """
+    Sorted (key, position) pairs held in two parallel arrays, for range
+    lookups by bisection
+
+    Pairs are ordered by key, then by position, so a pair can be located
+    without scanning runs of equal keys.
+    """
+    def __init__(self, keys):
+        self.keys = keys
+        self.positions = array('q')
+
+    def insert(self, key, position: int):
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_right(self.keys, key, lo)
+        index = bisect.bisect_left(self.positions, position, lo, hi)
+        self.keys.insert(index, key)
+        self.positions.insert(index, position)
+
+    def remove(self, key, position: int):
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_right(self.keys, key, lo)
+        index = bisect.bisect_left(self.positions, position, lo, hi)
+        if index < hi and self.positions[index] == position:
+            del self.keys[index]
+            del self.positions[index]
+
+    def rebuild(self, pairs: Iterable):
+        """
+        Replace the contents with (key, position) pairs, sorted once
+        """
+        pairs = sorted(pairs)
+        del self.keys[:]
+        del self.positions[:]
+        self.keys.extend(key for key, _ in pairs)
+        self.positions.extend(position for _, position in pairs)
+
+    def bounds(self, low=None, high=None):
+        """
+        Get the index range of keys in [low, high)
+        """
+        lo = bisect.bisect_left(self.keys, low) if low is not None else 0
+        hi = bisect.bisect_left(self.keys, high) if high is not None else len(self.keys)
+        return lo, max(lo, hi)
+
+
+class DocumentIndex:
+    """
+    In-memory metadata index of stored documents
+
+    Records are slotted objects with interned schema, filename and path
+    strings. Lookups by id are hashed and each schema keeps a sorted array
+    of record positions; processed_at and confidence are kept in sorted
+    columns, so range filters bisect instead of scanning every document.
+    Not thread-safe: callers hold their own lock.
+    """
+    def __init__(self, documents=()):
+        """
+        Initialize the index
+
+        Args:
+            documents: Optional iterable of document dictionaries to add
+        """
+        self._records: List[DocumentRecord] = []
+        self._by_id: Dict[str, DocumentRecord] = {}
+        # schema_id -> sorted positions of its records
+        self._by_schema: Dict[str, array] = {}
+        self._by_date = _SortedColumn([])
+        self._by_confidence = _SortedColumn(array('d'))
+
+        self.extend(documents)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[DocumentRecord]:
+        return iter(self._records)
+
+    def __contains__(self, classification_id) -> bool:
+        return classification_id in self._by_id
+
+    def add(self, document: Dict[str, Any]) -> DocumentRecord:
+        """
+        Add a document to the index
+
+        Args:
+            document: Document metadata with a classification_id
+
+        Returns:
+            The new record
+        """
+        record = DocumentRecord(len(self._records), document)
+        self._records.append(record)
+        self._by_id[record.classification_id] = record
+        self._by_schema.setdefault(record.schema_id, array('q')).append(record.position)
+        self._by_date.insert(record.date_key, record.position)
+        self._by_confidence.insert(record.confidence_key, record.position)
+        return record
+
+    def extend(self, documents: Iterable[Dict[str, Any]]):
+        """
+        Add many documents at once, e.g. when loading the store
+
+        Inserting into the sorted columns one by one shifts their arrays on
+        every insert; here they are rebuilt with a single sort instead.
+
+        Args:
+            documents: Document dictionaries with a classification_id, or
+                stored documents with fields and stored attributes (see
+                DocumentStore) whose bodies stay in the checkpoint
+        """
+        added = 0
+        for document in documents:
+            stored = getattr(document, 'stored', None)
+            if stored is not None:
+                record = DocumentRecord(len(self._records), document.fields, stored)
+            else:
+                record = DocumentRecord(len(self._records), document)
+            self._records.append(record)
+            self._by_id[record.classification_id] = record
+            # Positions only grow, so the schema arrays stay sorted
+            self._by_schema.setdefault(record.schema_id, array('q')).append(record.position)
+            added += 1
+
+        if added:
+            self._by_date.rebuild((record.date_key, record.position) for record in self._records)
+            self._by_confidence.rebuild((record.confidence_key, record.position) for record in self._records)
+
+    def count(self, schema_id=None) -> int:
+        """
+        Count the documents, or those of one schema
+
+        Args:
+            schema_id: Optional schema to count
+
+        Returns:
+            Number of documents
+        """
+        if schema_id is None:
+            return len(self._records)
+        return len(self._by_schema.get(schema_id, ()))
+
+    def get(self, classification_id) -> Optional[Dict[str, Any]]:
+        """
+        Get a document by id
+
+        Args:
+            classification_id: Identifier of the document
+
+        Returns:
+            Document dictionary, or None if it is not indexed
+        """
+        record = self._by_id.get(classification_id)
+        return record.to_dict() if record else None
+
+    def update(self, classification_id, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Update fields of a document, keeping the indexes in step
+
+        Args:
+            classification_id: Identifier of the document
+            updates: Field values to set
+
+        Returns:
+            Updated document dictionary, or None if it is not indexed
+        """
+        record = self._by_id.get(classification_id)
+        if record is None:
+            return None
+
+        schema_id, date_key, confidence_key = record.schema_id, record.date_key, record.confidence_key
+        record.update(updates)
+
+        if record.schema_id != schema_id:
+            positions = self._by_schema[schema_id]
+            del positions[bisect.bisect_left(positions, record.position)]
+            if not positions:
+                del self._by_schema[schema_id]
+            bisect.insort(
+                self._by_schema.setdefault(record.schema_id, array('q')),
+                record.position
+            )
+        if record.date_key != date_key:
+            self._by_date.remove(date_key, record.position)
+            self._by_date.insert(record.date_key, record.position)
+        if record.confidence_key != confidence_key:
+            self._by_confidence.remove(confidence_key, record.position)
+            self._by_confidence.insert(record.confidence_key, record.position)
+
+        return record.to_dict()
+
+    def to_dicts(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over every document in insertion order
+
+        Yields:
+            Document dictionaries
+        """
+        for record in self._records:
+            yield record.to_dict()
+
+    def query(self,
+              schema_id: Optional[str] = None,
+              start: Optional[str] = None,
+              end: Optional[str] = None,
+              min_confidence: Optional[float] = None) -> List[DocumentRecord]:
+        """
+        Find documents matching every given filter
+
+        The most selective index narrows the candidates and the remaining
+        filters are checked on those records only.
+
+        Args:
+            schema_id: Only documents of this schema
+            start: Only documents processed at or after this ISO 8601 timestamp
+            end: Only documents processed before this ISO 8601 timestamp
+            min_confidence: Only documents with at least this confidence
+
+        Returns:
+            Matching records in insertion order
+        """
+        candidates = []
+        if schema_id is not None:
+            positions = self._by_schema.get(schema_id, ())
+            candidates.append((len(positions), lambda: [self._records[position] for position in positions]))
+        if start is not None or end is not None:
+            lo, hi = self._by_date.bounds(start, end)
+            candidates.append((hi - lo, lambda: self._column_records(self._by_date, lo, hi)))
+        if min_confidence is not None:
+            lo_c, hi_c = self._by_confidence.bounds(float(min_confidence))
+            candidates.append((hi_c - lo_c, lambda: self._column_records(self._by_confidence, lo_c, hi_c)))
+
+        if not candidates:
+            return list(self._records)
+
+        _, records = min(candidates, key=lambda candidate: candidate[0])
+        return [
+            record for record in records()
+            if (schema_id is None or record.schema_id == schema_id)
+            and (start is None or record.date_key >= start)
+            and (end is None or record.date_key < end)
+            and (min_confidence is None or record.confidence_key >= min_confidence)
+        ]
+
+    def _column_records(self, column: _SortedColumn, lo: int, hi: int) -> List[DocumentRecord]:
+        """
+        Get the records of a column range in insertion order
+        """
+        return [self._records[position] for position in sorted(column.positions[lo:hi])]
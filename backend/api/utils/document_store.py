@@ -0,0 +1,630 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Characters read from the checkpoint at a time while parsing it
+CHECKPOINT_READ_CHARS = 1024 * 1024
+
+# Seconds between attempts to write a checkpoint after one failed
+CHECKPOINT_RETRY_SECONDS = 5.0
+
+
+class DocumentStoreError(Exception):
+    """
+    Raised when changes could not be made durable in time
+    """
+    pass
+
+
+class CheckpointReader:
+    """
+    Read-only memory map of a checkpoint, from which single documents are
+    parsed on demand
+
+    The map keeps the file alive after the checkpoint is replaced, so
+    documents loaded from it stay readable until the last one is dropped.
+    """
+
+    def __init__(self, path: str):
+        """
+        Map a checkpoint file
+
+        Args:
+            path: Path to the checkpoint
+        """
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, offset: int, length: int) -> Dict[str, Any]:
+        """
+        Parse one document
+
+        Args:
+            offset: Byte offset of the document's JSON in the checkpoint
+            length: Length of the JSON in bytes
+
+        Returns:
+            Document dictionary
+        """
+        return json.loads(self._map[offset:offset + length])
+
+
+class StoredDocument:
+    """
+    Document loaded through the checkpoint index
+
+    Only the indexed fields, and any changes replayed from the log, are held
+    in fields; the rest of the document stays in the checkpoint and is read
+    through stored, a (CheckpointReader, offset, length) tuple.
+    """
+    __slots__ = ('fields', 'stored')
+
+    def __init__(self, fields: Dict[str, Any], stored: Tuple[CheckpointReader, int, int]):
+        self.fields = fields
+        self.stored = stored
+
+    def __contains__(self, key) -> bool:
+        return key in self.fields
+
+    def update(self, values: Dict[str, Any]):
+        self.fields.update(values)
+
+
+class DocumentStore:
+    """
+    Crash-safe persistence of document metadata with group commit
+
+    The store is a checkpoint (a JSON array of documents, the format of the
+    original processed_documents.json) plus a write-ahead log of the
+    changes made since, one JSON record per line. Changes are appended by
+    a single writer thread: records from concurrent callers arriving within
+    commit_latency are written as one batch and made durable with one fsync,
+    so concurrent ingestion shares the cost of a commit instead of each
+    rewriting the whole file.
+
+    Once the log grows past checkpoint_bytes the writer asks for a snapshot
+    of all documents, writes it to a temporary file, fsyncs it and renames it
+    over the checkpoint before truncating the log. A crash at any point
+    leaves either the old checkpoint and its log or the new checkpoint,
+    and replaying a log over a newer checkpoint is harmless because
+    records set values rather than modify them.
+
+    Log records are {"op": "add", "document": {...}} and
+    {"op": "update", "ids": [...], "updates": {...}}.
+
+    When index_fields are set, every checkpoint is written with an index
+    file next to it holding those fields of each document in columns, plus
+    the byte range of each document in the checkpoint. A load whose index
+    matches the checkpoint parses only the index and maps the checkpoint,
+    returning StoredDocument objects whose other fields are read when
+    needed; otherwise the checkpoint is parsed in full.
+    """
+
+    def __init__(self, storage_path: str, commit_latency: float = 0.002,
+                 checkpoint_bytes: int = 4 * 1024 * 1024, max_batch: int = 1000,
+                 commit_timeout: float = 30.0, index_fields: Sequence[str] = ()):
+        """
+        Initialize the store
+
+        Args:
+            storage_path: Path of the checkpoint file; the log is kept next
+                to it with a .wal extension
+            commit_latency: Seconds the writer waits for more records before
+                committing a batch; 0 commits whatever arrived during the
+                previous commit
+            checkpoint_bytes: Log size that triggers a checkpoint
+            max_batch: Records committed at most in one batch
+            commit_timeout: Seconds wait blocks at most by default
+            index_fields: Fields kept in the checkpoint index; must include
+                classification_id. No index is written if empty
+        """
+        self.storage_path = storage_path
+        self.wal_path = os.path.splitext(storage_path)[0] + '.wal'
+        self.index_path = os.path.splitext(storage_path)[0] + '.idx'
+        self.index_fields = tuple(index_fields)
+        self.commit_latency = commit_latency
+        self.checkpoint_bytes = checkpoint_bytes
+        self.max_batch = max_batch
+        self.commit_timeout = commit_timeout
+
+        # Callable returning every current document, set by the owner
+        self.snapshot: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None
+
+        # Encoded log lines waiting for the writer
+        self._queue: List[str] = []
+        self._appended = 0
+        self._committed = 0
+        # Recent (first, last sequence, error) of batches that were lost
+        self._failures = deque(maxlen=1000)
+        self._checkpoint_requested = False
+        # A failed commit or checkpoint left changes only in memory
+        self._checkpoint_due = False
+        self._condition = threading.Condition()
+        # Held while files are written, so loads never see a half-done commit
+        self._write_lock = threading.Lock()
+        self._signature = None
+        self._thread = None
+
+        self.logger = logging.getLogger(__name__)
+
+        if not os.path.exists(self.storage_path):
+            self._write_checkpoint([])
+
+    def _get_signature(self):
+        """
+        Get a cheap fingerprint of the checkpoint and log files
+
+        Returns:
+            Tuple of modification times and sizes
+        """
+        signature = []
+        for path in (self.storage_path, self.wal_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def load(self) -> List[Dict[str, Any]]:
+        """
+        Read the checkpoint and replay the log over it
+
+        Returns:
+            List of documents in insertion order: dictionaries, or
+            StoredDocument objects when the checkpoint index was used
+        """
+        with self._write_lock:
+            documents = self._load_indexed()
+            if documents is None:
+                try:
+                    with open(self.storage_path, 'r') as f:
+                        documents = {document['classification_id']: document for document in self._iter_checkpoint(f)}
+                except Exception as e:
+                    self.logger.error(f"Error loading document checkpoint: {str(e)}")
+                    documents = {}
+
+            replayed = 0
+            try:
+                with open(self.wal_path, 'rb+') as f:
+                    offset = 0
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # Only a crash during a commit leaves a torn last
+                            # line; cut it off so new records are not logged
+                            # behind it
+                            self.logger.warning("Dropping incomplete record at the end of the document log")
+                            f.truncate(offset)
+                            break
+                        self._replay(documents, record)
+                        replayed += 1
+                        offset += len(line)
+            except FileNotFoundError:
+                pass
+
+            if replayed:
+                self.logger.info(f"Replayed {replayed} document log records")
+            self._signature = self._get_signature()
+            return list(documents.values())
+
+    def _load_indexed(self) -> Optional[Dict[str, StoredDocument]]:
+        """
+        Load the documents through the checkpoint index
+
+        Returns:
+            Documents by classification_id, or None if there is no index
+            matching the current checkpoint and index fields
+        """
+        if not self.index_fields:
+            return None
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            stat = os.stat(self.storage_path)
+            if index['checkpoint'] != [stat.st_size, stat.st_mtime_ns]:
+                return None
+            columns = index['fields']
+            if set(columns) != set(self.index_fields):
+                return None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        offsets, lengths = index['offsets'], index['lengths']
+        reader = CheckpointReader(self.storage_path) if offsets else None
+        names = list(columns)
+        documents = {}
+        for values, offset, length in zip(zip(*(columns[name] for name in names)), offsets, lengths):
+            fields = dict(zip(names, values))
+            documents[fields['classification_id']] = StoredDocument(fields, (reader, offset, length))
+        return documents
+
+    @staticmethod
+    def _iter_checkpoint(f) -> Iterator[Dict[str, Any]]:
+        """
+        Parse the checkpoint's JSON array one document at a time, so the
+        whole file is never held as text next to the parsed documents
+
+        Args:
+            f: Checkpoint file opened for reading
+
+        Yields:
+            Document dictionaries in file order
+
+        Raises:
+            ValueError: If the file is not a JSON array of objects
+        """
+        decoder = json.JSONDecoder()
+        buffer = ''
+        position = 0
+        started = False
+        eof = False
+        while True:
+            # Skip the separators between documents
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != '[':
+                        raise ValueError("Document checkpoint is not a JSON array")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == ']':
+                    return
+                try:
+                    document, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    # Most likely a document split across reads
+                    if eof:
+                        raise
+                else:
+                    yield document
+                    position = end
+                    continue
+            elif eof:
+                raise ValueError("Document checkpoint ends before the closing bracket")
+
+            chunk = f.read(CHECKPOINT_READ_CHARS)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+    @staticmethod
+    def _replay(documents: Dict[str, Dict[str, Any]], record: Dict[str, Any]):
+        """
+        Apply a log record to documents keyed by id
+
+        Args:
+            documents: Documents by classification_id, updated in place
+            record: Log record
+        """
+        if record['op'] == 'add':
+            document = record['document']
+            documents.setdefault(document['classification_id'], {}).update(document)
+        elif record['op'] == 'update':
+            for classification_id in record['ids']:
+                if classification_id in documents:
+                    documents[classification_id].update(record['updates'])
+
+    def fingerprint(self) -> str:
+        """
+        Identify the files as they were last loaded or written, the same
+        in every process that reads the same files
+
+        Returns:
+            Short hex digest of the files' modification times and sizes
+        """
+        with self._write_lock:
+            return hashlib.sha1(repr(self._signature).encode('utf-8')).hexdigest()[:12]
+
+    def changed_externally(self) -> bool:
+        """
+        Check whether the files were changed by someone else since they were
+        last loaded or written; always False while changes are being committed
+
+        Returns:
+            True if the documents should be loaded again
+        """
+        with self._condition:
+            if self._appended != self._committed:
+                return False
+        with self._write_lock:
+            return self._get_signature() != self._signature
+
+    def append(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Queue log records for the next commit without waiting for it
+
+        Records are encoded here, so a record that cannot be serialized
+        raises in the caller (TypeError or ValueError) before anything is
+        queued.
+
+        Args:
+            records: Log records, applied in order
+
+        Returns:
+            Sequence number to pass to wait
+        """
+        lines = [json.dumps(record, separators=(',', ':')) + '\n' for record in records]
+        with self._condition:
+            self._queue.extend(lines)
+            self._appended += len(records)
+            self._ensure_started()
+            self._condition.notify_all()
+            return self._appended
+
+    def add(self, document: Dict[str, Any]) -> int:
+        """
+        Queue a new document
+
+        Args:
+            document: Document metadata
+
+        Returns:
+            Sequence number to pass to wait
+        """
+        return self.append([{"op": "add", "document": document}])
+
+    def update(self, classification_ids: List[str], updates: Dict[str, Any]) -> int:
+        """
+        Queue field updates of documents
+
+        Args:
+            classification_ids: Identifiers of the documents
+            updates: Field values to set on each of them
+
+        Returns:
+            Sequence number to pass to wait
+        """
+        return self.append([{"op": "update", "ids": list(classification_ids), "updates": updates}])
+
+    @property
+    def last_sequence(self) -> int:
+        """
+        Sequence number of the most recently queued record
+        """
+        with self._condition:
+            return self._appended
+
+    def wait(self, sequence: int, timeout: Optional[float] = None):
+        """
+        Block until the records up to a sequence number are durable
+
+        Args:
+            sequence: Value returned by append
+            timeout: Seconds to wait at most; commit_timeout if None
+
+        Raises:
+            DocumentStoreError: If the batch holding the sequence could not
+                be written, or was not written within the timeout
+        """
+        timeout = self.commit_timeout if timeout is None else timeout
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._committed >= sequence, timeout):
+                raise DocumentStoreError(f"Document changes not committed within {timeout:g}s")
+            for first, last, error in self._failures:
+                if first <= sequence <= last:
+                    raise DocumentStoreError(f"Document changes could not be stored: {error}")
+
+    def request_checkpoint(self):
+        """
+        Ask the writer to replace the checkpoint with a fresh snapshot, e.g.
+        after documents were migrated in memory
+        """
+        with self._condition:
+            self._checkpoint_requested = True
+            self._ensure_started()
+            self._condition.notify_all()
+
+    def _ensure_started(self):
+        """
+        Start the writer thread on first use; the caller holds the condition
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='document-store-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """
+        Writer loop: commit queued records in batches
+        """
+        while True:
+            with self._condition:
+                # Changes held only in memory are retried even when nothing new arrives
+                self._condition.wait_for(
+                    lambda: self._queue or self._checkpoint_requested,
+                    CHECKPOINT_RETRY_SECONDS if self._checkpoint_due else None
+                )
+                # Give concurrent writers a moment to join the batch
+                deadline = time.monotonic() + self.commit_latency
+                while self._queue and len(self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._condition.wait(remaining):
+                        break
+                batch = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+                checkpoint = self._checkpoint_requested or self._checkpoint_due
+                self._checkpoint_requested = False
+                first = self._committed + 1
+                committed = self._committed + len(batch)
+
+            error = None
+            try:
+                if batch:
+                    self._commit(batch)
+            except Exception as e:
+                self.logger.error(f"Error committing {len(batch)} document records: {str(e)}")
+                error = str(e)
+                # The log was rolled back; a snapshot captures the batch instead
+                checkpoint = True
+
+            if checkpoint or self._wal_size() >= self.checkpoint_bytes:
+                try:
+                    self._checkpoint()
+                    self._checkpoint_due = False
+                    error = None
+                except Exception as e:
+                    self.logger.error(f"Error writing document checkpoint: {str(e)}")
+                    self._checkpoint_due = True
+
+            with self._condition:
+                if error is not None and batch:
+                    self._failures.append((first, committed, error))
+                self._committed = committed
+                self._condition.notify_all()
+
+    def _commit(self, batch: List[str]):
+        """
+        Append a batch to the log and fsync it once
+
+        Args:
+            batch: Encoded log lines
+
+        Raises:
+            OSError: If the batch could not be made durable; the log is
+                rolled back to its previous size
+        """
+        with self._write_lock:
+            offset = self._wal_size()
+            try:
+                with open(self.wal_path, 'a') as f:
+                    f.write(''.join(batch))
+                    f.flush()
+                    os.fsync(f.fileno())
+                if offset == 0:
+                    self._fsync_directory()
+            except OSError:
+                # Cut off a partial write so later records are not lost behind it
+                try:
+                    with open(self.wal_path, 'a') as f:
+                        f.truncate(offset)
+                except OSError:
+                    pass
+                raise
+            finally:
+                self._signature = self._get_signature()
+
+    def _checkpoint(self):
+        """
+        Replace the checkpoint with a snapshot of all documents and empty the log
+
+        Raises:
+            DocumentStoreError: If no snapshot source is set
+            Exception: Any error taking or writing the snapshot; the old
+                checkpoint and log are left in place
+        """
+        if self.snapshot is None:
+            raise DocumentStoreError("No snapshot source for the checkpoint")
+        # Taken before the write lock: the owner's lock is never acquired
+        # while files are being written
+        documents = self.snapshot()
+        with self._write_lock:
+            try:
+                self._write_checkpoint(documents)
+                # Every logged record is part of the snapshot now
+                with open(self.wal_path, 'w') as f:
+                    os.fsync(f.fileno())
+            finally:
+                self._signature = self._get_signature()
+
+    def _write_checkpoint(self, documents: Iterable[Dict[str, Any]]):
+        """
+        Atomically write the checkpoint file, then its index
+
+        Args:
+            documents: Documents to store
+        """
+        temp_path = f"{self.storage_path}.tmp"
+        columns = {field: [] for field in self.index_fields}
+        offsets = []
+        lengths = []
+        try:
+            with open(temp_path, 'wb') as f:
+                # One document per line, encoded record by record rather
+                # than materializing the whole list
+                f.write(b'[')
+                offset = 1
+                for position, document in enumerate(documents):
+                    separator = b',\n' if position else b'\n'
+                    encoded = json.dumps(document).encode('utf-8')
+                    f.write(separator)
+                    f.write(encoded)
+                    offsets.append(offset + len(separator))
+                    lengths.append(len(encoded))
+                    offset += len(separator) + len(encoded)
+                    for field, values in columns.items():
+                        values.append(document.get(field))
+                f.write(b'\n]\n')
+                f.flush()
+                os.fsync(f.fileno())
+                stat = os.fstat(f.fileno())
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        os.replace(temp_path, self.storage_path)
+        self._fsync_directory()
+
+        if self.index_fields:
+            self._write_index(stat, columns, offsets, lengths)
+
+    def _write_index(self, stat: os.stat_result, columns: Dict[str, List[Any]],
+                     offsets: List[int], lengths: List[int]):
+        """
+        Write the checkpoint index; it is only used while the checkpoint's
+        size and modification time match those recorded, so a stale or
+        missing index just falls back to parsing the checkpoint
+
+        Args:
+            stat: Status of the checkpoint file as written
+            columns: Indexed field values by field, in document order
+            offsets: Byte offset of each document in the checkpoint
+            lengths: Byte length of each document
+        """
+        temp_path = f"{self.index_path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({
+                    "checkpoint": [stat.st_size, stat.st_mtime_ns],
+                    "fields": columns,
+                    "offsets": offsets,
+                    "lengths": lengths
+                }, f, separators=(',', ':'))
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write the document checkpoint index: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _wal_size(self) -> int:
+        try:
+            return os.path.getsize(self.wal_path)
+        except OSError:
+            return 0
+
+    def _fsync_directory(self):
+        """
+        Make a rename or file creation in the store's folder durable
+        """
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.storage_path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator
+
+try:
+    import orjson
+except ImportError:
+    # Optional speedup; the standard library encoder is used otherwise
+    orjson = None
+
+# Columns written by the CSV export, in order
+CSV_FIELDS = [
+    'classification_id',
+    'filename',
+    'schema_id',
+    'processed_at',
+    'confidence',
+    'filepath'
+]
+
+# Rows buffered per chunk written to the response
+ROWS_PER_CHUNK = 200
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Serialize a value to compact JSON bytes, using orjson when installed
+
+    Args:
+        value: JSON-serializable value
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def export_record(document: Dict[str, Any], include_content: bool = False) -> Dict[str, Any]:
+    """
+    Select the fields of a stored document that are exported
+
+    Args:
+        document: Stored document
+        include_content: Whether to include the extracted text
+
+    Returns:
+        Document without its parsed content unless requested
+    """
+    if include_content:
+        return document
+    return {key: value for key, value in document.items() if key != 'parsed_content'}
+
+
+def iter_ndjson(documents: Iterable[Dict[str, Any]], include_content: bool = False) -> Iterator[bytes]:
+    """
+    Encode documents as newline-delimited JSON, one chunk at a time
+
+    Args:
+        documents: Iterable of stored documents
+        include_content: Whether to include the extracted text
+
+    Yields:
+        Chunks of NDJSON bytes
+    """
+    chunk = []
+    for document in documents:
+        chunk.append(dumps(export_record(document, include_content)))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield b'\n'.join(chunk) + b'\n'
+            chunk = []
+    if chunk:
+        yield b'\n'.join(chunk) + b'\n'
+
+
+def iter_csv(documents: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Encode document metadata as CSV, one chunk at a time
+
+    Args:
+        documents: Iterable of stored documents
+
+    Yields:
+        Chunks of CSV text, starting with the header row
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+
+    rows = 0
+    for document in documents:
+        writer.writerow(document)
+        rows += 1
+        if rows % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
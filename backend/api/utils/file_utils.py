@@ -1,6 +1,7 @@
+import hashlib
 import os
 import uuid
-from typing import Set
+from typing import Set, Tuple
 from werkzeug.datastructures import FileStorage
 
 def allowed_file(filename: str, allowed_extensions: Set[str]) -> bool:
@@ -17,26 +18,67 @@ def allowed_file(filename: str, allowed_extensions: Set[str]) -> bool:
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-def save_uploaded_file(file: FileStorage, upload_folder: str) -> str:
+def content_address_path(root_folder: str, digest: str, suffix: str = '') -> str:
     """
-    Save an uploaded file with a unique filename
-    
+    Build the sharded path of a content-addressed file
+
+    Files are spread over two levels of 256 sub-directories taken from the
+    digest, so no single directory grows with the size of the archive.
+
+    Args:
+        root_folder: Root directory of the store
+        digest: Hex SHA-256 digest of the file content
+        suffix: Suffix appended to the digest, e.g. '.pdf'
+
+    Returns:
+        Path of the file inside the sharded layout
+    """
+    return os.path.join(root_folder, digest[:2], digest[2:4], f"{digest}{suffix}")
+
+def stream_to_temp_file(file: FileStorage, upload_folder: str) -> Tuple[str, str]:
+    """
+    Write an uploaded file to a temporary file while hashing it
+
     Args:
         file: FileStorage object to save
-        upload_folder: Directory to save the file in
-        
+        upload_folder: Directory to create the temporary file in
+
     Returns:
-        Path to the saved file
+        Tuple of (temporary file path, hex SHA-256 digest of the content)
     """
     # Ensure upload folder exists
     os.makedirs(upload_folder, exist_ok=True)
-    
-    # Generate a unique filename
-    original_filename = file.filename
-    unique_filename = f"{uuid.uuid4()}_{original_filename}"
-    filepath = os.path.join(upload_folder, unique_filename)
-    
-    # Save the file
-    file.save(filepath)
-    
-    return filepath
\ No newline at end of file
+
+    temp_path = os.path.join(upload_folder, f".{uuid.uuid4()}.tmp")
+    digest = hashlib.sha256()
+    with open(temp_path, 'wb') as temp_file:
+        for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+            digest.update(chunk)
+            temp_file.write(chunk)
+    return temp_path, digest.hexdigest()
+
+def place_content_addressed(temp_path: str, filepath: str) -> bool:
+    """
+    Move a temporary file to its content address, or drop it if identical
+    content is already stored there
+
+    A reused file gets a fresh modification time, so age-based cleanup
+    treats it as just uploaded.
+
+    Args:
+        temp_path: Temporary file holding the content
+        filepath: Content-addressed destination path
+
+    Returns:
+        True if an existing file was reused
+    """
+    try:
+        os.utime(filepath)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        os.replace(temp_path, filepath)
+        return False
+
+    # Identical content already stored
+    os.remove(temp_path)
+    return True
@@ -0,0 +1,371 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Type
+
+import PyPDF2
+
+try:
+    import pypdfium2
+except ImportError:
+    # Optional: fast native extraction through PDFium
+    pypdfium2 = None
+
+try:
+    from pdfminer.converter import PDFPageAggregator
+    from pdfminer.layout import LAParams, LTTextContainer
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+except ImportError:
+    # Optional: slower, but decodes more font encodings
+    PDFPage = None
+
+# Backends tried in this order unless configured otherwise
+DEFAULT_PREFERENCE = ('pypdfium2', 'pypdf2', 'pdfminer')
+
+# Bytes read from the start of a file when sniffing its traits
+TRAIT_SNIFF_BYTES = 1024 * 1024
+
+
+class PdfExtractor(ABC):
+    """
+    Text extraction backend for one open PDF file
+
+    Subclasses open the file in __init__ and extract pages by index.
+    """
+    name = None
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """
+        Whether the library behind this backend is installed
+        """
+        return True
+
+    @property
+    @abstractmethod
+    def page_count(self) -> int:
+        """
+        Number of pages in the file
+        """
+
+    @abstractmethod
+    def extract_page(self, page_index: int) -> str:
+        """
+        Extract the text of one page
+
+        Args:
+            page_index: Zero-based page number
+
+        Returns:
+            Page text
+        """
+
+    @abstractmethod
+    def close(self):
+        """
+        Release the file and any native resources
+        """
+
+
+class PyPDF2Extractor(PdfExtractor):
+    """
+    Pure-Python extraction with PyPDF2
+    """
+    name = 'pypdf2'
+
+    def __init__(self, filepath: str):
+        self._file = open(filepath, 'rb')
+        try:
+            self._reader = PyPDF2.PdfReader(self._file)
+            self._page_count = len(self._reader.pages)
+        except Exception:
+            self._file.close()
+            raise
+
+    @property
+    def page_count(self) -> int:
+        return self._page_count
+
+    def extract_page(self, page_index: int) -> str:
+        return self._reader.pages[page_index].extract_text() or ''
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class PdfiumExtractor(PdfExtractor):
+    """
+    Native extraction with PDFium through pypdfium2
+    """
+    name = 'pypdfium2'
+
+    # PDFium is not thread-safe, so calls into it are serialized process-wide
+    _pdfium_lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return pypdfium2 is not None
+
+    def __init__(self, filepath: str):
+        with self._pdfium_lock:
+            self._document = pypdfium2.PdfDocument(filepath)
+            self._page_count = len(self._document)
+
+    @property
+    def page_count(self) -> int:
+        return self._page_count
+
+    def extract_page(self, page_index: int) -> str:
+        with self._pdfium_lock:
+            page = self._document[page_index]
+            try:
+                text_page = page.get_textpage()
+                try:
+                    return text_page.get_text_range()
+                finally:
+                    text_page.close()
+            finally:
+                page.close()
+
+    def close(self):
+        with self._pdfium_lock:
+            self._document.close()
+
+
+class PdfminerExtractor(PdfExtractor):
+    """
+    Layout-aware extraction with pdfminer.six
+    """
+    name = 'pdfminer'
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return PDFPage is not None
+
+    def __init__(self, filepath: str):
+        self._file = open(filepath, 'rb')
+        try:
+            document = PDFDocument(PDFParser(self._file))
+            self._pages = list(PDFPage.create_pages(document))
+        except Exception:
+            self._file.close()
+            raise
+
+        resource_manager = PDFResourceManager()
+        self._device = PDFPageAggregator(resource_manager, laparams=LAParams())
+        self._interpreter = PDFPageInterpreter(resource_manager, self._device)
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    def extract_page(self, page_index: int) -> str:
+        self._interpreter.process_page(self._pages[page_index])
+        layout = self._device.get_result()
+        return ''.join(
+            element.get_text() for element in layout
+            if isinstance(element, LTTextContainer)
+        )
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+EXTRACTORS: Dict[str, Type[PdfExtractor]] = {
+    extractor.name: extractor
+    for extractor in (PdfiumExtractor, PyPDF2Extractor, PdfminerExtractor)
+}
+
+
+def looks_garbled(text: str) -> bool:
+    """
+    Check whether extracted text is mostly undecoded glyphs, as produced
+    for fonts a backend could not map to Unicode
+
+    Args:
+        text: Extracted page text
+
+    Returns:
+        True if another backend is likely to do better
+    """
+    if not text:
+        return False
+    undecoded = text.count('\ufffd') + text.count('(cid:') * 6
+    return undecoded > len(text) * 0.3
+
+
+class ExtractionStats:
+    """
+    Thread-safe per-backend extraction counters
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _entry(self, name: str) -> Dict[str, float]:
+        return self._stats.setdefault(name, {
+            "documents": 0,
+            "pages": 0,
+            "characters": 0,
+            "seconds": 0.0,
+            "failures": 0,
+            "fallbacks": 0
+        })
+
+    def record_open(self, name: str, seconds: float):
+        with self._lock:
+            entry = self._entry(name)
+            entry["documents"] += 1
+            entry["seconds"] += seconds
+
+    def record_page(self, name: str, characters: int, seconds: float):
+        with self._lock:
+            entry = self._entry(name)
+            entry["pages"] += 1
+            entry["characters"] += characters
+            entry["seconds"] += seconds
+
+    def record_failure(self, name: str, fell_back: bool):
+        with self._lock:
+            entry = self._entry(name)
+            entry["failures"] += 1
+            if fell_back:
+                entry["fallbacks"] += 1
+
+    def drain(self) -> Dict[str, Dict[str, float]]:
+        """
+        Take the raw counters, resetting them
+
+        Returns:
+            Dictionary of backend name to counters
+        """
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            return stats
+
+    def merge(self, stats: Dict[str, Dict[str, float]]):
+        """
+        Add counters drained from another process
+
+        Args:
+            stats: Dictionary of backend name to counters
+        """
+        with self._lock:
+            for name, counters in stats.items():
+                entry = self._entry(name)
+                for key, value in counters.items():
+                    entry[key] += value
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get counters and throughput per backend
+
+        Returns:
+            Dictionary of backend name to counters, pages per second and
+            characters per second
+        """
+        with self._lock:
+            return {
+                name: dict(
+                    entry,
+                    seconds=round(entry["seconds"], 3),
+                    pages_per_second=round(entry["pages"] / entry["seconds"], 1) if entry["seconds"] else None,
+                    characters_per_second=round(entry["characters"] / entry["seconds"]) if entry["seconds"] else None
+                )
+                for name, entry in self._stats.items()
+            }
+
+
+# Shared by every document opened in this process
+extraction_stats = ExtractionStats()
+
+
+class ExtractorPolicy:
+    """
+    Chooses the extraction backends to try for a file, best first
+    """
+    def __init__(self, preference: Optional[Sequence[str]] = None):
+        """
+        Initialize the policy
+
+        Args:
+            preference: Backend names in order of preference; unknown or
+                        uninstalled backends are skipped
+        """
+        preference = preference or DEFAULT_PREFERENCE
+        self.preference = [
+            name for name in preference
+            if name in EXTRACTORS and EXTRACTORS[name].is_available()
+        ]
+        if not self.preference:
+            self.preference = [PyPDF2Extractor.name]
+
+    def sniff_traits(self, filepath: str) -> Dict[str, bool]:
+        """
+        Detect file traits that affect which backend works best
+
+        Args:
+            filepath: Path to the PDF file
+
+        Returns:
+            Dictionary of trait flags
+        """
+        try:
+            with open(filepath, 'rb') as f:
+                head = f.read(TRAIT_SNIFF_BYTES)
+        except OSError:
+            head = b''
+        return {
+            # Composite (CID) fonts, often without a usable Unicode map
+            "cid_fonts": b'/Identity-H' in head or b'/CIDFontType' in head,
+            "encrypted": b'/Encrypt' in head
+        }
+
+    def select(self, filepath: str) -> List[Type[PdfExtractor]]:
+        """
+        Order the backends to try for a file
+
+        Args:
+            filepath: Path to the PDF file
+
+        Returns:
+            Extractor classes, best first
+        """
+        order = list(self.preference)
+        traits = self.sniff_traits(filepath)
+        if traits["cid_fonts"] or traits["encrypted"]:
+            # PyPDF2 handles these worst; keep it as the last resort
+            order.sort(key=lambda name: name == PyPDF2Extractor.name)
+        return [EXTRACTORS[name] for name in order]
+
+
+def open_extractor(candidates: List[Type[PdfExtractor]], filepath: str):
+    """
+    Open a file with the first backend that can read it
+
+    Args:
+        candidates: Extractor classes to try, best first; tried ones are
+                    removed from the list
+        filepath: Path to the PDF file
+
+    Returns:
+        Open PdfExtractor
+    """
+    last_error = None
+    while candidates:
+        extractor_class = candidates.pop(0)
+        started = time.perf_counter()
+        try:
+            extractor = extractor_class(filepath)
+        except Exception as e:
+            extraction_stats.record_failure(extractor_class.name, bool(candidates))
+            last_error = e
+            continue
+        extraction_stats.record_open(extractor_class.name, time.perf_counter() - started)
+        return extractor
+    raise last_error or ValueError("No PDF extraction backend available")
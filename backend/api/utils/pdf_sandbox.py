@@ -0,0 +1,420 @@
+import logging
+import multiprocessing
+import threading
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import PyPDF2
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; the memory limit is then not enforced
+    resource = None
+
+from api.utils.pdf_extractors import ExtractorPolicy, extraction_stats
+from api.utils.pdf_utils import LazyPdfDocument
+
+logger = logging.getLogger(__name__)
+
+
+class ParseLimitExceeded(Exception):
+    """
+    Raised when a PDF exceeds a parsing limit (time, memory, pages or
+    decompressed content), or crashed the process parsing it
+    """
+
+
+# Compressed bytes fed to the decompressor, and decompressed bytes taken
+# from it, at a time while measuring content streams
+MEASURE_CHUNK_BYTES = 64 * 1024
+
+FLATE_FILTERS = ('/FlateDecode', '/Fl')
+
+
+class ContentBudget:
+    """
+    Charges the decompressed size of page content streams against a limit
+    before a page is extracted
+
+    Streams are read with PyPDF2 whichever backend extracts the text, and
+    without decoding them through the library: Flate-compressed streams,
+    including chains of Flate filters, are inflated chunk by chunk and only
+    counted, and measuring stops as soon as the limit is passed, so a
+    decompression bomb is rejected before any backend expands it.
+    Uncompressed streams count their length. Other filters (LZW, RunLength,
+    ASCII85, ...) are rare in content streams; they count their encoded
+    length, and only the worker's memory limit guards their decoding, as it
+    does for files PyPDF2 cannot open.
+    """
+
+    def __init__(self, filepath: str, limit: int):
+        """
+        Open a PDF for measuring
+
+        Args:
+            filepath: Path to the PDF file
+            limit: Decompressed bytes allowed in total (0 for no limit)
+        """
+        self.limit = limit
+        self.used = 0
+        self._file = None
+        self._reader = None
+        if not limit:
+            return
+
+        self._file = open(filepath, 'rb')
+        try:
+            self._reader = PyPDF2.PdfReader(self._file)
+        except Exception as e:
+            logger.warning(f"Cannot measure content streams of {filepath}: {str(e)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._file is not None:
+            self._file.close()
+
+    def charge_page(self, page_index: int):
+        """
+        Add the decompressed size of a page's content streams
+
+        Args:
+            page_index: Zero-based page number
+
+        Raises:
+            ParseLimitExceeded: If the pages measured so far exceed the limit
+        """
+        if self._reader is None or page_index >= len(self._reader.pages):
+            return
+
+        try:
+            contents = self._reader.pages[page_index].get('/Contents')
+            contents = contents.get_object() if contents is not None else []
+            streams = [stream.get_object() for stream in
+                       (contents if isinstance(contents, list) else [contents])]
+        except Exception as e:
+            # Left to the extraction backend, which may read the page
+            logger.warning(f"Cannot measure content streams of page {page_index + 1}: {str(e)}")
+            return
+
+        for stream in streams:
+            self.used += self._stream_size(stream, self.limit - self.used)
+            if self.used > self.limit:
+                raise ParseLimitExceeded(
+                    f"more than {self.limit // 2**20} MiB of decompressed page content"
+                )
+
+    @staticmethod
+    def _stream_size(stream, remaining: int) -> int:
+        """
+        Measure one content stream, stopping once it exceeds remaining
+
+        Args:
+            stream: PyPDF2 stream object
+            remaining: Bytes left in the budget
+
+        Returns:
+            Decompressed size, or a value above remaining
+        """
+        # The encoded bytes as stored in the file
+        data = stream._data or b''
+        filters = stream.get('/Filter')
+        if filters is None:
+            return len(data)
+        filters = list(filters) if isinstance(filters, list) else [filters]
+        if any(name not in FLATE_FILTERS for name in filters):
+            return len(data)
+
+        chunks = (data[offset:offset + MEASURE_CHUNK_BYTES]
+                  for offset in range(0, len(data), MEASURE_CHUNK_BYTES))
+        for _ in filters:
+            chunks = _inflate(chunks)
+
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > remaining:
+                    break
+        except zlib.error:
+            # Corrupt data; extraction fails or stops at the same point
+            pass
+        return size
+
+
+def _inflate(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Decompress a zlib stream incrementally, never producing more than
+    MEASURE_CHUNK_BYTES from one call
+
+    Args:
+        chunks: Compressed data in pieces
+
+    Yields:
+        Decompressed data in pieces
+    """
+    decompressor = zlib.decompressobj()
+    for chunk in chunks:
+        while chunk and not decompressor.eof:
+            output = decompressor.decompress(chunk, MEASURE_CHUNK_BYTES)
+            chunk = decompressor.unconsumed_tail
+            if output:
+                yield output
+        if decompressor.eof:
+            return
+
+
+def _parse_document(filepath: str,
+                    max_chars: Optional[int],
+                    start_page: int,
+                    limits: Dict[str, int],
+                    policy: ExtractorPolicy) -> Dict[str, Any]:
+    """
+    Extract pages of a PDF within the page and decompressed-size limits
+
+    Args:
+        filepath: Path to the PDF file
+        max_chars: Stop once this many characters are covered; None for all pages
+        start_page: Zero-based page to start at
+        limits: Parsing limits
+        policy: Extraction backend policy
+
+    Returns:
+        Parsed content dictionary of the extracted pages
+    """
+    with LazyPdfDocument(filepath, policy.select(filepath)) as document, \
+            ContentBudget(filepath, limits['max_decompressed_bytes']) as budget:
+        max_pages = limits['max_pages']
+        if max_pages and document.total_pages > max_pages:
+            raise ParseLimitExceeded(
+                f"{document.total_pages} pages, more than the limit of {max_pages}"
+            )
+
+        covered = 0
+        pages = []
+        for page_index in range(start_page, document.total_pages):
+            # Measured before extracting, so an oversized page is rejected
+            # before any backend decompresses it
+            budget.charge_page(page_index)
+            page_data = document.get_page(page_index)
+
+            pages.append(page_data)
+            covered += page_data["length"] + 1
+            if max_chars and covered >= max_chars:
+                break
+
+        return document.build_content(pages)
+
+
+def _worker_main(conn, limits: Dict[str, int], extractor_preference: Optional[Sequence[str]]):
+    """
+    Parse PDFs sent over a pipe until told to stop
+
+    Runs in a child process whose address space is capped, so whatever
+    gets past the content budget (e.g. images, fonts, or content streams
+    with filters that are not measured) fails with MemoryError instead of
+    exhausting the host.
+    """
+    if resource is not None and limits['memory_bytes']:
+        resource.setrlimit(resource.RLIMIT_AS, (limits['memory_bytes'], limits['memory_bytes']))
+
+    policy = ExtractorPolicy(extractor_preference)
+    conn.send('ready')
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+
+        filepath, max_chars, start_page = task
+        try:
+            result = ('ok', _parse_document(filepath, max_chars, start_page, limits, policy))
+        except ParseLimitExceeded as e:
+            result = ('limit', str(e))
+        except MemoryError:
+            result = ('limit', f"more than {limits['memory_bytes'] // 2**20} MiB of memory")
+        except RecursionError:
+            result = ('limit', "object tree nested too deeply")
+        except Exception as e:
+            result = ('error', str(e))
+
+        # Extraction counters are collected in the parent process
+        conn.send(result + (extraction_stats.drain(),))
+
+
+class _Worker:
+    """
+    Handle of one parsing process and its end of the pipe
+    """
+    # Seconds a new process may take to import the parser libraries
+    STARTUP_TIMEOUT = 30
+
+    def __init__(self, context, limits: Dict[str, int], extractor_preference):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, limits, extractor_preference),
+            name='pdf-parser',
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+        # Wait for the handshake, so a process that cannot start is not
+        # mistaken for one killed by the document it was given
+        try:
+            ready = self.conn.poll(self.STARTUP_TIMEOUT) and self.conn.recv() == 'ready'
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            self.kill()
+            raise RuntimeError("PDF parser process failed to start")
+
+    def stop(self):
+        """
+        Ask the process to exit after its current task
+        """
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.conn.close()
+
+    def kill(self) -> Optional[int]:
+        """
+        Kill the process immediately
+
+        Returns:
+            Exit code of the process
+        """
+        self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+        return self.process.exitcode
+
+
+class SandboxedPdfParser:
+    """
+    Parses PDFs in recyclable child processes under hard per-document limits
+
+    Each document is parsed by an idle worker process with a capped address
+    space. A worker that exceeds the wall-time limit is killed and replaced,
+    so a file that hangs the parser only costs its own slot; workers are
+    also replaced after a fixed number of documents, releasing whatever
+    memory the parser libraries leaked or fragmented.
+    """
+    def __init__(self,
+                 workers: int = 2,
+                 tasks_per_worker: int = 50,
+                 timeout: float = 30,
+                 memory_limit_mb: int = 1024,
+                 max_pages: int = 1000,
+                 max_decompressed_mb: int = 200,
+                 extractor_preference: Optional[Sequence[str]] = None):
+        """
+        Initialize the parser; worker processes start on first use
+
+        Args:
+            workers: Maximum number of documents parsed concurrently
+            tasks_per_worker: Documents a worker parses before it is replaced
+            timeout: Wall-time limit per parse in seconds
+            memory_limit_mb: Address-space limit of each worker (0 for none)
+            max_pages: Documents with more pages are rejected (0 for no limit)
+            max_decompressed_mb: Limit on decompressed page content streams
+                                 per parse (0 for no limit); see ContentBudget
+            extractor_preference: Extraction backend names in order of preference
+        """
+        self.timeout = timeout
+        self.tasks_per_worker = tasks_per_worker
+        self.limits = {
+            'memory_bytes': memory_limit_mb * 2**20,
+            'max_pages': max_pages,
+            'max_decompressed_bytes': max_decompressed_mb * 2**20
+        }
+        self.extractor_preference = list(extractor_preference) if extractor_preference else None
+
+        # Spawned rather than forked: the server process is multi-threaded
+        self._context = multiprocessing.get_context('spawn')
+        self._slots = threading.BoundedSemaphore(workers)
+        self._idle: List[_Worker] = []
+        self._idle_lock = threading.Lock()
+
+    def _checkout(self) -> _Worker:
+        with self._idle_lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.conn.close()
+        return _Worker(self._context, self.limits, self.extractor_preference)
+
+    def _checkin(self, worker: _Worker):
+        if worker.tasks >= self.tasks_per_worker or not worker.process.is_alive():
+            worker.stop()
+            return
+        with self._idle_lock:
+            self._idle.append(worker)
+
+    def parse(self, filepath: str, max_chars: Optional[int] = None, start_page: int = 0) -> Dict[str, Any]:
+        """
+        Extract the text of a PDF in a worker process
+
+        Args:
+            filepath: Path to the PDF file
+            max_chars: Only extract the leading pages covering this many
+                       characters; None extracts every page
+            start_page: Zero-based page to start at
+
+        Returns:
+            Parsed content dictionary; partial unless every page from
+            start_page on was extracted
+
+        Raises:
+            ParseLimitExceeded: The document exceeded a limit or crashed the worker
+            ValueError: The document could not be parsed
+        """
+        with self._slots:
+            worker = self._checkout()
+            try:
+                try:
+                    worker.conn.send((filepath, max_chars, start_page))
+                    finished = worker.conn.poll(self.timeout)
+                    if finished:
+                        status, payload, stats = worker.conn.recv()
+                except (EOFError, OSError):
+                    exitcode = worker.kill()
+                    worker = None
+                    logger.warning(f"PDF parser process died on {filepath} (exit code {exitcode})")
+                    raise ParseLimitExceeded(f"parser process died (exit code {exitcode})")
+                if not finished:
+                    worker.kill()
+                    worker = None
+                    logger.warning(f"Killed PDF parser process after {self.timeout:g}s on {filepath}")
+                    raise ParseLimitExceeded(f"parsing took longer than {self.timeout:g}s")
+
+                worker.tasks += 1
+                extraction_stats.merge(stats)
+                if status == 'limit':
+                    # The worker may be left in a bad state; replace it
+                    worker.tasks = self.tasks_per_worker
+                    raise ParseLimitExceeded(payload)
+                if status == 'error':
+                    raise ValueError(payload)
+                return payload
+            finally:
+                if worker is not None:
+                    self._checkin(worker)
+
+    def shutdown(self):
+        """
+        Stop the idle worker processes
+        """
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
@@ -0,0 +1,210 @@
+import datetime
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Type
+
+from api.utils.pdf_extractors import (
+    ExtractorPolicy,
+    PdfExtractor,
+    extraction_stats,
+    looks_garbled,
+    open_extractor
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LazyPdfDocument:
+    """
+    PDF document that extracts page text on demand.
+
+    The file is opened once and each page is extracted the first time it is
+    accessed. Extracted text is cached, so a caller that only needs the first
+    pages (e.g. classification) does not pay for the rest, and a later full
+    extraction reuses the pages that were already read.
+
+    Text is extracted by the first backend that can open the file; if it
+    fails on a page or returns undecoded glyphs, the next backend takes over
+    from that page on. The page count is always the one reported by the
+    backend that opened the file.
+    """
+
+    def __init__(self, filepath: str, extractors: Optional[List[Type[PdfExtractor]]] = None):
+        """
+        Open a PDF file for lazy extraction
+
+        Args:
+            filepath: Full path to the PDF file
+            extractors: Optional extraction backends to try, best first;
+                        chosen by the default ExtractorPolicy if omitted
+        """
+        self.filepath = filepath
+        self.parsed_at = datetime.datetime.now().isoformat()
+
+        # Page text cache, indexed by zero-based page number
+        self._page_text: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+        # Backends not tried yet, used as fallbacks
+        self._fallbacks = list(extractors or ExtractorPolicy().select(filepath))
+        self._extractor = open_extractor(self._fallbacks, filepath)
+        self.total_pages = self._extractor.page_count
+        # Every backend that took over, in order; the first opened the file
+        self.extractors_used = [self._extractor.name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the underlying file handle
+        """
+        with self._lock:
+            self._extractor.close()
+
+    @property
+    def is_complete(self) -> bool:
+        """
+        Whether every page has been extracted
+        """
+        return len(self._page_text) == self.total_pages
+
+    def get_page_text(self, page_index: int) -> str:
+        """
+        Get the text of a single page, extracting it on first access
+
+        Args:
+            page_index: Zero-based page number
+
+        Returns:
+            Extracted page text
+        """
+        with self._lock:
+            if page_index not in self._page_text:
+                self._page_text[page_index] = self._extract_page(page_index)
+            return self._page_text[page_index]
+
+    def _extract_page(self, page_index: int) -> str:
+        """
+        Extract a page, switching to the next backend when the current one
+        fails on it or cannot decode its text. Called with the lock held.
+
+        Args:
+            page_index: Zero-based page number
+
+        Returns:
+            Extracted page text
+        """
+        while True:
+            name = self._extractor.name
+            started = time.perf_counter()
+            try:
+                page_text = self._extractor.extract_page(page_index)
+            except Exception as e:
+                if not self._fallbacks:
+                    extraction_stats.record_failure(name, False)
+                    raise
+                extraction_stats.record_failure(name, True)
+                logger.warning(f"{name} failed on page {page_index + 1} of {self.filepath}: {str(e)}")
+                self._switch_extractor()
+                continue
+
+            extraction_stats.record_page(name, len(page_text), time.perf_counter() - started)
+            if self._fallbacks and looks_garbled(page_text):
+                extraction_stats.record_failure(name, True)
+                logger.info(f"{name} could not decode page {page_index + 1} of {self.filepath}, falling back")
+                self._switch_extractor()
+                continue
+            return page_text
+
+    def _switch_extractor(self):
+        """
+        Replace the current backend with the next one that opens the file
+        """
+        self._extractor.close()
+        self._extractor = open_extractor(self._fallbacks, self.filepath)
+        self.extractors_used.append(self._extractor.name)
+
+    def get_page(self, page_index: int) -> Dict[str, Any]:
+        """
+        Get the page data of a single page
+
+        Args:
+            page_index: Zero-based page number
+
+        Returns:
+            Page dictionary with page_number, text and length
+        """
+        page_text = self.get_page_text(page_index)
+        return {
+            "page_number": page_index + 1,
+            "text": page_text,
+            "length": len(page_text)
+        }
+
+    def iter_pages(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield page data in order, extracting each page only when reached
+
+        Yields:
+            Page dictionaries with page_number, text and length
+        """
+        for page_index in range(self.total_pages):
+            yield self.get_page(page_index)
+
+    def preview_content(self, max_chars: int) -> Dict[str, Any]:
+        """
+        Build parsed content containing only the leading pages needed to
+        cover max_chars characters of space-joined text
+
+        Args:
+            max_chars: Number of characters the caller needs
+
+        Returns:
+            Parsed content dictionary with a partial page list
+        """
+        pages = []
+        covered = 0
+        for page_data in self.iter_pages():
+            pages.append(page_data)
+            covered += page_data["length"] + 1
+            if covered >= max_chars:
+                break
+
+        return self.build_content(pages)
+
+    def to_parsed_content(self) -> Dict[str, Any]:
+        """
+        Extract all remaining pages and build the full parsed content
+
+        Returns:
+            Parsed content dictionary with every page
+        """
+        return self.build_content(list(self.iter_pages()))
+
+    def build_content(self, pages) -> Dict[str, Any]:
+        """
+        Wrap a page list in the parsed content structure
+
+        Args:
+            pages: List of page dictionaries
+
+        Returns:
+            Parsed content dictionary
+        """
+        return {
+            "metadata": {
+                "filename": os.path.basename(self.filepath),
+                "parsed_at": self.parsed_at,
+                "total_pages": self.total_pages,
+                "partial": len(pages) < self.total_pages,
+                "extractor": self.extractors_used[0],
+                "extractors": list(self.extractors_used)
+            },
+            "content": pages
+        }
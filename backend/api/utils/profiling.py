@@ -0,0 +1,354 @@
+import cProfile
+import datetime
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+# Extensions of the stored profile formats
+PSTATS_EXTENSION = '.prof'
+COLLAPSED_EXTENSION = '.collapsed'
+
+
+def collapse_stack(frame) -> str:
+    """
+    Encode the stack ending at a frame as a collapsed stack line
+
+    Args:
+        frame: Innermost frame of the stack
+
+    Returns:
+        Frames from the outermost to the innermost, separated by semicolons,
+        in the format read by flamegraph.pl and speedscope
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def format_collapsed(samples: Counter) -> str:
+    """
+    Format sampled stacks as collapsed stack lines
+
+    Args:
+        samples: Number of samples per collapsed stack
+
+    Returns:
+        One "stack count" line per distinct stack, most frequent first
+    """
+    return ''.join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler
+
+    A daemon thread records the stacks of the selected threads every
+    interval. Unlike cProfile it adds no cost to the profiled code itself,
+    sees every thread, and also records where threads are waiting (locks,
+    sockets, sleeps), which is usually where slow requests spend their time.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_ids: Optional[Iterable[int]] = None):
+        """
+        Initialize the sampler
+
+        Args:
+            interval: Seconds between samples
+            thread_ids: Threads to sample; all threads if None
+        """
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start sampling in the background
+        """
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """
+        Stop sampling
+
+        Returns:
+            Number of samples per collapsed stack
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        own_id = threading.get_ident()
+        thread_names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                if thread_id not in thread_names:
+                    thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                # Root each stack at its thread so flame graphs separate them
+                self.samples[f"{thread_names.get(thread_id, thread_id)};{collapse_stack(frame)}"] += 1
+
+
+class RequestProfiler:
+    """
+    Opt-in profiles of selected requests and of time-boxed sampling windows
+
+    Profiles are written to a folder, cProfile runs as pstats files and
+    sampled stacks as collapsed stack files, and only the newest
+    max_profiles files are kept. cProfile is process-wide on recent Python
+    versions, so only one request is profiled with it at a time.
+    """
+    MODES = ('cprofile', 'sample')
+
+    def __init__(self, output_dir: str, max_profiles: int = 100, sample_interval: float = 0.005,
+                 max_window_seconds: float = 60.0):
+        """
+        Initialize the profiler
+
+        Args:
+            output_dir: Folder the profiles are written to
+            max_profiles: Number of profile files kept
+            sample_interval: Seconds between stack samples
+            max_window_seconds: Upper bound on the length of a sampling window
+        """
+        self.output_dir = output_dir
+        self.max_profiles = max_profiles
+        self.sample_interval = sample_interval
+        self.max_window_seconds = max_window_seconds
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._cprofile_lock = threading.Lock()
+        self._window = None
+        self._window_lock = threading.Lock()
+
+    def start_request(self, mode: str, label: str) -> Optional[Dict[str, Any]]:
+        """
+        Start profiling the calling thread's request
+
+        The profile id is assigned here, so it can be sent with the response
+        headers of a request whose body is still being streamed.
+
+        Args:
+            mode: 'cprofile' for deterministic call statistics, 'sample' for
+                  sampled stacks of the request thread
+            label: Description of the request, e.g. "POST /api/upload"
+
+        Returns:
+            Profiling state to pass to finish_request, or None if the
+            request cannot be profiled (another cProfile run is active)
+
+        Raises:
+            ValueError: If mode is not one of MODES
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Profiling mode must be one of {list(self.MODES)}")
+        state = {"mode": mode, "label": label, "profile_id": self._profile_id(label),
+                 "started": time.perf_counter()}
+        if mode == 'sample':
+            state["sampler"] = StackSampler(self.sample_interval, thread_ids=[threading.get_ident()])
+            state["sampler"].start()
+            return state
+
+        if not self._cprofile_lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) owns the profiling hooks
+            self._cprofile_lock.release()
+            return None
+        state["profile"] = profile
+        return state
+
+    def stop_request(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Stop profiling a request without storing the profile yet
+
+        Must be called on the thread that started the profiling; the
+        profile can then be stored from any thread.
+
+        Args:
+            state: Value returned by start_request
+
+        Returns:
+            State to pass to store_request
+        """
+        state["duration_ms"] = round((time.perf_counter() - state["started"]) * 1000, 1)
+        if state["mode"] == 'sample':
+            state["samples"] = state["sampler"].stop()
+        else:
+            try:
+                state["profile"].disable()
+            finally:
+                self._cprofile_lock.release()
+        return state
+
+    def store_request(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Write a stopped request's profile
+
+        Args:
+            state: Value returned by stop_request
+
+        Returns:
+            Metadata of the stored profile
+        """
+        if state["mode"] == 'sample':
+            info = self._write_collapsed(state["label"], state["samples"], state["profile_id"])
+        else:
+            info = self._write(state["label"], PSTATS_EXTENSION, state["profile"].dump_stats, state["profile_id"])
+        return dict(info, duration_ms=state["duration_ms"])
+
+    def finish_request(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Stop profiling a request and store its profile
+
+        Args:
+            state: Value returned by start_request
+
+        Returns:
+            Metadata of the stored profile
+        """
+        return self.store_request(self.stop_request(state))
+
+    def start_window(self, seconds: float, interval: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Sample every thread of the process for a limited time
+
+        Args:
+            seconds: Length of the window, capped at max_window_seconds
+            interval: Seconds between samples; the default interval if None
+
+        Returns:
+            Status of the started window, or None if one is already running
+        """
+        seconds = max(0.1, min(float(seconds), self.max_window_seconds))
+        with self._window_lock:
+            if self._window is not None:
+                return None
+            sampler = StackSampler(interval or self.sample_interval)
+            self._window = {
+                "started_at": datetime.datetime.now().isoformat(),
+                "seconds": seconds,
+                "interval_ms": round(sampler.interval * 1000, 3),
+                "sampler": sampler
+            }
+            sampler.start()
+            timer = threading.Timer(seconds, self._finish_window)
+            timer.daemon = True
+            timer.start()
+            return self.window_status()
+
+    def _finish_window(self):
+        """
+        Stop the running sampling window and store its stacks
+        """
+        with self._window_lock:
+            window, self._window = self._window, None
+        if window is not None:
+            self._write_collapsed(f"window {window['seconds']:g}s", window["sampler"].stop())
+
+    def window_status(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the running sampling window
+
+        Returns:
+            Start time, length and interval of the window, or None
+        """
+        window = self._window
+        if window is None:
+            return None
+        return {key: value for key, value in window.items() if key != "sampler"}
+
+    def _write_collapsed(self, label: str, samples: Counter, profile_id: Optional[str] = None) -> Dict[str, Any]:
+        def write(path):
+            with open(path, 'w') as f:
+                f.write(format_collapsed(samples))
+        return dict(self._write(label, COLLAPSED_EXTENSION, write, profile_id), samples=sum(samples.values()))
+
+    @staticmethod
+    def _profile_id(label: str) -> str:
+        timestamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', label).strip('-')[:60]
+        return f"{timestamp}-{slug}-{uuid.uuid4().hex[:8]}"
+
+    def _write(self, label: str, extension: str, write, profile_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store a profile file and drop the oldest files over the limit
+
+        Args:
+            label: Description of the profiled work
+            extension: File extension of the profile format
+            write: Callable writing the profile to a path
+            profile_id: Id assigned when the profiling started; a new one if None
+
+        Returns:
+            Metadata of the stored profile
+        """
+        profile_id = profile_id or self._profile_id(label)
+        path = os.path.join(self.output_dir, profile_id + extension)
+        write(path)
+        self._prune()
+        return {"profile_id": profile_id, "format": extension.lstrip('.'), "label": label}
+
+    def _prune(self):
+        profiles = self.list_profiles()
+        for profile in profiles[self.max_profiles:]:
+            try:
+                os.remove(profile["path"])
+            except OSError:
+                pass
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """
+        List the stored profiles, newest first
+
+        Returns:
+            List of profile metadata
+        """
+        entries = []
+        for entry in os.scandir(self.output_dir):
+            if os.path.splitext(entry.name)[1] in (PSTATS_EXTENSION, COLLAPSED_EXTENSION):
+                entries.append((entry, entry.stat()))
+        entries.sort(key=lambda item: item[1].st_mtime, reverse=True)
+
+        profiles = []
+        for entry, stat in entries:
+            profile_id, extension = os.path.splitext(entry.name)
+            profiles.append({
+                "profile_id": profile_id,
+                "format": extension.lstrip('.'),
+                "size": stat.st_size,
+                "created_at": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                "path": entry.path
+            })
+        return profiles
+
+    def get_profile_path(self, profile_id: str) -> Optional[str]:
+        """
+        Get the file of a stored profile
+
+        Args:
+            profile_id: Identifier of the profile
+
+        Returns:
+            Path of the profile file, or None if it does not exist
+        """
+        for profile in self.list_profiles():
+            if profile["profile_id"] == profile_id:
+                return profile["path"]
+        return None
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Spaces calls evenly to stay under a number of calls per minute
+
+    Each caller reserves the next free slot and then waits for it, so
+    threads and coroutines can share one limiter: a coroutine waits with
+    asyncio.sleep and does not hold up the rest of its event loop.
+    """
+
+    def __init__(self, max_per_minute: float):
+        """
+        Initialize the limiter
+
+        Args:
+            max_per_minute: Calls allowed per minute; 0 or less for no limit
+        """
+        self.max_per_minute = max_per_minute
+        self._min_interval = 60.0 / max_per_minute if max_per_minute > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Claim the next slot
+
+        Returns:
+            Seconds to wait before making the call
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_at)
+            self._next_at = slot + self._min_interval
+            return slot - now
+
+    def wait(self):
+        """
+        Block the calling thread until its slot
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        """
+        Wait for a slot without blocking the event loop
+        """
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
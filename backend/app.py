@@ -1,7 +1,9 @@
-from flask import Flask, jsonify
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
 from config import Config
 from api import register_blueprints
+from api.services.container import ServiceContainer
+import threading
 import traceback
 import sys
 
@@ -18,14 +20,98 @@ def create_app(config_class=Config):
     # Load configuration
     app.config.from_object(config_class)
     
+    # Create required folders
+    config_class.init_app(app)
+    
     # Enable CORS
     CORS(app, resources={r"/api/*": {"origins": "*"}})
     
+    # Services are built lazily on first use and shared by all blueprints
+    services = ServiceContainer(app.config)
+    app.extensions['services'] = services
+    
     # Register blueprints
     register_blueprints(app)
     
+    if app.config.get('WARM_UP_ON_START'):
+        register_warm_up(app, services)
+    
+    if app.config.get('PROFILING_ENABLED'):
+        register_profiling(app, services)
+    
     return app
 
+def register_profiling(app, services):
+    """
+    Profile requests that ask for it with an X-Profile header or a profile
+    query parameter ("cprofile" or "sample"); the id of the stored profile
+    is returned in the X-Profile-Id header. Streamed responses are profiled
+    until their body has been sent.
+    
+    :param app: Flask application instance
+    :param services: Service container providing the profiler
+    """
+    token = app.config.get('PROFILING_TOKEN')
+    
+    @app.before_request
+    def start_profiling():
+        mode = request.headers.get('X-Profile') or request.args.get('profile')
+        if not mode:
+            return
+        if token and request.headers.get('X-Profile-Token') != token:
+            return
+        if mode not in services.profiler.MODES:
+            return jsonify({"error": f"Profiling mode must be one of {list(services.profiler.MODES)}"}), 400
+        g.profiling = services.profiler.start_request(mode, f"{request.method} {request.path}")
+        g.profiling_requested = True
+    
+    @app.after_request
+    def finish_profiling(response):
+        state = g.pop('profiling', None)
+        if state is not None:
+            response.headers['X-Profile-Id'] = state['profile_id']
+            if response.is_streamed:
+                # The body is generated while the server sends it
+                response.call_on_close(lambda: services.profiler.finish_request(state))
+            else:
+                services.profiler.finish_request(state)
+        elif g.pop('profiling_requested', False):
+            # Another request holds the profiler
+            response.headers['X-Profile-Id'] = 'busy'
+        return response
+    
+    @app.teardown_request
+    def abandon_profiling(error=None):
+        # Requests that ended without a response still release the profiler
+        state = g.pop('profiling', None)
+        if state is not None:
+            services.profiler.finish_request(state)
+
+def register_warm_up(app, services):
+    """
+    Warm up the services in a background thread once the app starts
+    accepting requests.
+    
+    :param app: Flask application instance
+    :param services: Service container to warm up
+    """
+    warm_up_started = threading.Event()
+    warm_up_lock = threading.Lock()
+    
+    @app.before_request
+    def start_warm_up():
+        if warm_up_started.is_set():
+            return
+        with warm_up_lock:
+            if warm_up_started.is_set():
+                return
+            warm_up_started.set()
+        threading.Thread(
+            target=services.warm_up,
+            name='service-warm-up',
+            daemon=True
+        ).start()
+
 # Create app instance for use with WSGI servers or development
 app = create_app()
 
@@ -6,9 +6,87 @@ class Config:
     DOCUMENTS_FOLDER = os.path.join(os.path.dirname(__file__), '_documents')
     ALLOWED_EXTENSIONS = {'pdf'}
 
-    # Ensure required folders exist
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-    os.makedirs(DOCUMENTS_FOLDER, exist_ok=True)
+    # Upload storage lifecycle
+    UPLOAD_ARCHIVE_FOLDER = os.environ.get(
+        'UPLOAD_ARCHIVE_FOLDER',
+        os.path.join(os.path.dirname(__file__), '_archive')
+    )
+    # Compress originals into the archive once their text has been extracted
+    UPLOAD_ARCHIVE_AFTER_EXTRACTION = os.environ.get('UPLOAD_ARCHIVE_AFTER_EXTRACTION', 'true').lower() == 'true'
+    # Delete archived originals after this many days (0 keeps them forever)
+    UPLOAD_RETENTION_DAYS = int(os.environ.get('UPLOAD_RETENTION_DAYS', '0'))
+    # Unreferenced files younger than this are left alone (in-flight uploads)
+    UPLOAD_GC_GRACE_SECONDS = int(os.environ.get('UPLOAD_GC_GRACE_SECONDS', '3600'))
+    # How often retention and garbage collection run in the background
+    UPLOAD_MAINTENANCE_INTERVAL = int(os.environ.get('UPLOAD_MAINTENANCE_INTERVAL', '3600'))
+
+    # Reuse the classification of an already classified document whose text
+    # is at least this similar (estimated Jaccard similarity of word shingles)
+    NEAR_DUPLICATE_DETECTION = os.environ.get('NEAR_DUPLICATE_DETECTION', 'true').lower() == 'true'
+    NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', '0.8'))
+
+    # PDF text extraction backends in order of preference, comma separated.
+    # Backends whose library is not installed are skipped; the rest serve as
+    # fallbacks when the preferred one fails on a document
+    PDF_EXTRACTORS = [
+        name.strip()
+        for name in os.environ.get('PDF_EXTRACTORS', 'pypdfium2,pypdf2,pdfminer').split(',')
+        if name.strip()
+    ]
+
+    # Parse PDFs in recyclable worker processes under per-document limits;
+    # files exceeding them are moved to the quarantine folder and rejected
+    # when uploaded again
+    PARSE_IN_WORKERS = os.environ.get('PARSE_IN_WORKERS', 'true').lower() == 'true'
+    PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', '2'))
+    PARSE_TASKS_PER_WORKER = int(os.environ.get('PARSE_TASKS_PER_WORKER', '50'))
+    PARSE_TIMEOUT_SECONDS = float(os.environ.get('PARSE_TIMEOUT_SECONDS', '30'))
+    PARSE_MEMORY_LIMIT_MB = int(os.environ.get('PARSE_MEMORY_LIMIT_MB', '1024'))
+    PARSE_MAX_PAGES = int(os.environ.get('PARSE_MAX_PAGES', '1000'))
+    PARSE_MAX_DECOMPRESSED_MB = int(os.environ.get('PARSE_MAX_DECOMPRESSED_MB', '200'))
+    QUARANTINE_FOLDER = os.environ.get(
+        'QUARANTINE_FOLDER',
+        os.path.join(os.path.dirname(__file__), '_quarantine')
+    )
+
+    # Run background classifications as coroutines on an event loop, so many
+    # documents can wait on the LLM without a thread each; blocking steps
+    # (content loading, near-duplicate index, store updates) use its executor
+    ASYNC_CLASSIFICATION = os.environ.get('ASYNC_CLASSIFICATION', 'true').lower() == 'true'
+    ASYNC_EXECUTOR_WORKERS = int(os.environ.get('ASYNC_EXECUTOR_WORKERS', '4'))
+
+    # Document metadata is committed by a single writer: changes arriving
+    # within the commit latency share one fsync of the write-ahead log, which
+    # is folded into the checkpoint file once it reaches the checkpoint size
+    DOCUMENT_COMMIT_LATENCY_MS = float(os.environ.get('DOCUMENT_COMMIT_LATENCY_MS', '2'))
+    DOCUMENT_CHECKPOINT_MB = float(os.environ.get('DOCUMENT_CHECKPOINT_MB', '4'))
+    # Writers waiting longer than this for their commit get an error
+    DOCUMENT_COMMIT_TIMEOUT_SECONDS = float(os.environ.get('DOCUMENT_COMMIT_TIMEOUT_SECONDS', '30'))
+
+    # Recent server-sent events kept for clients that reconnect
+    EVENT_BUFFER_SIZE = int(os.environ.get('EVENT_BUFFER_SIZE', '1000'))
+    # Each open event stream holds a server thread (flask run starts one
+    # per connection), so concurrent streams are capped; browsers share one
+    # stream per tab. 0 disables the cap
+    EVENT_MAX_STREAMS = int(os.environ.get('EVENT_MAX_STREAMS', '20'))
+
+    # Opt-in profiling: requests sent with an "X-Profile: cprofile|sample"
+    # header (or ?profile=...) are profiled, and /api/admin/profiles starts
+    # time-boxed sampling windows. With PROFILING_TOKEN set, the
+    # X-Profile-Token header must match. Disabled, no hook is installed
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+    PROFILE_FOLDER = os.environ.get(
+        'PROFILE_FOLDER',
+        os.path.join(os.path.dirname(__file__), '_profiles')
+    )
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '100'))
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+    PROFILE_MAX_WINDOW_SECONDS = float(os.environ.get('PROFILE_MAX_WINDOW_SECONDS', '60'))
+
+    # Build services and load the document store in the background once
+    # the first request arrives, instead of on that request's critical path
+    WARM_UP_ON_START = os.environ.get('WARM_UP_ON_START', 'true').lower() == 'true'
 
     # Configure maximum file upload size (16MB)
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
@@ -16,4 +94,18 @@ class Config:
     # CORS configuration
     CORS_ORIGINS = '*'  # In production, replace with specific origins
     CORS_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS']
-    CORS_HEADERS = ['Content-Type', 'Authorization']
\ No newline at end of file
+    CORS_HEADERS = ['Content-Type', 'Authorization']
+
+    @staticmethod
+    def init_app(app):
+        """
+        Prepare the filesystem for an application; done at app creation
+        rather than at import so importing the config has no side effects.
+
+        :param app: Flask application instance
+        """
+        # Ensure required folders exist
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        os.makedirs(app.config['DOCUMENTS_FOLDER'], exist_ok=True)
+        os.makedirs(app.config['UPLOAD_ARCHIVE_FOLDER'], exist_ok=True)
+        os.makedirs(app.config['QUARANTINE_FOLDER'], exist_ok=True)
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
-import { ReportData, ReportDocument } from '../types/report.types';
+import { ReportData, ReportDelta, ReportDocument } from '../types/report.types';
+import useServerEvents, { applyReportDelta } from '../hooks/useServerEvents';
 import DashboardOverview from './DashboardOverview';
 import DocumentChart from './DocumentChart';
 import FileUpload from './FileUpload';
@@ -34,12 +35,19 @@ const Dashboard = (props: DashboardProps): JSX.Element => {
     fetchReportData();
   }, []);
 
+  // Keep the report current from pushed deltas instead of refetching it
+  useServerEvents({
+    'report.delta': (delta: ReportDelta) => {
+      setReportData((current: ReportData | null) => current ? applyReportDelta(current, delta) : current);
+    },
+    resync: () => {
+      fetchReportData();
+    }
+  });
+
   const handleUploadSuccess = (document: ReportDocument) => {
     setRecentlyUploadedDoc(document);
     setShowUploadResult(true);
-    
-    // Reload the entire report data
-    fetchReportData();
   };
 
   const handleReturnToDashboard = () => {
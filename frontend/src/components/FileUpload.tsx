@@ -1,5 +1,17 @@
-import React, { useState } from 'react';
+import React, { useState, useRef } from 'react';
 import axios from 'axios';
+import { DocumentStageEvent, ReportDocument } from '../types/report.types';
+import useServerEvents from '../hooks/useServerEvents';
+
+// Schema of documents whose classification has not finished yet
+const PENDING_SCHEMA_ID = 'pending';
+
+const STAGE_LABELS: Record<string, string> = {
+  saved: 'Saved',
+  parsed: 'Text extracted',
+  classified: 'Classified',
+  stored: 'Stored'
+};
 
 interface FileUploadProps {
   onUploadSuccess?: (document: any) => void;
@@ -10,6 +22,44 @@ const FileUpload = (props: FileUploadProps): JSX.Element => {
   const [uploading, setUploading] = useState(false as boolean);
   const [error, setError] = useState(null as string | null);
   const [success, setSuccess] = useState(null as string | null);
+  // Document uploaded but still waiting for its classification
+  const [pendingId, setPendingId] = useState(null as string | null);
+  const [stage, setStage] = useState(null as string | null);
+
+  // Documents stored while the upload request was still in flight, so a
+  // classification that finishes before the response is not missed
+  const storedRef = useRef({} as Record<string, ReportDocument>);
+
+  const completeUpload = (document: ReportDocument): void => {
+    setPendingId(null);
+    setStage(null);
+    setSuccess('File uploaded and classified successfully!');
+    setFile(null);
+    
+    // If a callback was provided for successful uploads, call it with the document data
+    if (props.onUploadSuccess) {
+      props.onUploadSuccess(document);
+    }
+  };
+
+  useServerEvents({
+    'document.stage': (event: DocumentStageEvent) => {
+      if (event.stage === 'stored' && event.document && event.document.schema_id !== PENDING_SCHEMA_ID) {
+        storedRef.current[event.classification_id] = event.document;
+        const storedIds = Object.keys(storedRef.current);
+        if (storedIds.length > 50) {
+          delete storedRef.current[storedIds[0]];
+        }
+      }
+      if (event.classification_id !== pendingId) {
+        return;
+      }
+      setStage(event.stage);
+      if (storedRef.current[pendingId]) {
+        completeUpload(storedRef.current[pendingId]);
+      }
+    }
+  });
 
   const handleFileChange = (e: { target: { files: FileList | null } }): void => {
     if (e.target.files && e.target.files.length > 0) {
@@ -36,9 +86,13 @@ const FileUpload = (props: FileUploadProps): JSX.Element => {
     setUploading(true);
     setError(null);
     setSuccess(null);
+    setStage(null);
 
     const formData = new FormData();
     formData.append('file', file);
+    // Return once the file is saved and parsed; classification progress
+    // arrives as server-sent events instead of holding the request open
+    formData.append('mode', 'fast');
 
     try {
       const response = await axios.post(
@@ -51,12 +105,18 @@ const FileUpload = (props: FileUploadProps): JSX.Element => {
         }
       );
       
-      setSuccess('File uploaded successfully!');
-      setFile(null);
-      
-      // If a callback was provided for successful uploads, call it with the document data
-      if (props.onUploadSuccess && response.data.document) {
-        props.onUploadSuccess(response.data.document);
+      const document = response.data.document;
+      if (document && document.schema_id === PENDING_SCHEMA_ID) {
+        const stored = storedRef.current[document.classification_id];
+        if (stored) {
+          completeUpload(stored);
+        } else {
+          setPendingId(document.classification_id);
+          setStage('parsed');
+          setSuccess('File uploaded, classifying...');
+        }
+      } else if (document) {
+        completeUpload(document);
       }
       
     } catch (err: any) {
@@ -117,6 +177,16 @@ const FileUpload = (props: FileUploadProps): JSX.Element => {
             </div>
           )}
           
+          {pendingId && stage && (
+            <div className="stage-progress" style={{ fontSize: '0.9em', color: '#666', marginTop: '10px' }}>
+              {Object.keys(STAGE_LABELS).map(name => (
+                <span key={name} style={{ marginRight: '12px', fontWeight: name === stage ? 'bold' : 'normal' }}>
+                  {STAGE_LABELS[name]}
+                </span>
+              ))}
+            </div>
+          )}
+          
           {success && (
             <div className="success-message" style={{ color: '#5cb85c', marginTop: '10px' }}>
               {success}
@@ -1,7 +1,8 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import axios from 'axios';
-import { ReportData, SchemaReportData, ReportDocument } from '../types/report.types';
+import { ReportData, SchemaReportData, ReportDelta, ReportDocument } from '../types/report.types';
+import useServerEvents, { applyReportDelta } from '../hooks/useServerEvents';
 
 type ReportDataType = ReportData | SchemaReportData;
 
@@ -17,26 +18,36 @@ const ReportList = (props: ReportListProps): JSX.Element => {
   const [loading, setLoading] = useState(true as boolean);
   const [error, setError] = useState(null as string | null);
   const [selectedSchema, setSelectedSchema] = useState('all' as string);
-  useEffect(() => {
-    const fetchData = async (): Promise<void> => {
-      try {
-        const url = selectedSchema === 'all' 
-          ? `/api/reports`
-          : `/api/reports/${selectedSchema}`;
-          
-        const response = await axios.get<ReportDataType>(url);
-        setReportData(response.data);
-        setLoading(false);
-      } catch (err) {
-        setError('Failed to fetch report data');
-        setLoading(false);
-        console.error(err);
-      }
-    };
+  const fetchData = async (): Promise<void> => {
+    try {
+      const url = selectedSchema === 'all' 
+        ? `/api/reports`
+        : `/api/reports/${selectedSchema}`;
+        
+      const response = await axios.get<ReportDataType>(url);
+      setReportData(response.data);
+      setLoading(false);
+    } catch (err) {
+      setError('Failed to fetch report data');
+      setLoading(false);
+      console.error(err);
+    }
+  };
 
+  useEffect(() => {
     fetchData();
   }, [selectedSchema]);
 
+  // Apply pushed deltas to the report shown; refetch only after missed events
+  useServerEvents({
+    'report.delta': (delta: ReportDelta) => {
+      setReportData((current: ReportDataType | null) => current ? applyReportDelta(current, delta) : current);
+    },
+    resync: () => {
+      fetchData();
+    }
+  });
+
   if (loading) return <div>Loading reports...</div>;
   if (error) return <div>Error: {error}</div>;
   if (!reportData) return <div>No data available</div>;
@@ -67,7 +78,7 @@ const ReportList = (props: ReportListProps): JSX.Element => {
             &nbsp; | &nbsp;
             <select 
               value={selectedSchema} 
-              onChange={(e) => setSelectedSchema(e.target.value)}
+              onChange={(e: { target: { value: string } }) => setSelectedSchema(e.target.value)}
             >
               <option value="all">All Schemas</option>
               {schemaOptions.map(schema => (
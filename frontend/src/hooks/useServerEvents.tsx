@@ -0,0 +1,162 @@
+import React, { createContext, useContext, useEffect, useMemo, useRef } from 'react';
+import { ReportData, ReportDelta, SchemaReportData } from '../types/report.types';
+
+export type ServerEventHandlers = Record<string, (data: any) => void>;
+
+type ServerEventListener = (eventType: string, data: any) => void;
+
+interface ServerEventsHub {
+  subscribe: (listener: ServerEventListener) => () => void;
+}
+
+// Every event the backend publishes; the shared stream listens for all of them
+const SERVER_EVENT_TYPES = ['document.stage', 'report.delta', 'resync'];
+
+// Delay before reopening a stream the server refused (e.g. 503 when its
+// stream slots are taken), which the browser does not retry on its own
+const REOPEN_DELAY_MS = 30000;
+
+const ServerEventsContext = createContext(null as ServerEventsHub | null);
+
+interface ServerEventsProviderProps {
+  children: JSX.Element;
+}
+
+/**
+ * Hold the single server-sent event stream of the page. Each open stream
+ * occupies a backend thread, so components subscribe to this one through
+ * useServerEvents instead of opening their own.
+ */
+export const ServerEventsProvider = ({ children }: ServerEventsProviderProps): JSX.Element => {
+  const listenersRef = useRef(new Set<ServerEventListener>());
+
+  const hub = useMemo((): ServerEventsHub => ({
+    subscribe: (listener: ServerEventListener) => {
+      listenersRef.current.add(listener);
+      return () => {
+        listenersRef.current.delete(listener);
+      };
+    }
+  }), []);
+
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') {
+      return undefined;
+    }
+
+    // Replaced when a refused stream is reopened
+    const stream = { source: null as EventSource | null, reopenTimer: undefined as number | undefined };
+
+    const open = () => {
+      // The browser reconnects on its own and resumes after the last
+      // received event; only a refused connection ends up closed
+      const current = new EventSource(`/api/events?types=${SERVER_EVENT_TYPES.join(',')}`);
+      SERVER_EVENT_TYPES.forEach((eventType: string) => {
+        current.addEventListener(eventType, ((event: MessageEvent) => {
+          const data = JSON.parse(event.data);
+          listenersRef.current.forEach((listener: ServerEventListener) => listener(eventType, data));
+        }) as EventListener);
+      });
+      current.onerror = () => {
+        if (current.readyState === EventSource.CLOSED) {
+          stream.reopenTimer = window.setTimeout(open, REOPEN_DELAY_MS);
+        }
+      };
+      stream.source = current;
+    };
+    open();
+
+    return () => {
+      window.clearTimeout(stream.reopenTimer);
+      if (stream.source) {
+        stream.source.close();
+      }
+    };
+  }, []);
+
+  return <ServerEventsContext.Provider value={hub}>{children}</ServerEventsContext.Provider>;
+};
+
+/**
+ * Receive server-sent events for the lifetime of the component from the
+ * stream shared by ServerEventsProvider. `resync` is sent when events were
+ * missed and the full state has to be fetched again.
+ */
+const useServerEvents = (handlers: ServerEventHandlers, enabled: boolean = true): void => {
+  const hub: ServerEventsHub | null = useContext(ServerEventsContext);
+
+  // Handlers are read through a ref so re-renders do not resubscribe
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    if (!enabled || !hub) {
+      return undefined;
+    }
+
+    return hub.subscribe((eventType: string, data: any) => {
+      const handler = handlersRef.current[eventType];
+      if (handler) {
+        handler(data);
+      }
+    });
+  }, [hub, enabled]);
+};
+
+/**
+ * Apply a report delta to a full or per-schema report without refetching it.
+ */
+export const applyReportDelta = <T extends ReportData | SchemaReportData>(report: T, delta: ReportDelta): T => {
+  const { document, previous_schema_id } = delta;
+  const schemaReport = 'schema_id' in report;
+  const belongs = !schemaReport || document.schema_id === (report as SchemaReportData).schema_id;
+
+  const documentList = report.document_list.slice();
+  const index = documentList.findIndex(doc => doc.classification_id === document.classification_id);
+  if (index >= 0 && belongs) {
+    documentList[index] = { ...documentList[index], ...document };
+  } else if (index >= 0) {
+    documentList.splice(index, 1);
+  } else if (belongs) {
+    documentList.push(document);
+  }
+
+  const updated = {
+    ...report,
+    generated_at: new Date().toISOString(),
+    document_list: documentList,
+    total_documents: schemaReport ? documentList.length : delta.total_documents
+  };
+
+  if ('schemas_used' in report) {
+    const schemasUsed = { ...report.schemas_used };
+    const adjust = (schemaId: string | null, change: number) => {
+      if (!schemaId) {
+        return;
+      }
+      // Schemas are keyed by title; the first document of a schema missing
+      // from the fetched report starts its entry
+      const usage = schemasUsed[schemaId] || { title: schemaId, count: 0, percentage: 0 };
+      schemasUsed[schemaId] = { ...usage, count: Math.max(0, usage.count + change) };
+    };
+    // An added document already in the list was included by the fetch
+    // that raced with this event, so it is counted already
+    const counted = delta.op === 'added' && index >= 0;
+    if (!counted && previous_schema_id !== document.schema_id) {
+      adjust(previous_schema_id, -1);
+      adjust(document.schema_id, 1);
+    }
+    Object.keys(schemasUsed).forEach(schemaId => {
+      const count = schemasUsed[schemaId].count;
+      schemasUsed[schemaId] = {
+        ...schemasUsed[schemaId],
+        percentage: delta.total_documents > 0 ? Math.round(count / delta.total_documents * 1000) / 10 : 0
+      };
+    });
+    (updated as ReportData).schemas_used = schemasUsed;
+  }
+
+  return updated;
+};
+
+export default useServerEvents;
@@ -42,4 +42,45 @@ export interface SchemaReportData {
   total_documents: number;
   field_coverage: Record<string, SchemaFieldCoverage>;
   document_list: Array<ReportDocument>;
-}
\ No newline at end of file
+}
+
+export type AnalyticsGranularity = 'hour' | 'day' | 'week';
+
+export interface AnalyticsPoint {
+  bucket_start: string;
+  schema_id: string;
+  count: number;
+  avg_confidence: number;
+  avg_latency_ms: number | null;
+}
+
+export interface AnalyticsData {
+  granularity: AnalyticsGranularity;
+  from: string;
+  to: string;
+  schema_id: string | null;
+  points: Array<AnalyticsPoint>;
+}
+
+export type DocumentStage = 'saved' | 'parsed' | 'classified' | 'stored' | 'quarantined';
+
+export interface DocumentStageEvent {
+  classification_id: string;
+  stage: DocumentStage;
+  filename?: string;
+  total_pages?: number;
+  partial?: boolean;
+  error?: string;
+  schema_id?: string;
+  method?: string;
+  confidence?: number;
+  reason?: string;
+  document?: ReportDocument;
+}
+
+export interface ReportDelta {
+  op: 'added' | 'updated';
+  document: ReportDocument;
+  previous_schema_id: string | null;
+  total_documents: number;
+}
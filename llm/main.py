@@ -1,11 +1,17 @@
 import logging
+import hashlib
 import httpx
 import asyncio
 import json
 import os
-from fastapi import FastAPI, HTTPException
+import re
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any, Union
+from ollama_pool import OllamaPool
+from profiling import RequestProfiler
+from usage import AdaptiveBudgets, UsageStats, usage_from_response
 
 # Configure logging
 logging.basicConfig(
@@ -19,137 +25,476 @@ app = FastAPI()
 
 # Ollama API configuration
 OLLAMA_API_BASE = os.environ.get("OLLAMA_API_BASE", "http://ollama:11434/api")
+# Comma-separated pool of Ollama endpoints; defaults to the single OLLAMA_API_BASE
+OLLAMA_API_BASES = [
+    base.strip() for base in os.environ.get("OLLAMA_API_BASES", OLLAMA_API_BASE).split(",") if base.strip()
+]
+# Seconds between active health checks of every node
+OLLAMA_HEALTH_CHECK_INTERVAL = int(os.environ.get("OLLAMA_HEALTH_CHECK_INTERVAL", "10"))
+# Consecutive failures before a node is ejected, and for how long
+OLLAMA_NODE_FAILURE_THRESHOLD = int(os.environ.get("OLLAMA_NODE_FAILURE_THRESHOLD", "3"))
+OLLAMA_NODE_EJECTION_SECONDS = float(os.environ.get("OLLAMA_NODE_EJECTION_SECONDS", "30"))
 # Get default model from environment variable or use tinyllama as fallback
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "tinyllama")
+# Small, fast model tried first for routed prompt types (empty disables routing)
+OLLAMA_FAST_MODEL = os.environ.get("OLLAMA_FAST_MODEL", "")
+# How long Ollama keeps a model loaded after a request (e.g. "30m", "-1" for forever)
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE")
+# Periodically ping every tier model so none of them is cold-loaded on demand
+OLLAMA_KEEP_WARM = os.environ.get("OLLAMA_KEEP_WARM", "false").lower() in ("1", "true", "yes")
+OLLAMA_KEEP_WARM_INTERVAL = int(os.environ.get("OLLAMA_KEEP_WARM_INTERVAL", "240"))
+# Upper bound on a generation request, and the timeout before budgets adapt
+OLLAMA_REQUEST_TIMEOUT = float(os.environ.get("OLLAMA_REQUEST_TIMEOUT", "120"))
+# Cap num_predict and the timeout per prompt type from observed generations
+ADAPTIVE_BUDGETS = os.environ.get("ADAPTIVE_BUDGETS", "true").lower() in ("1", "true", "yes")
+ADAPTIVE_BUDGET_MIN_SAMPLES = int(os.environ.get("ADAPTIVE_BUDGET_MIN_SAMPLES", "20"))
+# Extra generations allowed when structured output fails validation
+STRUCTURED_OUTPUT_RETRIES = int(os.environ.get("STRUCTURED_OUTPUT_RETRIES", "1"))
+# Opt-in profiling of requests sent with "X-Profile: cprofile|sample" and of
+# sampling windows started through /api/admin/profiles/window; no middleware
+# is installed when disabled. PROFILING_TOKEN, if set, must be sent as X-Profile-Token
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+PROFILE_FOLDER = os.environ.get("PROFILE_FOLDER", "/tmp/llm-profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "100"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_MAX_WINDOW_SECONDS = float(os.environ.get("PROFILE_MAX_WINDOW_SECONDS", "60"))
+
+# Routing policy per prompt type: which field of the JSON answer must be
+# one of the request's allowed_choices for the fast tier's answer to be kept
+ROUTING_POLICIES = {
+    "classification": {"choice_field": "schema_id"},
+}
+
+# Count of answers per tier and of escalations, for observability
+routing_stats = {"answered": {}, "escalations": {}}
+
+# Outcome counts for structured output requests
+structured_output_stats = {"valid": 0, "repaired": 0, "retried": 0, "failed": 0}
+
+# Prompt evaluation per prompt type, to see how much of each prompt Ollama
+# re-evaluates and how long until the first generated token
+prompt_eval_stats = {}
+
+# Exact token and time totals per model and caller
+usage_stats = UsageStats()
+
+# Generation caps and timeouts learned per prompt type and model
+budgets = AdaptiveBudgets(
+    enabled=ADAPTIVE_BUDGETS,
+    min_samples=ADAPTIVE_BUDGET_MIN_SAMPLES,
+    max_timeout=OLLAMA_REQUEST_TIMEOUT
+)
+
+# Stored request profiles and sampling windows
+profiler = RequestProfiler(
+    PROFILE_FOLDER,
+    max_profiles=PROFILE_MAX_FILES,
+    sample_interval=PROFILE_SAMPLE_INTERVAL_MS / 1000,
+    max_window_seconds=PROFILE_MAX_WINDOW_SECONDS
+) if PROFILING_ENABLED else None
 
 # Check if Ollama server is ready
 is_ollama_ready = False
 
+# Pool of Ollama backends with health state and in-flight request counts
+pool = OllamaPool(
+    OLLAMA_API_BASES,
+    failure_threshold=OLLAMA_NODE_FAILURE_THRESHOLD,
+    ejection_seconds=OLLAMA_NODE_EJECTION_SECONDS
+)
+
 # Request model
 class TextRequest(BaseModel):
     prompt: str
     max_new_tokens: int = 256  # Will be converted to max_tokens for Ollama
     temperature: float = 0.7
     stop_sequences: Optional[List[str]] = None
-    model: str = OLLAMA_MODEL  # Allow overriding the default model
+    model: Optional[str] = None  # Allow overriding the default model (disables routing)
+    prompt_type: Optional[str] = None  # Selects a routing policy, e.g. "classification"
+    allowed_choices: Optional[List[str]] = None  # Valid values for the policy's choice field
+    format: Optional[Union[str, Dict[str, Any]]] = None  # "json" or a JSON schema for constrained output
+    system: Optional[str] = None  # Stable instructions; kept identical across calls so their KV cache is reused
+    keep_alive: Optional[Union[str, int]] = None  # Overrides OLLAMA_KEEP_ALIVE for this request
+    caller: Optional[str] = None  # Name of the calling service, for usage accounting
+
+def resolve_tiers(request: TextRequest):
+    """Return the ordered (tier, model) pairs to try for a request."""
+    if request.model:
+        return [("explicit", request.model)]
+    if (request.prompt_type in ROUTING_POLICIES
+            and OLLAMA_FAST_MODEL and OLLAMA_FAST_MODEL != OLLAMA_MODEL):
+        return [("fast", OLLAMA_FAST_MODEL), ("large", OLLAMA_MODEL)]
+    return [("default", OLLAMA_MODEL)]
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+}
+
+def validate_against_schema(value: Any, schema: Dict[str, Any], path: str = "$") -> Optional[str]:
+    """Validate a value against the JSON schema subset Ollama's format supports.
+
+    Returns an error message, or None if the value is valid.
+    """
+    expected_type = schema.get("type")
+    if expected_type in JSON_TYPES:
+        # bool is an int subclass; never accept it for numeric types
+        if not isinstance(value, JSON_TYPES[expected_type]) or (
+                isinstance(value, bool) and expected_type != "boolean"):
+            return f"{path}: expected {expected_type}"
+
+    if "enum" in schema and value not in schema["enum"]:
+        return f"{path}: {value!r} is not one of {schema['enum']}"
+
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                return f"{path}: missing required property '{key}'"
+        for key, property_schema in schema.get("properties", {}).items():
+            if key in value:
+                error = validate_against_schema(value[key], property_schema, f"{path}.{key}")
+                if error:
+                    return error
+
+    if isinstance(value, list) and "items" in schema:
+        for index, item in enumerate(value):
+            error = validate_against_schema(item, schema["items"], f"{path}[{index}]")
+            if error:
+                return error
+    return None
+
+def parse_structured_output(text: str, output_format: Union[str, Dict[str, Any]]):
+    """Parse and validate generated JSON, repairing common wrapping issues.
+
+    Returns a tuple (data, error, repaired); data is None when the text
+    could not be turned into a valid object.
+    """
+    repaired = False
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # Repair: drop code fences or chatter around the outermost object
+        json_match = re.search(r'\{.*\}', text, re.DOTALL)
+        if not json_match:
+            return None, "no JSON object in output", False
+        try:
+            data = json.loads(json_match.group(0))
+        except json.JSONDecodeError as e:
+            return None, f"invalid JSON: {str(e)}", False
+        repaired = True
+
+    if isinstance(output_format, dict):
+        error = validate_against_schema(data, output_format)
+        if error:
+            return None, error, repaired
+    return data, None, repaired
+
+def check_tier_output(request: TextRequest, result: Dict[str, Any]) -> Optional[str]:
+    """Return why a tier's answer must be escalated, or None if it is acceptable."""
+    policy = ROUTING_POLICIES.get(request.prompt_type)
+    if not policy:
+        return None
+
+    choice_field = policy["choice_field"]
+    allowed_choices = request.allowed_choices
+    if isinstance(request.format, dict):
+        allowed_choices = allowed_choices or request.format.get("properties", {}).get(choice_field, {}).get("enum")
+
+    # Already parsed and validated by generate_structured for formatted requests
+    answer = result.get("data") if request.format else None
+    if answer is None:
+        answer, _, _ = parse_structured_output(result["text"], "json")
+    if not isinstance(answer, dict):
+        return "invalid_json"
+
+    if allowed_choices and answer.get(choice_field) not in allowed_choices:
+        return "choice_not_allowed"
+    if request.format and result.get("data") is None:
+        # Parsed, but failed the schema for another reason
+        return "schema_violation"
+    return None
+
+async def generate_structured(request: TextRequest, model: str, retries: int = STRUCTURED_OUTPUT_RETRIES):
+    """Generate with one model, validating structured output with up to `retries` retries."""
+    attempts = 0
+    while True:
+        attempts += 1
+        result = await call_ollama(request, model)
+        if "error" in result or not request.format:
+            return result
+
+        data, error, repaired = parse_structured_output(result["text"], request.format)
+        result["attempts"] = attempts
+        if data is not None:
+            structured_output_stats["repaired" if repaired else "valid"] += 1
+            result["data"] = data
+            return result
+
+        if attempts > retries:
+            structured_output_stats["failed"] += 1
+            logger.warning(f"Structured output from '{model}' failed validation: {error}")
+            result["data"] = None
+            result["validation_error"] = error
+            return result
+
+        structured_output_stats["retried"] += 1
+        logger.info(f"Retrying '{model}' after invalid structured output: {error}")
+        # Retry deterministically; sampling noise is the usual cause of bad JSON
+        request = request.model_copy(update={"temperature": 0.0})
+
+def record_routing(key: str, name: str):
+    """Increment a routing counter."""
+    routing_stats[key][name] = routing_stats[key].get(name, 0) + 1
+
+def prefix_key(request: TextRequest, model: str) -> Optional[str]:
+    """Key identifying a request's cacheable prompt prefix on a model."""
+    if not request.system:
+        return None
+    return hashlib.sha1(f"{model}\0{request.system}".encode("utf-8")).hexdigest()[:16]
+
+def record_prompt_eval(request: TextRequest, usage: Dict[str, Any]) -> Dict[str, Any]:
+    """Record Ollama's prompt evaluation counters for a response and return its timings."""
+    prompt_eval_count = usage["prompt_tokens"]
+    prompt_eval_ms = usage["prompt_eval_ms"]
+    timings = {
+        "prompt_eval_count": prompt_eval_count,
+        "prompt_eval_ms": prompt_eval_ms,
+        "load_ms": usage["load_ms"],
+        # Non-streaming: the first token follows model load and prompt evaluation
+        "time_to_first_token_ms": round(usage["load_ms"] + prompt_eval_ms, 1),
+        "eval_ms": usage["eval_ms"],
+        "total_ms": usage["total_ms"],
+        "tokens_per_second": usage["tokens_per_second"],
+    }
+
+    stats = prompt_eval_stats.setdefault(request.prompt_type or "default", {
+        "requests": 0, "prompt_eval_count": 0, "prompt_eval_ms": 0.0, "time_to_first_token_ms": 0.0
+    })
+    stats["requests"] += 1
+    stats["prompt_eval_count"] += prompt_eval_count
+    stats["prompt_eval_ms"] += prompt_eval_ms
+    stats["time_to_first_token_ms"] += timings["time_to_first_token_ms"]
+    return timings
 
 # Text generation endpoint using Ollama API
 @app.post("/api/generate")
 async def generate_text(request: TextRequest):
-    if not is_ollama_ready:
+    if not pool.has_healthy_nodes():
         # Try to check status one more time
         ready = await check_ollama_status()
         if not ready:
-            return {"error": "Ollama server is not available, please check if it's running"}
+            return {"error": "Ollama server is not available, please check if it's running", "retryable": True}
 
-    # Log all available models for debugging
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            models_response = await client.get(f"{OLLAMA_API_BASE}/tags")
-            if models_response.status_code == 200:
-                available_models = models_response.json().get("models", [])
-                model_names = [model.get("name") for model in available_models]
-                logger.info(f"Available models: {model_names}")
-            else:
-                logger.error(f"Failed to get model list: {models_response.status_code}")
-    except Exception as e:
-        logger.error(f"Error checking available models: {str(e)}")
-    
-    logger.info(f"Received generation request for model: {request.model}")
+    # Log available models as of the last health check
+    logger.info(f"Available models: {sorted(pool.available_models())}")
+
+    tiers = resolve_tiers(request)
+    logger.info(f"Received generation request, tiers: {tiers}")
     logger.info(f"Prompt preview: {request.prompt[:50]}...")
-    
-    # Check if the requested model exists, try to pull it if not
-    model_exists = await ensure_model_exists(request.model)
-    if not model_exists:
-        return {
-            "error": f"Model '{request.model}' not found and could not be pulled automatically. Please pull it manually with 'docker exec -it ollama ollama pull {request.model}'"
-        }
-    
+
+    result = None
+    for index, (tier, model) in enumerate(tiers):
+        is_last_tier = index == len(tiers) - 1
+
+        # Check if the requested model exists, try to pull it if not
+        model_exists = await ensure_model_exists(model)
+        if not model_exists:
+            result = {
+                "error": f"Model '{model}' not found and could not be pulled automatically. Please pull it manually with 'docker exec -it ollama ollama pull {model}'"
+            }
+            reason = "model_unavailable"
+        else:
+            # A tier that can escalate hands a bad answer to the next tier
+            # instead of retrying the same model
+            retries = STRUCTURED_OUTPUT_RETRIES if is_last_tier else 0
+            result = await generate_structured(request, model, retries)
+            reason = "error" if "error" in result else check_tier_output(request, result)
+
+        if reason is None or is_last_tier:
+            break
+
+        logger.info(f"Escalating from {tier} tier ({model}): {reason} {result.get('validation_error') or ''}".rstrip())
+        record_routing("escalations", f"{tier}:{reason}")
+
+    if "error" not in result:
+        record_routing("answered", tier)
+        result["tier"] = tier
+        result["escalated"] = index > 0
+    return result
+
+async def call_ollama(request: TextRequest, model: str):
+    """Run a generation against one model, retrying once if a learned budget proved too tight."""
+    # Cap generation length and time at what this prompt type needs
+    num_predict, timeout, adapted = budgets.budget(request.prompt_type, model, request.max_new_tokens)
+    result = await generate_once(request, model, num_predict, timeout, adapted)
+    if not adapted:
+        return result
+
+    if result.get("timed_out"):
+        # record_timeout has widened the timeout for this prompt type; at
+        # least double this attempt's, as the minimum may hide the widening
+        previous_timeout = timeout
+        num_predict, timeout, adapted = budgets.budget(request.prompt_type, model, request.max_new_tokens)
+        timeout = min(budgets.max_timeout, max(timeout, previous_timeout * 2))
+        logger.info(f"Retrying {request.prompt_type} on {model} with a {timeout:.1f}s timeout")
+        result = await generate_once(request, model, num_predict, timeout, adapted)
+    elif result.get("usage", {}).get("truncated") and num_predict < request.max_new_tokens:
+        # Cut off at the learned cap; the caller's own limit may fit the answer
+        logger.info(f"Retrying truncated {request.prompt_type} on {model} with {request.max_new_tokens} tokens")
+        result = await generate_once(request, model, request.max_new_tokens, budgets.max_timeout, False)
+    return result
+
+async def generate_once(request: TextRequest, model: str, num_predict: int, timeout: float, adapted: bool):
+    """Run a single non-streaming generation against one model under a given budget."""
     try:
         # Prepare the Ollama API request
         ollama_request = {
-            "model": request.model,
+            "model": model,
             "prompt": request.prompt,
             "options": {
                 "temperature": request.temperature,
-                "num_predict": request.max_new_tokens,  # Convert to Ollama's param
+                "num_predict": num_predict,  # Convert to Ollama's param
             },
             "stream": False  # Important: disable streaming to get a complete response
         }
-        
+
+        # Stable instructions go in the system prompt, ahead of the variable
+        # prompt, so Ollama can reuse their evaluated prefix between requests
+        if request.system:
+            ollama_request["system"] = request.system
+
+        # Keep the model resident between requests if configured
+        keep_alive = request.keep_alive if request.keep_alive is not None else OLLAMA_KEEP_ALIVE
+        if keep_alive:
+            ollama_request["keep_alive"] = keep_alive
+
+        # Constrain decoding to JSON, or to a JSON schema
+        if request.format:
+            ollama_request["format"] = request.format
+
         # Add stop sequences if provided
         if request.stop_sequences:
             ollama_request["options"]["stop"] = request.stop_sequences
         
-        logger.info(f"Sending request to Ollama API with options: {ollama_request['options']}")
+        logger.info(f"Sending request to Ollama API with options: {ollama_request['options']}, timeout {timeout:.1f}s")
         
-        # Send request to Ollama API
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            try:
-                response = await client.post(
-                    f"{OLLAMA_API_BASE}/generate",
-                    json=ollama_request
-                )
-                
-                # Check if request was successful
-                if response.status_code != 200:
-                    error_msg = f"Ollama API returned status code: {response.status_code}"
-                    logger.error(error_msg)
-                    
-                    # Try to extract error message from response
+        # Try nodes best first, preferring one that already holds this
+        # prefix in its cache, failing over on connection and server errors
+        key = prefix_key(request, model)
+        candidates = pool.candidates(model, key)
+        if not candidates:
+            return {"error": "No healthy Ollama node is available", "retryable": True}
+
+        last_error = None
+        for node in candidates:
+            async with pool.acquire(node):
+                # Send request to Ollama API
+                async with httpx.AsyncClient(timeout=timeout) as client:
                     try:
-                        error_details = response.json()
-                        if "error" in error_details:
-                            error_msg += f" - {error_details['error']}"
-                    except:
-                        pass
-                        
-                    return {"error": error_msg}
-                
-                # Handle both streaming and non-streaming responses
-                if 'application/x-ndjson' in response.headers.get('content-type', ''):
-                    # Process streaming response (even though we requested non-streaming)
-                    logger.info("Received streaming response despite requesting non-streaming")
-                    full_text = await process_streaming_response(response.text)
-                    logger.info(f"Processed streaming response, length: {len(full_text)}")
-                else:
-                    # Process normal JSON response
-                    response_data = response.json()
-                    full_text = response_data.get("response", "")
-                
-                # Calculate approximate token counts
-                # This is an estimate since we don't have exact token counts
-                prompt_tokens = len(request.prompt.split()) // 3 * 4  # Rough estimate
-                completion_tokens = len(full_text.split()) // 3 * 4   # Rough estimate
-                total_tokens = prompt_tokens + completion_tokens
-                
-                logger.info(f"Successfully generated text: {len(full_text)} characters")
-                
-                return {
-                    "text": full_text,
-                    "model": request.model,
-                    "usage": {
-                        "prompt_tokens": prompt_tokens,
-                        "completion_tokens": completion_tokens,
-                        "total_tokens": total_tokens
-                    }
+                        response = await client.post(
+                            f"{node.base_url}/generate",
+                            json=ollama_request
+                        )
+                    except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                        last_error = f"{node.base_url} unreachable: {str(e)}"
+                        logger.error(last_error)
+                        pool.record_failure(node)
+                        continue
+                    except httpx.TimeoutException:
+                        logger.error(f"Request to Ollama node {node.base_url} timed out after {timeout:.1f}s")
+                        if adapted:
+                            # The learned timeout was too tight, not the node at fault
+                            budgets.record_timeout(request.prompt_type, model)
+                        else:
+                            pool.record_failure(node)
+                        return {
+                            "error": "Generation timed out. Try using a smaller max_new_tokens value or a lighter model.",
+                            "retryable": True,
+                            "timed_out": True
+                        }
+
+            # Check if request was successful
+            if response.status_code != 200:
+                error_msg = f"Ollama API returned status code: {response.status_code}"
+                logger.error(f"{error_msg} from {node.base_url}")
+
+                # Try to extract error message from response
+                try:
+                    error_details = response.json()
+                    if "error" in error_details:
+                        error_msg += f" - {error_details['error']}"
+                except:
+                    pass
+
+                # Server errors may be node-specific; try the next node
+                if response.status_code >= 500:
+                    pool.record_failure(node)
+                    last_error = error_msg
+                    continue
+                return {"error": error_msg}
+
+            pool.record_success(node, model, key)
+
+            # Handle both streaming and non-streaming responses
+            if 'application/x-ndjson' in response.headers.get('content-type', ''):
+                # Process streaming response (even though we requested non-streaming)
+                logger.info("Received streaming response despite requesting non-streaming")
+                full_text, response_data = await process_streaming_response(response.text)
+                logger.info(f"Processed streaming response, length: {len(full_text)}")
+            else:
+                # Process normal JSON response
+                response_data = response.json()
+                full_text = response_data.get("response", "")
+
+            # Exact counts and durations from Ollama's final response object
+            usage = usage_from_response(response_data, num_predict)
+            usage_stats.record(model, request.caller, usage)
+            budgets.record(request.prompt_type, model, usage, num_predict)
+            timings = record_prompt_eval(request, usage)
+            logger.info(
+                f"Generated on {node.base_url}: {usage['prompt_tokens']} prompt tokens, "
+                f"{usage['completion_tokens']}/{num_predict} completion tokens, "
+                f"time to first token {timings['time_to_first_token_ms']} ms, "
+                f"{usage['tokens_per_second']} tokens/s"
+            )
+
+            return {
+                "text": full_text,
+                "model": model,
+                "node": node.base_url,
+                "timings": timings,
+                "usage": {
+                    "prompt_tokens": usage["prompt_tokens"],
+                    "completion_tokens": usage["completion_tokens"],
+                    "total_tokens": usage["total_tokens"],
+                    "truncated": usage["truncated"]
+                },
+                "budget": {
+                    "num_predict": num_predict,
+                    "timeout_s": round(timeout, 1),
+                    "adapted": adapted
                 }
-                
-            except httpx.TimeoutException:
-                logger.error("Request to Ollama API timed out")
-                return {"error": "Generation timed out. Try using a smaller max_new_tokens value or a lighter model."}
-                
+            }
+
+        return {"error": f"All Ollama nodes failed, last error: {last_error}", "retryable": True}
+
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
         logger.error(f"Unexpected error: {str(e)}")
         logger.error(error_trace)
-        return {"error": str(e)}
+        return {"error": str(e), "retryable": True}
 
 # Function to process streaming responses
 async def process_streaming_response(text_stream):
-    """Process Ollama streaming response format and extract the generated text."""
+    """Process Ollama streaming response format; returns the generated text and the final object."""
     full_text = ""
+    final_data = {}
     
     # Process each line of the stream
     for line in text_stream.strip().split('\n'):
@@ -164,71 +509,57 @@ async def process_streaming_response(text_stream):
             if "response" in data:
                 full_text += data["response"]
                 
-            # Check if this is the last message
+            # Check if this is the last message; it carries the counters
             if data.get("done", False):
+                final_data = data
                 break
                 
         except json.JSONDecodeError:
             logger.warning(f"Failed to decode JSON line: {line}")
             
-    return full_text
+    return full_text, final_data
 
 # Function to check if Ollama is running and check available models
 async def check_ollama_status():
+    """Health-check every node in the pool; returns whether any node is usable."""
     global is_ollama_ready
-    
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{OLLAMA_API_BASE}/tags")
-            if response.status_code == 200:
-                is_ollama_ready = True
-                logger.info("Ollama server is ready")
-                
-                # Log available models
-                models = response.json().get("models", [])
-                model_names = [model.get("name") for model in models]
-                logger.info(f"Available Ollama models: {model_names}")
-                return True
-            else:
-                logger.error(f"Ollama server returned status code: {response.status_code}")
-                return False
-    except Exception as e:
-        logger.error(f"Error connecting to Ollama: {str(e)}")
-        return False
+
+    is_ollama_ready = await pool.check_all()
+    if is_ollama_ready:
+        logger.info(f"Available Ollama models: {sorted(pool.available_models())}")
+    else:
+        logger.error("No Ollama node is available")
+    return is_ollama_ready
 
 # Function to check if a model exists and pull it if it doesn't
 async def ensure_model_exists(model_name: str):
     logger.info(f"Checking if model '{model_name}' exists")
+    if model_name in pool.available_models():
+        logger.info(f"Model '{model_name}' already exists")
+        return True
+
+    candidates = pool.candidates(model_name)
+    if not candidates:
+        logger.error(f"No healthy Ollama node to pull model '{model_name}' on")
+        return False
+
+    # Pull onto the least busy node; the next health check picks it up
+    node = candidates[0]
+    logger.info(f"Model '{model_name}' not found, pulling it on {node.base_url}...")
     try:
         async with httpx.AsyncClient(timeout=10.0) as client:
-            # Check available models
-            response = await client.get(f"{OLLAMA_API_BASE}/tags")
-            if response.status_code != 200:
-                logger.error(f"Failed to get model list: {response.status_code}")
+            # Start the pull operation
+            pull_response = await client.post(
+                f"{node.base_url}/pull",
+                json={"name": model_name}
+            )
+
+            if pull_response.status_code != 200:
+                logger.error(f"Failed to start model pull: {pull_response.status_code}")
                 return False
-            
-            models = response.json().get("models", [])
-            model_names = [model.get("name") for model in models]
-            
-            # If model doesn't exist, pull it
-            if model_name not in model_names:
-                logger.info(f"Model '{model_name}' not found, pulling it now...")
-                
-                # Start the pull operation
-                pull_response = await client.post(
-                    f"{OLLAMA_API_BASE}/pull",
-                    json={"name": model_name}
-                )
-                
-                if pull_response.status_code != 200:
-                    logger.error(f"Failed to start model pull: {pull_response.status_code}")
-                    return False
-                
-                logger.info(f"Started pulling model '{model_name}'")
-                return True
-            else:
-                logger.info(f"Model '{model_name}' already exists")
-                return True
+
+            logger.info(f"Started pulling model '{model_name}'")
+            return True
     except Exception as e:
         logger.error(f"Error ensuring model exists: {str(e)}")
         return False
@@ -242,12 +573,160 @@ async def startup_event():
     # Pull the default model if Ollama is ready
     if status and is_ollama_ready:
         await ensure_model_exists(OLLAMA_MODEL)
+        if OLLAMA_FAST_MODEL:
+            await ensure_model_exists(OLLAMA_FAST_MODEL)
     
     # Periodically check Ollama status
     asyncio.create_task(periodic_status_check())
 
+    # Optionally keep every tier model loaded
+    if OLLAMA_KEEP_WARM:
+        asyncio.create_task(periodic_keep_warm())
+
 async def periodic_status_check():
+    """Actively health-check every node so failed nodes are ejected and recovered ones re-admitted."""
     while True:
-        if not is_ollama_ready:
-            await check_ollama_status()
-        await asyncio.sleep(30)  # Check every 30 seconds if not ready
\ No newline at end of file
+        await asyncio.sleep(OLLAMA_HEALTH_CHECK_INTERVAL)
+        await check_ollama_status()
+
+async def periodic_keep_warm():
+    """Load every routing tier model with an empty prompt so it stays resident."""
+    models = {OLLAMA_MODEL}
+    if OLLAMA_FAST_MODEL:
+        models.add(OLLAMA_FAST_MODEL)
+
+    while True:
+        for node in pool.nodes:
+            if not node.healthy:
+                continue
+            for model in models & node.available_models:
+                try:
+                    async with httpx.AsyncClient(timeout=120.0) as client:
+                        # An empty prompt only loads the model and resets its keep_alive timer
+                        await client.post(
+                            f"{node.base_url}/generate",
+                            json={"model": model, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE or "30m", "stream": False}
+                        )
+                    node.loaded_models.add(model)
+                    logger.info(f"Kept model '{model}' warm on {node.base_url}")
+                except Exception as e:
+                    logger.error(f"Error keeping model '{model}' warm on {node.base_url}: {str(e)}")
+        await asyncio.sleep(OLLAMA_KEEP_WARM_INTERVAL)
+
+@app.get("/api/routing/stats")
+async def get_routing_stats():
+    return {
+        "tiers": {"fast": OLLAMA_FAST_MODEL or None, "large": OLLAMA_MODEL},
+        **routing_stats,
+        "structured_output": structured_output_stats
+    }
+
+@app.get("/api/prompt-eval/stats")
+async def get_prompt_eval_stats():
+    """Average prompt tokens evaluated and time to first token per prompt type."""
+    return {
+        prompt_type: {
+            "requests": stats["requests"],
+            "avg_prompt_eval_count": round(stats["prompt_eval_count"] / stats["requests"], 1),
+            "avg_prompt_eval_ms": round(stats["prompt_eval_ms"] / stats["requests"], 1),
+            "avg_time_to_first_token_ms": round(stats["time_to_first_token_ms"] / stats["requests"], 1),
+        }
+        for prompt_type, stats in prompt_eval_stats.items()
+    }
+
+@app.get("/api/usage")
+async def get_usage():
+    """Exact token and time totals per model and caller, and the learned budgets per prompt type."""
+    return {
+        **usage_stats.summary(),
+        "budgets": budgets.summary()
+    }
+
+@app.get("/api/nodes")
+async def get_nodes():
+    return {"nodes": [node.to_dict() for node in pool.nodes]}
+
+def check_profiling_access(request: Request):
+    """Hide the profiling endpoints unless enabled, and require the token when configured."""
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if PROFILING_TOKEN and request.headers.get("X-Profile-Token") != PROFILING_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+if PROFILING_ENABLED:
+    @app.middleware("http")
+    async def profile_requests(request: Request, call_next):
+        """Profile requests that ask for it, body included, and return the profile's id in X-Profile-Id."""
+        mode = request.headers.get("X-Profile") or request.query_params.get("profile")
+        if not mode or (PROFILING_TOKEN and request.headers.get("X-Profile-Token") != PROFILING_TOKEN):
+            return await call_next(request)
+        if mode not in profiler.MODES:
+            return JSONResponse({"detail": f"Profiling mode must be one of {list(profiler.MODES)}"}, status_code=400)
+
+        state = profiler.start_request(mode, f"{request.method} {request.url.path}")
+        if state is None:
+            response = await call_next(request)
+            response.headers["X-Profile-Id"] = "busy"
+            return response
+        try:
+            response = await call_next(request)
+        except BaseException:
+            await finish_profiling(state)
+            raise
+        # The body is still being produced while it is sent, so profiling
+        # stops once the response iterator is exhausted or closed. The wrapper
+        # is started here, so it is closed even if the body is never read.
+        response.body_iterator = profiled_body(response.body_iterator, state)
+        await response.body_iterator.__anext__()
+        response.headers["X-Profile-Id"] = state["profile_id"]
+        return response
+
+    async def profiled_body(body_iterator, state):
+        """Pass a response body through, finishing the request's profile after it; yields None first."""
+        try:
+            yield None
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            await finish_profiling(state)
+
+    async def finish_profiling(state):
+        """Stop profiling on the event loop thread and write the profile from a worker thread."""
+        await asyncio.to_thread(profiler.store_request, profiler.stop_request(state))
+
+@app.get("/api/admin/profiles")
+async def list_profiles(request: Request):
+    """Stored profiles, newest first, and the running sampling window."""
+    check_profiling_access(request)
+    return {
+        "profiles": [
+            {key: value for key, value in profile.items() if key != "path"}
+            for profile in profiler.list_profiles()
+        ],
+        "window": profiler.window_status()
+    }
+
+class ProfilingWindowRequest(BaseModel):
+    seconds: float = 10.0
+    interval_ms: Optional[float] = None
+
+@app.post("/api/admin/profiles/window", status_code=202)
+async def start_profiling_window(request: Request, window_request: ProfilingWindowRequest):
+    """Sample the stacks of every thread for a few seconds and store them as collapsed stacks."""
+    check_profiling_access(request)
+    if window_request.seconds <= 0 or (window_request.interval_ms is not None and window_request.interval_ms <= 0):
+        raise HTTPException(status_code=400, detail="seconds and interval_ms must be positive")
+    interval = window_request.interval_ms / 1000 if window_request.interval_ms else None
+    window = profiler.start_window(window_request.seconds, interval)
+    if window is None:
+        raise HTTPException(status_code=409, detail="A sampling window is already running")
+    return {"window": window}
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def download_profile(request: Request, profile_id: str):
+    """Download a stored pstats file or collapsed stacks."""
+    check_profiling_access(request)
+    path = profiler.get_profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=os.path.basename(path))
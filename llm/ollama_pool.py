@@ -0,0 +1,158 @@
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+logger = logging.getLogger("ollama_pool")
+
+# Prompt prefixes remembered per node; Ollama only keeps the KV cache of
+# recent requests, so older prefixes are unlikely to still be cached
+RECENT_PREFIXES_PER_NODE = 8
+
+
+class OllamaNode:
+    """State of a single Ollama backend as seen by the gateway."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.healthy = False
+        self.outstanding = 0
+        self.available_models: Set[str] = set()
+        self.loaded_models: Set[str] = set()
+        # Prompt prefix keys this node served recently, most recent last
+        self.recent_prefixes: "OrderedDict[str, None]" = OrderedDict()
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.last_checked: Optional[float] = None
+
+    def is_routable(self, now: float) -> bool:
+        """A node takes traffic when healthy and not serving an ejection."""
+        return self.healthy and now >= self.ejected_until
+
+    def to_dict(self) -> Dict:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "ejected": time.monotonic() < self.ejected_until,
+            "outstanding": self.outstanding,
+            "available_models": sorted(self.available_models),
+            "loaded_models": sorted(self.loaded_models),
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class OllamaPool:
+    """Pool of Ollama backends with health checks and least-outstanding routing.
+
+    Nodes are probed with /tags (models on disk) and /ps (models in memory).
+    Requests go to the routable node with the fewest in-flight requests,
+    where a node that would have to cold-load the model counts as
+    cold_load_penalty requests busier and one that has not recently seen
+    the request's prompt prefix (so cannot reuse its KV cache) counts as
+    prefix_miss_penalty requests busier. Nodes that fail repeatedly are
+    ejected for a cool-down period and re-admitted by the next successful
+    health check after it.
+    """
+
+    def __init__(self, base_urls: List[str], failure_threshold: int = 3,
+                 ejection_seconds: float = 30.0, cold_load_penalty: int = 2,
+                 prefix_miss_penalty: int = 1):
+        self.nodes = [OllamaNode(base_url) for base_url in base_urls]
+        self.failure_threshold = failure_threshold
+        self.ejection_seconds = ejection_seconds
+        self.cold_load_penalty = cold_load_penalty
+        self.prefix_miss_penalty = prefix_miss_penalty
+
+    def has_healthy_nodes(self) -> bool:
+        now = time.monotonic()
+        return any(node.is_routable(now) for node in self.nodes)
+
+    def available_models(self) -> Set[str]:
+        """Models present on at least one healthy node."""
+        models = set()
+        for node in self.nodes:
+            if node.healthy:
+                models |= node.available_models
+        return models
+
+    async def check_node(self, node: OllamaNode) -> bool:
+        """Probe one node and refresh its model lists."""
+        node.last_checked = time.monotonic()
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                tags_response = await client.get(f"{node.base_url}/tags")
+                tags_response.raise_for_status()
+                node.available_models = {
+                    model.get("name") for model in tags_response.json().get("models", [])
+                }
+
+                # /ps is missing on old Ollama versions; loaded models are then unknown
+                ps_response = await client.get(f"{node.base_url}/ps")
+                if ps_response.status_code == 200:
+                    node.loaded_models = {
+                        model.get("name") for model in ps_response.json().get("models", [])
+                    }
+        except Exception as e:
+            logger.error(f"Health check failed for {node.base_url}: {str(e)}")
+            node.healthy = False
+            self.record_failure(node)
+            return False
+
+        if not node.healthy:
+            logger.info(f"Ollama node {node.base_url} is healthy, models: {sorted(node.available_models)}")
+        node.healthy = True
+        if time.monotonic() >= node.ejected_until:
+            node.consecutive_failures = 0
+        return True
+
+    async def check_all(self) -> bool:
+        """Probe every node; returns whether any node is healthy."""
+        for node in self.nodes:
+            await self.check_node(node)
+        return self.has_healthy_nodes()
+
+    def candidates(self, model: str, prefix_key: Optional[str] = None) -> List[OllamaNode]:
+        """Routable nodes for a model, best first."""
+        now = time.monotonic()
+        routable = [node for node in self.nodes if node.is_routable(now)]
+        return sorted(
+            routable,
+            key=lambda node: (
+                # Nodes that would have to pull the model come last
+                model not in node.available_models,
+                node.outstanding
+                + (0 if model in node.loaded_models else self.cold_load_penalty)
+                + (0 if prefix_key is None or prefix_key in node.recent_prefixes else self.prefix_miss_penalty),
+            )
+        )
+
+    def record_success(self, node: OllamaNode, model: str, prefix_key: Optional[str] = None):
+        node.consecutive_failures = 0
+        node.available_models.add(model)
+        node.loaded_models.add(model)
+        if prefix_key is not None:
+            node.recent_prefixes[prefix_key] = None
+            node.recent_prefixes.move_to_end(prefix_key)
+            while len(node.recent_prefixes) > RECENT_PREFIXES_PER_NODE:
+                node.recent_prefixes.popitem(last=False)
+
+    def record_failure(self, node: OllamaNode):
+        """Count a failure and eject the node once it crosses the threshold."""
+        node.consecutive_failures += 1
+        if node.consecutive_failures >= self.failure_threshold:
+            if node.healthy:
+                logger.warning(f"Ejecting Ollama node {node.base_url} for {self.ejection_seconds}s")
+            node.healthy = False
+            node.ejected_until = time.monotonic() + self.ejection_seconds
+
+    @asynccontextmanager
+    async def acquire(self, node: OllamaNode):
+        """Track a request as outstanding on a node for its duration."""
+        node.outstanding += 1
+        try:
+            yield node
+        finally:
+            node.outstanding -= 1
@@ -0,0 +1,200 @@
+import cProfile
+import datetime
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+PSTATS_EXTENSION = ".prof"
+COLLAPSED_EXTENSION = ".collapsed"
+
+
+def collapse_stack(frame) -> str:
+    """Frames from the outermost to `frame`, separated by semicolons (flamegraph.pl / speedscope format)."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Wall-clock sampling of the stacks of selected threads from a daemon thread."""
+
+    def __init__(self, interval: float = 0.005, thread_ids: Optional[Iterable[int]] = None):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        own_id = threading.get_ident()
+        thread_names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                if thread_id not in thread_names:
+                    thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                self.samples[f"{thread_names.get(thread_id, thread_id)};{collapse_stack(frame)}"] += 1
+
+
+class RequestProfiler:
+    """Opt-in profiles of single requests and of time-boxed sampling windows, kept in a folder.
+
+    Requests run on the event loop thread, so a request's profile also
+    contains whatever other requests ran on the loop while it was in flight.
+    Only one request is profiled with cProfile at a time.
+    """
+    MODES = ("cprofile", "sample")
+
+    def __init__(self, output_dir: str, max_profiles: int = 100, sample_interval: float = 0.005,
+                 max_window_seconds: float = 60.0):
+        self.output_dir = output_dir
+        self.max_profiles = max_profiles
+        self.sample_interval = sample_interval
+        self.max_window_seconds = max_window_seconds
+        os.makedirs(output_dir, exist_ok=True)
+        self._cprofile_lock = threading.Lock()
+        self._window: Optional[Dict[str, Any]] = None
+        self._window_lock = threading.Lock()
+
+    def start_request(self, mode: str, label: str) -> Optional[Dict[str, Any]]:
+        """Start profiling the current thread under a new profile id; None if cProfile is busy."""
+        if mode not in self.MODES:
+            raise ValueError(f"Profiling mode must be one of {list(self.MODES)}")
+        state = {"mode": mode, "label": label, "profile_id": self._profile_id(label),
+                 "started": time.perf_counter()}
+        if mode == "sample":
+            state["sampler"] = StackSampler(self.sample_interval, thread_ids=[threading.get_ident()])
+            state["sampler"].start()
+            return state
+
+        if not self._cprofile_lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            self._cprofile_lock.release()
+            return None
+        state["profile"] = profile
+        return state
+
+    def stop_request(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Stop a request's profiling, on the thread that started it."""
+        state["duration_ms"] = round((time.perf_counter() - state["started"]) * 1000, 1)
+        if state["mode"] == "sample":
+            state["samples"] = state["sampler"].stop()
+        else:
+            try:
+                state["profile"].disable()
+            finally:
+                self._cprofile_lock.release()
+        return state
+
+    def store_request(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Write a stopped request's profile; safe to call from any thread."""
+        if state["mode"] == "sample":
+            info = self._write_collapsed(state["label"], state["samples"], state["profile_id"])
+        else:
+            info = self._write(state["label"], PSTATS_EXTENSION, state["profile"].dump_stats, state["profile_id"])
+        return dict(info, duration_ms=state["duration_ms"])
+
+    def finish_request(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Stop a request's profiling and store the profile."""
+        return self.store_request(self.stop_request(state))
+
+    def start_window(self, seconds: float, interval: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Sample every thread for up to max_window_seconds; None if a window is already running."""
+        seconds = max(0.1, min(float(seconds), self.max_window_seconds))
+        with self._window_lock:
+            if self._window is not None:
+                return None
+            sampler = StackSampler(interval or self.sample_interval)
+            self._window = {
+                "started_at": datetime.datetime.now().isoformat(),
+                "seconds": seconds,
+                "interval_ms": round(sampler.interval * 1000, 3),
+                "sampler": sampler,
+            }
+            sampler.start()
+            timer = threading.Timer(seconds, self._finish_window)
+            timer.daemon = True
+            timer.start()
+            return self.window_status()
+
+    def _finish_window(self):
+        with self._window_lock:
+            window, self._window = self._window, None
+        if window is not None:
+            self._write_collapsed(f"window {window['seconds']:g}s", window["sampler"].stop())
+
+    def window_status(self) -> Optional[Dict[str, Any]]:
+        window = self._window
+        if window is None:
+            return None
+        return {key: value for key, value in window.items() if key != "sampler"}
+
+    def _write_collapsed(self, label: str, samples: Counter, profile_id: Optional[str] = None) -> Dict[str, Any]:
+        def write(path):
+            with open(path, "w") as f:
+                f.write("".join(f"{stack} {count}\n" for stack, count in samples.most_common()))
+        return dict(self._write(label, COLLAPSED_EXTENSION, write, profile_id), samples=sum(samples.values()))
+
+    @staticmethod
+    def _profile_id(label: str) -> str:
+        timestamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-")[:60]
+        return f"{timestamp}-{slug}-{uuid.uuid4().hex[:8]}"
+
+    def _write(self, label: str, extension: str, write, profile_id: Optional[str] = None) -> Dict[str, Any]:
+        profile_id = profile_id or self._profile_id(label)
+        write(os.path.join(self.output_dir, profile_id + extension))
+        for profile in self.list_profiles()[self.max_profiles:]:
+            try:
+                os.remove(profile["path"])
+            except OSError:
+                pass
+        return {"profile_id": profile_id, "format": extension.lstrip("."), "label": label}
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Stored profiles, newest first."""
+        entries = [
+            (entry, entry.stat()) for entry in os.scandir(self.output_dir)
+            if os.path.splitext(entry.name)[1] in (PSTATS_EXTENSION, COLLAPSED_EXTENSION)
+        ]
+        entries.sort(key=lambda item: item[1].st_mtime, reverse=True)
+        profiles = []
+        for entry, stat in entries:
+            profile_id, extension = os.path.splitext(entry.name)
+            profiles.append({
+                "profile_id": profile_id,
+                "format": extension.lstrip("."),
+                "size": stat.st_size,
+                "created_at": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                "path": entry.path,
+            })
+        return profiles
+
+    def get_profile_path(self, profile_id: str) -> Optional[str]:
+        for profile in self.list_profiles():
+            if profile["profile_id"] == profile_id:
+                return profile["path"]
+        return None
@@ -0,0 +1,175 @@
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+def percentile(values, fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty collection."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def usage_from_response(response_data: Dict[str, Any], num_predict: int) -> Dict[str, Any]:
+    """Exact token counts and timings from the final object of an Ollama generation."""
+    # Durations are reported in nanoseconds. prompt_eval_count is omitted
+    # by some Ollama versions when the whole prompt came from the cache
+    prompt_tokens = response_data.get("prompt_eval_count", 0)
+    completion_tokens = response_data.get("eval_count", 0)
+    eval_ms = response_data.get("eval_duration", 0) / 1e6
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "load_ms": round(response_data.get("load_duration", 0) / 1e6, 1),
+        "prompt_eval_ms": round(response_data.get("prompt_eval_duration", 0) / 1e6, 1),
+        "eval_ms": round(eval_ms, 1),
+        "total_ms": round(response_data.get("total_duration", 0) / 1e6, 1),
+        "tokens_per_second": round(completion_tokens / eval_ms * 1000, 1) if eval_ms else None,
+        # Generation stopped at num_predict rather than at a natural end
+        "truncated": response_data.get("done_reason") == "length" or completion_tokens >= num_predict,
+    }
+
+
+class UsageStats:
+    """Token and time totals per model and per caller."""
+
+    COUNTERS = ("requests", "prompt_tokens", "completion_tokens", "truncated",
+                "load_ms", "prompt_eval_ms", "eval_ms", "total_ms")
+
+    def __init__(self):
+        self.by_model: Dict[str, Dict[str, float]] = {}
+        self.by_caller: Dict[str, Dict[str, float]] = {}
+
+    def record(self, model: str, caller: Optional[str], usage: Dict[str, Any]):
+        """Add one generation's usage to its model's and caller's totals."""
+        for totals, key in ((self.by_model, model), (self.by_caller, caller or "unknown")):
+            entry = totals.setdefault(key, dict.fromkeys(self.COUNTERS, 0))
+            entry["requests"] += 1
+            entry["truncated"] += int(usage["truncated"])
+            for counter in self.COUNTERS[4:] + ("prompt_tokens", "completion_tokens"):
+                entry[counter] += usage[counter]
+
+    @staticmethod
+    def _summarize(entry: Dict[str, float]) -> Dict[str, Any]:
+        requests = entry["requests"]
+        return {
+            "requests": requests,
+            "prompt_tokens": entry["prompt_tokens"],
+            "completion_tokens": entry["completion_tokens"],
+            "total_tokens": entry["prompt_tokens"] + entry["completion_tokens"],
+            "truncated": entry["truncated"],
+            "avg_prompt_tokens": round(entry["prompt_tokens"] / requests, 1),
+            "avg_completion_tokens": round(entry["completion_tokens"] / requests, 1),
+            "avg_total_ms": round(entry["total_ms"] / requests, 1),
+            "prompt_tokens_per_second": round(entry["prompt_tokens"] / entry["prompt_eval_ms"] * 1000, 1)
+            if entry["prompt_eval_ms"] else None,
+            "completion_tokens_per_second": round(entry["completion_tokens"] / entry["eval_ms"] * 1000, 1)
+            if entry["eval_ms"] else None,
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "models": {model: self._summarize(entry) for model, entry in self.by_model.items()},
+            "callers": {caller: self._summarize(entry) for caller, entry in self.by_caller.items()},
+        }
+
+
+class AdaptiveBudgets:
+    """Generation caps and timeouts derived from recent generations of a prompt type.
+
+    For every (prompt type, model) the last `window` generations are kept.
+    Once `min_samples` are known, num_predict is capped at the 99th
+    percentile of the observed output length times `headroom`, never above
+    what the caller asked for. An answer cut off at its cap raises a floor
+    under the cap to that cap times the headroom, so the next answer of the
+    prompt type gets more room however the percentile moves.
+    The timeout covers the 95th percentile of load plus prompt evaluation
+    and the cap at the 5th percentile of generation speed, times
+    `timeout_safety`; each timeout hit doubles it until
+    `min_samples` further generations succeed.
+    """
+
+    def __init__(self, enabled: bool = True, min_samples: int = 20, window: int = 200,
+                 headroom: float = 1.5, min_tokens: int = 16, timeout_safety: float = 2.0,
+                 min_timeout: float = 10.0, max_timeout: float = 120.0):
+        self.enabled = enabled
+        self.min_samples = min_samples
+        self.window = window
+        self.headroom = headroom
+        self.min_tokens = min_tokens
+        self.timeout_safety = timeout_safety
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        # (prompt type, model) -> recent (completion tokens, overhead ms, tokens/s)
+        self._samples: Dict[Tuple[str, str], Deque[Tuple[int, float, Optional[float]]]] = {}
+        # (prompt type, model) -> [timeout doublings, successes since the last timeout]
+        self._backoff: Dict[Tuple[str, str], list] = {}
+        # (prompt type, model) -> lowest num_predict cap, raised by truncated answers
+        self._floors: Dict[Tuple[str, str], int] = {}
+
+    def budget(self, prompt_type: Optional[str], model: str, requested_tokens: int) -> Tuple[int, float, bool]:
+        """Return (num_predict, timeout seconds, adapted) for a request."""
+        samples = self._samples.get((prompt_type, model))
+        if not self.enabled or not prompt_type or not samples or len(samples) < self.min_samples:
+            return requested_tokens, self.max_timeout, False
+
+        observed_tokens = percentile([tokens for tokens, _, _ in samples], 0.99)
+        num_predict = min(requested_tokens, max(
+            self.min_tokens,
+            math.ceil(observed_tokens * self.headroom),
+            self._floors.get((prompt_type, model), 0)
+        ))
+
+        speeds = [speed for _, _, speed in samples if speed]
+        if not speeds:
+            return num_predict, self.max_timeout, True
+        overhead_s = percentile([overhead for _, overhead, _ in samples], 0.95) / 1000
+        generation_s = num_predict / percentile(speeds, 0.05)
+        doublings = self._backoff.get((prompt_type, model), [0, 0])[0]
+        timeout = (overhead_s + generation_s) * self.timeout_safety * 2 ** doublings
+        return num_predict, min(self.max_timeout, max(self.min_timeout, timeout)), True
+
+    def record(self, prompt_type: Optional[str], model: str, usage: Dict[str, Any],
+               num_predict: Optional[int] = None):
+        """Add a completed generation to its prompt type's samples, raising its floor if it was cut off at num_predict."""
+        if not prompt_type:
+            return
+        key = (prompt_type, model)
+        if usage["truncated"] and num_predict:
+            self._floors[key] = max(self._floors.get(key, 0), math.ceil(num_predict * self.headroom))
+        samples = self._samples.setdefault(key, deque(maxlen=self.window))
+        samples.append((
+            usage["completion_tokens"],
+            usage["load_ms"] + usage["prompt_eval_ms"],
+            usage["tokens_per_second"],
+        ))
+
+        backoff = self._backoff.get(key)
+        if backoff and backoff[0]:
+            backoff[1] += 1
+            if backoff[1] >= self.min_samples:
+                backoff[0] -= 1
+                backoff[1] = 0
+
+    def record_timeout(self, prompt_type: Optional[str], model: str):
+        """Widen the timeout of a prompt type after an adapted timeout was hit."""
+        backoff = self._backoff.setdefault((prompt_type, model), [0, 0])
+        backoff[0] = min(backoff[0] + 1, 4)
+        backoff[1] = 0
+
+    def summary(self) -> Dict[str, Any]:
+        result = {}
+        for (prompt_type, model), samples in self._samples.items():
+            num_predict, timeout, adapted = self.budget(prompt_type, model, 10 ** 6)
+            tokens = [sample[0] for sample in samples]
+            result.setdefault(prompt_type, {})[model] = {
+                "samples": len(samples),
+                "adapted": adapted,
+                "num_predict_cap": num_predict if adapted else None,
+                "num_predict_floor": self._floors.get((prompt_type, model)),
+                "timeout_s": round(timeout, 1),
+                "timeout_doublings": self._backoff.get((prompt_type, model), [0, 0])[0],
+                "p50_completion_tokens": percentile(tokens, 0.5),
+                "p99_completion_tokens": percentile(tokens, 0.99),
+            }
+        return result